@@ -4,8 +4,13 @@ import frappe
 from erpnext.setup.utils import get_exchange_rate
 from frappe import _
 
+from klik_pos.api.customer_search import get_search_condition
+from klik_pos.api.customer_statistics import get_customer_statistics_map
+from klik_pos.klik_pos.log import get_logger
 from klik_pos.klik_pos.utils import get_current_pos_profile
 
+logger = get_logger(__name__)
+
 
 @frappe.whitelist(allow_guest=True)
 def get_customers(limit: int = 100, start: int = 0, search: str = ""):
@@ -25,58 +30,23 @@ def get_customers(limit: int = 100, start: int = 0, search: str = ""):
 		if hasattr(pos_profile, "customer_groups") and pos_profile.customer_groups:
 			customer_group_names = [d.customer_group for d in pos_profile.customer_groups if d.customer_group]
 
-		# Get user permissions for Customer doctype
-		user_permitted = frappe.permissions.get_user_permissions(frappe.session.user)
-		permitted_customer_names = []
-		has_customer_permissions = False
-		if user_permitted and "Customer" in user_permitted:
-			permitted_customer_names = [perm.get("doc") for perm in user_permitted["Customer"]]
-			has_customer_permissions = True
-
-		# Debug logging for customer filtering
-		frappe.logger().info(
-			f"Customer API Debug - Business Type: {business_type}, Customer Groups: {customer_group_names}, User Permitted Customers: {len(permitted_customer_names)}, Search: '{search}'"
-		)
+		# Business type, customer group and User Permission filters; permissions are a semi-join
+		# on `tabUser Permission`, so the query stays the same size however many customers are permitted
+		conditions, params = get_customer_list_conditions(business_type, customer_group_names)
 
-		# If user has customer permissions configured but no customers are permitted, return empty result
-		if has_customer_permissions and not permitted_customer_names:
-			return {
-				"success": True,
-				"data": [],
-				"total_count": 0,
-			}
+		logger.debug(
+			"get_customers business_type=%s groups=%s search=%r",
+			business_type,
+			customer_group_names,
+			search,
+		)
 
-		# If there's a search term, broaden the query across name, customer_name, contact email/phone.
-		# Also increase limit for search results to surface older matches.
-		if search:
-			# Sanitize search input for LIKE
-			like_param = f"%{search}%"
-
-			# Build optional customer_type filter
-			cust_type_filter = ""
-			cust_type_params = []
-			if business_type == "B2B":
-				cust_type_filter = "AND c.customer_type = %s"
-				cust_type_params.append("Company")
-			elif business_type == "B2C":
-				cust_type_filter = "AND c.customer_type = %s"
-				cust_type_params.append("Individual")
-
-			# Build optional customer_group filter
-			cust_group_filter = ""
-			cust_group_params = []
-			if customer_group_names:
-				placeholders = ",".join(["%s"] * len(customer_group_names))
-				cust_group_filter = f"AND c.customer_group IN ({placeholders})"
-				cust_group_params.extend(customer_group_names)
-
-			# Build optional user permission filter
-			user_perm_filter = ""
-			user_perm_params = []
-			if permitted_customer_names:
-				placeholders = ",".join(["%s"] * len(permitted_customer_names))
-				user_perm_filter = f"AND c.name IN ({placeholders})"
-				user_perm_params.extend(permitted_customer_names)
+		# If there's a search term, match it against the customer search index: name and ID tokens,
+		# emails and phone number suffixes. Also increase limit for search results to surface older matches.
+		search_condition, search_params = get_search_condition(search)
+		if search_condition:
+			conditions = f"c.name IN ({search_condition}) AND {conditions}"
+			params = [*search_params, *params]
 
 			# Prefer higher cap when searching
 			try:
@@ -85,144 +55,43 @@ def get_customers(limit: int = 100, start: int = 0, search: str = ""):
 				limit_val = 100
 			# Boost limits for search to show more matches
 			limit_val = max(limit_val, 500)
-
-			customer_names = frappe.db.sql(
-				f"""
-                SELECT DISTINCT c.name, c.customer_name, c.customer_type, c.customer_group, c.territory, c.default_currency
-                FROM `tabCustomer` c
-                LEFT JOIN `tabDynamic Link` dl ON dl.link_doctype='Customer' AND dl.link_name=c.name AND dl.parenttype='Contact'
-                LEFT JOIN `tabContact` ct ON ct.name = dl.parent
-                LEFT JOIN `tabContact Email` ce ON ce.parent = ct.name
-                LEFT JOIN `tabContact Phone` cp ON cp.parent = ct.name
-                WHERE (
-                    c.customer_name LIKE %s OR c.name LIKE %s OR
-                    ce.email_id LIKE %s OR cp.phone LIKE %s
-                )
-                {cust_type_filter}
-                {cust_group_filter}
-                {user_perm_filter}
-                ORDER BY c.creation DESC
-                LIMIT %s OFFSET %s
-                """,
-				tuple(
-					[
-						like_param,
-						like_param,
-						like_param,
-						like_param,
-						*cust_type_params,
-						*cust_group_params,
-						*user_perm_params,
-						limit_val,
-						int(start) or 0,
-					]
-				),
-				as_dict=True,
-			)
-
-			# Total count for search
-			total_count_row = frappe.db.sql(
-				f"""
-                SELECT COUNT(DISTINCT c.name) as total
-                FROM `tabCustomer` c
-                LEFT JOIN `tabDynamic Link` dl ON dl.link_doctype='Customer' AND dl.link_name=c.name AND dl.parenttype='Contact'
-                LEFT JOIN `tabContact` ct ON ct.name = dl.parent
-                LEFT JOIN `tabContact Email` ce ON ce.parent = ct.name
-                LEFT JOIN `tabContact Phone` cp ON cp.parent = ct.name
-                WHERE (
-                    c.customer_name LIKE %s OR c.name LIKE %s OR
-                    ce.email_id LIKE %s OR cp.phone LIKE %s
-                )
-                {cust_type_filter}
-                {cust_group_filter}
-                {user_perm_filter}
-                """,
-				tuple(
-					[
-						like_param,
-						like_param,
-						like_param,
-						like_param,
-						*cust_type_params,
-						*cust_group_params,
-						*user_perm_params,
-					]
-				),
-				as_dict=True,
-			)
-			total_count = (total_count_row[0].total if total_count_row else 0) or 0
 		else:
-			# Original logic for when no search term - keep capped limit for performance
-			filters = {}
-			if business_type == "B2B":
-				filters["customer_type"] = "Company"
-			elif business_type == "B2C":
-				filters["customer_type"] = "Individual"
-
-			# Add customer group filtering if configured
-			if customer_group_names:
-				filters["customer_group"] = ["in", customer_group_names]
-
-			# Add user permission filtering if configured
-			if permitted_customer_names:
-				filters["name"] = ["in", permitted_customer_names]
-
-			customer_names = frappe.get_all(
-				"Customer",
-				filters=filters,
-				fields=[
-					"name",
-					"customer_name",
-					"customer_type",
-					"customer_group",
-					"territory",
-					"default_currency",
-				],
-				order_by="creation desc",
-				limit=limit,
-				start=start,
-			)
-
-			total_count = frappe.db.count("Customer", filters=filters)
-		for cust in customer_names:
-			doc = frappe.get_doc("Customer", cust.name)
-
-			contact = (
-				frappe.db.get_value(
-					"Contact",
-					{"name": doc.customer_primary_contact},
-					["first_name", "last_name", "email_id", "phone", "mobile_no"],
-					as_dict=True,
-				)
-				if doc.customer_primary_contact
-				else None
-			)
-
-			address = (
-				frappe.db.get_value(
-					"Address",
-					{"name": doc.customer_primary_address},
-					["address_line1", "city", "state", "country", "pincode"],
-					as_dict=True,
-				)
-				if doc.customer_primary_address
-				else None
-			)
+			# No search term - keep capped limit for performance
+			limit_val = int(limit) if limit else 100
+
+		customer_names = frappe.db.sql(
+			f"""
+			SELECT c.name, c.customer_name, c.customer_type, c.customer_group, c.territory, c.default_currency,
+				c.customer_primary_contact, c.customer_primary_address
+			FROM `tabCustomer` c
+			WHERE {conditions}
+			ORDER BY c.creation DESC
+			LIMIT %s OFFSET %s
+			""",
+			(*params, limit_val, int(start or 0)),
+			as_dict=True,
+		)
 
-			# Get customer statistics
-			stats = get_customer_statistics(doc.name)
-			customer_stats = stats.get("data", {}) if stats.get("success") else {}
+		total_count_row = frappe.db.sql(
+			f"SELECT COUNT(*) AS total FROM `tabCustomer` c WHERE {conditions}",
+			tuple(params),
+			as_dict=True,
+		)
+		total_count = (total_count_row[0].total if total_count_row else 0) or 0
 
+		contacts, addresses, statistics = _get_customer_list_details(customer_names)
+		for cust in customer_names:
+			customer_stats = statistics.get(cust.name, {})
 			result.append(
 				{
-					"name": doc.name,
-					"customer_name": doc.customer_name,
-					"customer_type": doc.customer_type,
-					"customer_group": doc.customer_group,
-					"territory": doc.territory,
-					"contact": contact,
-					"address": address,
-					"default_currency": doc.default_currency,
+					"name": cust.name,
+					"customer_name": cust.customer_name,
+					"customer_type": cust.customer_type,
+					"customer_group": cust.customer_group,
+					"territory": cust.territory,
+					"contact": contacts.get(cust.customer_primary_contact),
+					"address": addresses.get(cust.customer_primary_address),
+					"default_currency": cust.default_currency,
 					"company_currency": company_currency,
 					"custom_total_orders": customer_stats.get("total_orders", 0),
 					"custom_total_spent": customer_stats.get("total_spent", 0),
@@ -247,6 +116,67 @@ def get_customers(limit: int = 100, start: int = 0, search: str = ""):
 		}
 
 
+def get_customer_list_conditions(business_type, customer_group_names, user=None):
+	"""WHERE conditions on `tabCustomer` c for the POS profile and the user's permissions, with params."""
+	conditions, params = ["1 = 1"], []
+
+	if business_type == "B2B":
+		conditions.append("c.customer_type = %s")
+		params.append("Company")
+	elif business_type == "B2C":
+		conditions.append("c.customer_type = %s")
+		params.append("Individual")
+
+	if customer_group_names:
+		conditions.append(f"c.customer_group IN ({', '.join(['%s'] * len(customer_group_names))})")
+		params.extend(customer_group_names)
+
+	user = user or frappe.session.user
+	if has_customer_user_permissions(user):
+		conditions.append(
+			"c.name IN (SELECT up.for_value FROM `tabUser Permission` up"
+			" WHERE up.user = %s AND up.allow = 'Customer')"
+		)
+		params.append(user)
+
+	return " AND ".join(conditions), params
+
+
+def has_customer_user_permissions(user=None):
+	"""Whether User Permissions restrict the user to a set of customers."""
+	user = user or frappe.session.user
+	# Frappe does not apply User Permissions to Administrator
+	if user == "Administrator":
+		return False
+	return bool(frappe.db.exists("User Permission", {"user": user, "allow": "Customer"}))
+
+
+def _get_customer_list_details(customers):
+	"""Primary contacts, primary addresses and statistics of a page of customers, one query each."""
+	contact_names = list({c.customer_primary_contact for c in customers if c.get("customer_primary_contact")})
+	address_names = list({c.customer_primary_address for c in customers if c.get("customer_primary_address")})
+
+	contacts = {}
+	if contact_names:
+		for contact in frappe.get_all(
+			"Contact",
+			filters={"name": ["in", contact_names]},
+			fields=["name", "first_name", "last_name", "email_id", "phone", "mobile_no"],
+		):
+			contacts[contact.pop("name")] = contact
+
+	addresses = {}
+	if address_names:
+		for address in frappe.get_all(
+			"Address",
+			filters={"name": ["in", address_names]},
+			fields=["name", "address_line1", "city", "state", "country", "pincode"],
+		):
+			addresses[address.pop("name")] = address
+
+	return contacts, addresses, get_customer_statistics_map([c.name for c in customers])
+
+
 def get_user_company_and_currency():
 	default_company = frappe.defaults.get_user_default("Company")
 	if not default_company:
@@ -326,7 +256,6 @@ def get_customer_info(customer_name: str):
 		import urllib.parse
 
 		customer_name = urllib.parse.unquote(customer_name)
-		print("CUSTOMER WETU", customer_name)
 		# First try to find by customer_name
 		customers = frappe.get_all("Customer", filters={"customer_name": customer_name}, fields=["name"])
 
@@ -335,10 +264,7 @@ def get_customer_info(customer_name: str):
 			customers = frappe.get_all("Customer", filters={"name": customer_name}, fields=["name"])
 
 		if not customers:
-			# Log the search attempt for debugging
-			frappe.logger().info(
-				f"Customer not found: '{customer_name}'. Searched by customer_name and name."
-			)
+			logger.debug("Customer not found by customer_name or name: %r", customer_name)
 			return {"success": False, "error": f"Customer not found: {customer_name}"}
 
 		customer = frappe.get_doc("Customer", customers[0]["name"])
@@ -749,62 +675,19 @@ def update_customer(customer_id, customer_data):
 
 @frappe.whitelist()
 def get_customer_statistics(customer_id):
-	"""Get customer statistics including total orders and total spent"""
+	"""Get customer statistics (orders, spend, last visit, average basket, returns) from the rollup"""
 	try:
-		# Get total invoices (orders) for the customer
-		total_orders = frappe.db.count(
-			"Sales Invoice",
-			filters={
-				"customer": customer_id,
-				"docstatus": 1,
-				"is_return": 0,
-				"status": ["!=", "Cancelled"],
-				"custom_pos_opening_entry": ["!=", ""],  # Only POS-created invoices
-			},
-		)
-
-		# Get total amount spent by the customer
-		total_spent_result = frappe.db.sql(
-			"""
-            SELECT COALESCE(SUM(grand_total), 0) as total_spent
-            FROM `tabSales Invoice`
-            WHERE customer = %s
-            AND docstatus = 1
-            AND is_return = 0
-            AND status != 'Cancelled'
-            AND custom_pos_opening_entry IS NOT NULL
-            AND custom_pos_opening_entry != ''
-        """,
-			(customer_id,),
-			as_dict=True,
-		)
-
-		total_spent = total_spent_result[0].total_spent if total_spent_result else 0
-
-		# Get last visit date (most recent invoice date)
-		last_visit_result = frappe.db.sql(
-			"""
-            SELECT MAX(posting_date) as last_visit
-            FROM `tabSales Invoice`
-            WHERE customer = %s
-            AND docstatus = 1
-            AND is_return = 0
-            AND status != 'Cancelled'
-            AND custom_pos_opening_entry IS NOT NULL
-            AND custom_pos_opening_entry != ''
-        """,
-			(customer_id,),
-			as_dict=True,
-		)
-
-		last_visit = last_visit_result[0].last_visit if last_visit_result else None
+		stats = get_customer_statistics_map([customer_id]).get(customer_id, {})
 
 		return {
 			"success": True,
 			"data": {
-				"total_orders": total_orders,
-				"total_spent": total_spent,
-				"last_visit": last_visit,
+				"total_orders": stats.get("total_orders", 0),
+				"total_spent": stats.get("total_spent", 0),
+				"last_visit": stats.get("last_visit"),
+				"average_basket": stats.get("average_basket", 0),
+				"total_returns": stats.get("total_returns", 0),
+				"total_returned": stats.get("total_returned", 0),
 			},
 		}
 
@@ -855,22 +738,14 @@ def check_customer_permission(customer_name):
 		if hasattr(pos_profile, "customer_groups") and pos_profile.customer_groups:
 			customer_group_names = [d.customer_group for d in pos_profile.customer_groups if d.customer_group]
 
-		# Get user permissions for Customer doctype
-		user_permitted = frappe.permissions.get_user_permissions(frappe.session.user)
-		permitted_customer_names = []
-		has_customer_permissions = False
-		if user_permitted and "Customer" in user_permitted:
-			permitted_customer_names = [perm.get("doc") for perm in user_permitted["Customer"]]
-			has_customer_permissions = True
-
-		# Check if user has permission to access this specific customer
+		# Check user permissions first; one indexed lookup instead of loading every permitted customer
+		has_customer_permissions = has_customer_user_permissions()
 		has_permission = True
-
-		# Check user permissions first
-		if has_customer_permissions:
-			if customer_name not in permitted_customer_names:
-				has_permission = False
-				frappe.logger().info(f"User does not have permission to access customer: {customer_name}")
+		if has_customer_permissions and not frappe.db.exists(
+			"User Permission", {"user": frappe.session.user, "allow": "Customer", "for_value": customer_name}
+		):
+			has_permission = False
+			logger.debug("User does not have permission to access customer: %s", customer_name)
 
 		# If user has permission, check business type and customer groups
 		if has_permission:
@@ -880,18 +755,16 @@ def check_customer_permission(customer_name):
 			# Check business type
 			if business_type == "B2C" and customer.customer_type == "Company":
 				has_permission = False
-				frappe.logger().info(f"B2C business type: Customer {customer_name} is Company type")
+				logger.debug("B2C business type: Customer %s is Company type", customer_name)
 			elif business_type == "B2B" and customer.customer_type == "Individual":
 				has_permission = False
-				frappe.logger().info(f"B2B business type: Customer {customer_name} is Individual type")
+				logger.debug("B2B business type: Customer %s is Individual type", customer_name)
 
 			# Check customer groups if configured
 			if has_permission and customer_group_names:
 				if customer.customer_group not in customer_group_names:
 					has_permission = False
-					frappe.logger().info(
-						f"Customer {customer_name} not in allowed groups: {customer_group_names}"
-					)
+					logger.debug("Customer %s not in allowed groups: %s", customer_name, customer_group_names)
 
 		return {
 			"success": True,
@@ -899,9 +772,13 @@ def check_customer_permission(customer_name):
 			"customer_name": customer_name,
 			"business_type": business_type,
 			"customer_groups": customer_group_names,
-			"user_permissions": len(permitted_customer_names) if has_customer_permissions else 0,
+			"user_permissions": frappe.db.count(
+				"User Permission", {"user": frappe.session.user, "allow": "Customer"}
+			)
+			if has_customer_permissions
+			else 0,
 		}
 
 	except Exception as e:
-		frappe.logger().error(f"Error checking customer permission: {e!s}")
+		logger.exception("Error checking customer permission: %s", e)
 		return {"success": False, "error": str(e), "has_permission": False}
@@ -0,0 +1,235 @@
+"""
+Customer search index.
+
+"POS Customer Search Key" rows hold normalized search keys per customer: lower-cased
+tokens of the customer name and ID (split on whitespace and punctuation, so
+"rashid" finds "Al-Rashid"), lower-cased emails, and phone numbers as digits
+without leading zeros, stored reversed so that a suffix search ("last digits of the
+number") is an index prefix range. Rows are rebuilt when a Customer or one of its
+Contacts changes.
+"""
+
+import re
+
+import frappe
+from frappe.utils import now_datetime
+
+from klik_pos.klik_pos.log import get_logger
+
+logger = get_logger(__name__)
+
+SEARCH_KEY_DOCTYPE = "POS Customer Search Key"
+
+# Shorter digit runs would match a large share of all numbers
+MIN_PHONE_DIGITS = 4
+MAX_NAME_TOKENS = 4
+KEY_LENGTH = 140
+BACKFILL_BATCH_SIZE = 1000
+
+_PHONE_TERM = re.compile(r"[\d\s+()\-./]+")
+_TOKEN_SEPARATORS = re.compile(r"[\W_]+")
+
+
+def normalize_phone(value):
+	"""Reversed digits of a phone number, without trunk or international leading zeros."""
+	return re.sub(r"\D", "", value or "").lstrip("0")[::-1]
+
+
+def tokenize_name(value):
+	return [token for token in _TOKEN_SEPARATORS.split((value or "").lower()) if token]
+
+
+def update_customer_search_keys(doc, method=None):
+	"""doc_events hook for Customer on_update."""
+	refresh_customer_search_keys([doc.name])
+
+
+def rename_customer_search_keys(doc, method=None, old=None, new=None, merge=False):
+	"""doc_events hook for Customer after_rename."""
+	frappe.db.delete(SEARCH_KEY_DOCTYPE, {"customer": old})
+	refresh_customer_search_keys([new])
+
+
+def delete_customer_search_keys(doc, method=None):
+	"""doc_events hook for Customer on_trash."""
+	frappe.db.delete(SEARCH_KEY_DOCTYPE, {"customer": doc.name})
+
+
+def update_contact_search_keys(doc, method=None):
+	"""
+	doc_events hook for Contact on_update / on_trash: rebuild the keys of the customers
+	the contact is linked to now, and of those it was linked to before.
+	"""
+	customers = {link.link_name for link in doc.get("links") or [] if link.link_doctype == "Customer"}
+	customers.update(
+		frappe.get_all(SEARCH_KEY_DOCTYPE, filters={"contact": doc.name}, pluck="customer", distinct=True)
+	)
+	refresh_customer_search_keys(customers, exclude_contact=doc.name if method == "on_trash" else None)
+
+
+def refresh_customer_search_keys(customer_names, exclude_contact=None):
+	customer_names = [name for name in set(customer_names) if name]
+	if not customer_names:
+		return
+
+	frappe.db.delete(SEARCH_KEY_DOCTYPE, {"customer": ["in", customer_names]})
+	_insert_keys(_collect_search_keys(customer_names, exclude_contact))
+
+
+def get_search_condition(search):
+	"""
+	Subquery selecting the customers that match `search`, with its parameters, or
+	(None, []) for an empty term. Every branch is a prefix range on the key index;
+	a term no branch applies to selects nothing.
+	"""
+	term = (search or "").strip().lower()
+	if not term:
+		return None, []
+
+	subqueries, params = [], []
+
+	digits = normalize_phone(term)
+	if len(digits) >= MIN_PHONE_DIGITS and _PHONE_TERM.fullmatch(term):
+		subqueries.append(
+			f"SELECT customer FROM `tab{SEARCH_KEY_DOCTYPE}` WHERE key_type = 'phone' AND search_key LIKE %s"
+		)
+		params.append(_prefix(digits))
+
+	if len(term.split()) == 1:
+		subqueries.append(
+			f"SELECT customer FROM `tab{SEARCH_KEY_DOCTYPE}` WHERE key_type = 'email' AND search_key LIKE %s"
+		)
+		params.append(_prefix(term))
+
+	tokens = tokenize_name(term)[:MAX_NAME_TOKENS]
+	if tokens and "@" not in term:
+		# Every token of the term has to start one of the customer's name tokens
+		joins = "".join(
+			f" JOIN `tab{SEARCH_KEY_DOCTYPE}` k{i} ON k{i}.customer = k0.customer"
+			f" AND k{i}.key_type = 'name' AND k{i}.search_key LIKE %s"
+			for i in range(1, len(tokens))
+		)
+		subqueries.append(
+			f"SELECT k0.customer FROM `tab{SEARCH_KEY_DOCTYPE}` k0{joins}"
+			" WHERE k0.key_type = 'name' AND k0.search_key LIKE %s"
+		)
+		params.extend(_prefix(token) for token in tokens[1:])
+		params.append(_prefix(tokens[0]))
+
+	if not subqueries:
+		# e.g. an email fragment with a space in it
+		return f"SELECT customer FROM `tab{SEARCH_KEY_DOCTYPE}` WHERE 1 = 0", []
+
+	return " UNION ".join(subqueries), params
+
+
+@frappe.whitelist()
+def rebuild_customer_search_index():
+	"""Rebuild the search index in a background job (System Manager only)."""
+	frappe.only_for("System Manager")
+	frappe.enqueue(
+		"klik_pos.api.customer_search.build_customer_search_index",
+		queue="long",
+		timeout=3600,
+		job_id="klik_pos_rebuild_customer_search_index",
+		deduplicate=True,
+	)
+	return {"success": True, "message": "Customer search index rebuild queued"}
+
+
+def build_customer_search_index():
+	"""Backfill keys for every customer (also used by the install patch)."""
+	frappe.db.delete(SEARCH_KEY_DOCTYPE)
+	start = 0
+	while True:
+		customer_names = frappe.get_all(
+			"Customer", order_by="name", pluck="name", start=start, page_length=BACKFILL_BATCH_SIZE
+		)
+		if not customer_names:
+			break
+
+		_insert_keys(_collect_search_keys(customer_names))
+		frappe.db.commit()
+		start += BACKFILL_BATCH_SIZE
+
+	logger.info("Rebuilt customer search index")
+
+
+def _collect_search_keys(customer_names, exclude_contact=None):
+	"""{(customer, key_type, search_key): contact} for a batch of customers."""
+	keys = {}
+
+	def add(customer, key_type, value, contact=None):
+		if value:
+			key = (customer, key_type, value[:KEY_LENGTH])
+			keys[key] = keys.get(key) or contact
+
+	def add_contact_details(customer, phone=None, email=None, contact=None):
+		digits = normalize_phone(phone)
+		if len(digits) >= MIN_PHONE_DIGITS:
+			add(customer, "phone", digits, contact)
+		add(customer, "email", (email or "").strip().lower(), contact)
+
+	for customer in frappe.get_all(
+		"Customer",
+		filters={"name": ["in", customer_names]},
+		fields=["name", "customer_name", "mobile_no", "email_id"],
+	):
+		for token in {
+			*tokenize_name(customer.customer_name),
+			*tokenize_name(customer.name),
+			customer.name.lower(),
+		}:
+			add(customer.name, "name", token)
+		add_contact_details(customer.name, customer.mobile_no, customer.email_id)
+
+	for row in frappe.db.sql(
+		"""
+		SELECT dl.link_name AS customer, dl.parent AS contact, cp.phone, NULL AS email
+		FROM `tabDynamic Link` dl
+		JOIN `tabContact Phone` cp ON cp.parent = dl.parent
+		WHERE dl.link_doctype = 'Customer' AND dl.parenttype = 'Contact' AND dl.link_name IN %(customers)s
+		UNION ALL
+		SELECT dl.link_name AS customer, dl.parent AS contact, NULL AS phone, ce.email_id AS email
+		FROM `tabDynamic Link` dl
+		JOIN `tabContact Email` ce ON ce.parent = dl.parent
+		WHERE dl.link_doctype = 'Customer' AND dl.parenttype = 'Contact' AND dl.link_name IN %(customers)s
+		""",
+		{"customers": tuple(customer_names)},
+		as_dict=True,
+	):
+		if row.contact != exclude_contact:
+			add_contact_details(row.customer, row.phone, row.email, row.contact)
+
+	return keys
+
+
+def _insert_keys(keys):
+	if not keys:
+		return
+
+	now = now_datetime()
+	user = frappe.session.user
+	frappe.db.bulk_insert(
+		SEARCH_KEY_DOCTYPE,
+		fields=[
+			"name",
+			"creation",
+			"modified",
+			"modified_by",
+			"owner",
+			"customer",
+			"key_type",
+			"search_key",
+			"contact",
+		],
+		values=[
+			(frappe.generate_hash(length=10), now, now, user, user, customer, key_type, search_key, contact)
+			for (customer, key_type, search_key), contact in keys.items()
+		],
+	)
+
+
+def _prefix(value):
+	# Escape LIKE wildcards so the pattern stays a pure prefix (index range scan)
+	return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
@@ -0,0 +1,158 @@
+"""
+Customer statistics rollup.
+
+One "POS Customer Statistics" row per customer, named after the customer, holds the
+totals of its submitted POS sales and returns, whether recorded as Sales Invoices or
+POS Invoices. Submitting an invoice adds to the row; cancelling one recomputes the
+customer's row, since the last visit cannot be taken back incrementally. Reading a
+customer's statistics is a primary-key lookup. Sales Invoices consolidated from POS
+Invoices at shift close are skipped, their POS Invoices are already counted.
+"""
+
+import frappe
+from frappe.utils import flt, now_datetime
+
+from klik_pos.klik_pos.log import get_logger
+from klik_pos.klik_pos.utils import get_klik_invoice_doctypes
+
+logger = get_logger(__name__)
+
+STATISTICS_DOCTYPE = "POS Customer Statistics"
+
+_INSERT_COLUMNS = """
+	(name, creation, modified, modified_by, owner, docstatus, idx,
+	 customer, total_orders, total_spent, last_visit, total_returns, total_returned)
+"""
+
+# Aggregates of submitted POS-created invoices, grouped per customer
+_AGGREGATE_SELECT = """
+	SELECT customer, %(now)s, %(now)s, 'Administrator', 'Administrator', 0, 0,
+		customer,
+		SUM(is_return = 0),
+		COALESCE(SUM(IF(is_return = 0, grand_total, 0)), 0),
+		MAX(IF(is_return = 0, posting_date, NULL)),
+		SUM(is_return = 1),
+		COALESCE(SUM(IF(is_return = 1, ABS(grand_total), 0)), 0)
+	FROM ({invoices}) invoices
+	GROUP BY customer
+"""
+
+_INVOICE_SELECT = """
+	SELECT customer, is_return, grand_total, posting_date
+	FROM `tab{doctype}`
+	WHERE docstatus = 1
+	  AND IFNULL(customer, '') != ''
+	  AND IFNULL(custom_pos_opening_entry, '') != ''
+	  {conditions}
+"""
+
+
+def update_customer_statistics(doc, method=None):
+	"""doc_events hook for Sales Invoice and POS Invoice on_submit / on_cancel."""
+	if not doc.get("custom_pos_opening_entry") or not doc.get("customer") or doc.get("is_consolidated"):
+		return
+
+	if method == "on_cancel":
+		refresh_customer_statistics(doc.customer)
+	else:
+		_add_invoice(doc)
+
+
+def get_customer_statistics_map(customer_names):
+	"""{customer: statistics} for many customers in one primary-key read."""
+	if not customer_names:
+		return {}
+
+	rows = frappe.get_all(
+		STATISTICS_DOCTYPE,
+		filters={"name": ["in", list(customer_names)]},
+		fields=["name", "total_orders", "total_spent", "last_visit", "total_returns", "total_returned"],
+	)
+	statistics = {}
+	for row in rows:
+		name = row.pop("name")
+		row.average_basket = flt(row.total_spent) / row.total_orders if row.total_orders else 0
+		statistics[name] = row
+	return statistics
+
+
+def refresh_customer_statistics(customer):
+	"""Recompute one customer's row from its invoices."""
+	frappe.db.delete(STATISTICS_DOCTYPE, {"name": customer})
+	frappe.db.sql(
+		f"INSERT INTO `tab{STATISTICS_DOCTYPE}` {_INSERT_COLUMNS} "
+		+ _get_aggregate_select("AND customer = %(customer)s"),
+		{"now": now_datetime(), "customer": customer},
+	)
+
+
+def rename_customer_statistics(doc, method=None, old=None, new=None, merge=False):
+	"""doc_events hook for Customer after_rename: move (or merge) the renamed customer's row."""
+	frappe.db.delete(STATISTICS_DOCTYPE, {"name": old})
+	refresh_customer_statistics(new)
+
+
+@frappe.whitelist()
+def rebuild_customer_statistics():
+	"""Rebuild the rollup from submitted invoices in a background job (System Manager only)."""
+	frappe.only_for("System Manager")
+	frappe.enqueue(
+		"klik_pos.api.customer_statistics.build_customer_statistics",
+		queue="long",
+		timeout=3600,
+		job_id="klik_pos_rebuild_customer_statistics",
+		deduplicate=True,
+	)
+	return {"success": True, "message": "Customer statistics rebuild queued"}
+
+
+def build_customer_statistics():
+	"""Backfill every customer's row (also used by the install patch)."""
+	frappe.db.delete(STATISTICS_DOCTYPE)
+	frappe.db.sql(
+		f"INSERT INTO `tab{STATISTICS_DOCTYPE}` {_INSERT_COLUMNS} " + _get_aggregate_select(),
+		{"now": now_datetime()},
+	)
+	frappe.db.commit()
+	logger.info("Rebuilt customer statistics")
+
+
+def _get_aggregate_select(conditions=""):
+	"""Per-customer aggregate over every doctype KLiK records sales in."""
+	invoices = []
+	for invoice_doctype in get_klik_invoice_doctypes():
+		doctype_conditions = conditions
+		if invoice_doctype == "Sales Invoice":
+			doctype_conditions += " AND is_consolidated = 0"
+		invoices.append(_INVOICE_SELECT.format(doctype=invoice_doctype, conditions=doctype_conditions))
+	return _AGGREGATE_SELECT.format(invoices=" UNION ALL ".join(invoices))
+
+
+def _add_invoice(doc):
+	"""Atomic upsert of one submitted sale or return; safe under concurrent submits."""
+	is_return = 1 if doc.get("is_return") else 0
+	frappe.db.sql(
+		f"""
+		INSERT INTO `tab{STATISTICS_DOCTYPE}` {_INSERT_COLUMNS}
+		VALUES (%(customer)s, %(now)s, %(now)s, %(user)s, %(user)s, 0, 0,
+			%(customer)s, %(orders)s, %(spent)s, %(last_visit)s, %(returns)s, %(returned)s)
+		ON DUPLICATE KEY UPDATE
+			total_orders = total_orders + %(orders)s,
+			total_spent = total_spent + %(spent)s,
+			last_visit = COALESCE(GREATEST(last_visit, %(last_visit)s), last_visit, %(last_visit)s),
+			total_returns = total_returns + %(returns)s,
+			total_returned = total_returned + %(returned)s,
+			modified = %(now)s,
+			modified_by = %(user)s
+		""",
+		{
+			"customer": doc.customer,
+			"now": now_datetime(),
+			"user": frappe.session.user,
+			"orders": 1 - is_return,
+			"spent": 0 if is_return else flt(doc.grand_total),
+			"last_visit": None if is_return else doc.posting_date,
+			"returns": is_return,
+			"returned": abs(flt(doc.grand_total)) if is_return else 0,
+		},
+	)
@@ -0,0 +1,235 @@
+"""
+Customer delta sync for terminal caches.
+
+`get_customer_changes` returns the customers changed after a watermark, with their
+primary contact and address, scoped like the customer list (POS profile business
+type and customer groups, the user's Customer User Permissions). A customer counts
+as changed when the customer, its primary contact or its primary address is
+modified. Changed customers that were deleted, disabled or fell out of the profile's
+scope come back as tombstones so the terminal can drop them. Tombstones never name
+a customer the user's User Permissions exclude; the profile's business type and
+groups only narrow what the terminal shows.
+
+The watermark is (changed_at, name) of the last record returned; pages are read in
+that order, so a terminal resumes exactly where it stopped. It also carries a
+signature of the scope: when the profile's business type or groups, or the user's
+Customer User Permissions, change, the next call answers with `reset` and starts
+a full sync, since customers can enter or leave the scope without changing.
+"""
+
+import hashlib
+
+import frappe
+from frappe.utils import cint
+
+from klik_pos.api.customer import get_customer_list_conditions, has_customer_user_permissions
+from klik_pos.klik_pos.log import get_logger
+from klik_pos.klik_pos.utils import get_current_pos_profile
+
+logger = get_logger(__name__)
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 2000
+# Watermark of a terminal that has nothing cached yet
+EPOCH = "1900-01-01 00:00:00"
+
+_CHANGED_AT = "GREATEST(c.modified, COALESCE(ct.modified, c.modified), COALESCE(ad.modified, c.modified))"
+
+
+@frappe.whitelist()
+def get_customer_changes(since=None, after="", limit=DEFAULT_PAGE_SIZE, scope=None):
+	"""
+	Customers changed after the watermark (`since`, `after`, `scope`), oldest change
+	first. Without `since`, or with a stale `scope`, it returns every customer in
+	scope, for a full sync.
+	"""
+	try:
+		limit = min(max(cint(limit) or DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE)
+
+		pos_profile = get_current_pos_profile()
+		business_type = getattr(pos_profile, "custom_business_type", "B2C")
+		customer_group_names = []
+		if hasattr(pos_profile, "customer_groups") and pos_profile.customer_groups:
+			customer_group_names = [d.customer_group for d in pos_profile.customer_groups if d.customer_group]
+
+		current_scope = get_scope_signature(business_type, customer_group_names)
+		# The terminal's cache was built for another scope: drop it and start over
+		reset = bool(since) and scope != current_scope
+		initial = not since or reset
+		if initial:
+			since, after = EPOCH, ""
+		after = after or ""
+
+		changes = _get_changed_customers(since, after, limit, business_type, customer_group_names, initial)
+		if not initial:
+			changes.extend(_get_deleted_customers(since, after, limit))
+
+		# Both sources are in watermark order; merge them and keep one page
+		changes.sort(key=lambda row: (row.changed_at, row.name))
+		has_more = len(changes) > limit
+		changes = changes[:limit]
+
+		data, tombstones = [], []
+		for row in changes:
+			reason = _get_tombstone_reason(row)
+			if not reason:
+				data.append(_format_customer(row))
+			elif not initial:
+				# A full sync starts from an empty cache, there is nothing to drop
+				tombstones.append({"name": row.name, "reason": reason})
+
+		last = changes[-1] if changes else None
+		return {
+			"success": True,
+			"data": data,
+			"tombstones": tombstones,
+			"watermark": {
+				"since": str(last.changed_at) if last else since,
+				"after": last.name if last else after,
+				"scope": current_scope,
+			},
+			"has_more": has_more,
+			"reset": reset,
+		}
+
+	except Exception as e:
+		frappe.log_error(frappe.get_traceback(), "Customer Sync Error")
+		return {"success": False, "error": str(e)}
+
+
+def get_scope_signature(business_type, customer_group_names, user=None):
+	"""
+	Short hash of what decides the sync scope: the profile's business type and groups,
+	and the user's Customer User Permissions (count and latest change, so that both
+	added and removed permissions change it).
+	"""
+	user = user or frappe.session.user
+	permissions = (0, None)
+	if has_customer_user_permissions(user):
+		permissions = frappe.db.sql(
+			"""
+			SELECT COUNT(*), MAX(modified) FROM `tabUser Permission`
+			WHERE user = %s AND allow = 'Customer'
+			""",
+			user,
+		)[0]
+
+	key = "|".join(
+		[
+			business_type or "",
+			",".join(sorted(customer_group_names)),
+			str(permissions[0]),
+			str(permissions[1]),
+		]
+	)
+	return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def _get_changed_customers(since, after, limit, business_type, customer_group_names, initial):
+	"""
+	Up to limit + 1 customers whose own, primary contact or primary address row
+	changed: those in scope for a full sync, otherwise every customer the user's
+	permissions allow, so that the ones that left the scope become tombstones.
+	"""
+	scope_conditions, scope_params = get_customer_list_conditions(business_type, customer_group_names)
+	if initial:
+		read_conditions, read_params = scope_conditions, scope_params
+	else:
+		read_conditions, read_params = get_customer_list_conditions(None, [])
+
+	# Each union branch reads its own `modified` index; the page is ordered by the latest of the three
+	return frappe.db.sql(
+		f"""
+		SELECT c.name, c.customer_name, c.customer_type, c.customer_group, c.territory, c.default_currency,
+			c.disabled, ({scope_conditions}) AS in_scope,
+			ct.first_name, ct.last_name, ct.email_id, ct.phone, ct.mobile_no,
+			ad.address_line1, ad.city, ad.state, ad.country, ad.pincode,
+			{_CHANGED_AT} AS changed_at
+		FROM (
+			SELECT name FROM `tabCustomer` WHERE modified >= %s
+			UNION
+			SELECT cc.name FROM `tabContact` pc
+			JOIN `tabCustomer` cc ON cc.customer_primary_contact = pc.name
+			WHERE pc.modified >= %s
+			UNION
+			SELECT ca.name FROM `tabAddress` pa
+			JOIN `tabCustomer` ca ON ca.customer_primary_address = pa.name
+			WHERE pa.modified >= %s
+		) changed
+		JOIN `tabCustomer` c ON c.name = changed.name
+		LEFT JOIN `tabContact` ct ON ct.name = c.customer_primary_contact
+		LEFT JOIN `tabAddress` ad ON ad.name = c.customer_primary_address
+		WHERE ({_CHANGED_AT} > %s OR ({_CHANGED_AT} = %s AND c.name > %s))
+		  AND ({read_conditions})
+		ORDER BY changed_at, c.name
+		LIMIT %s
+		""",
+		(*scope_params, since, since, since, since, since, after, *read_params, limit + 1),
+		as_dict=True,
+	)
+
+
+def _get_deleted_customers(since, after, limit):
+	"""Up to limit + 1 customer deletions, of customers the user's permissions allow."""
+	conditions, params = "", []
+	if has_customer_user_permissions():
+		conditions = (
+			"AND deleted_name IN (SELECT up.for_value FROM `tabUser Permission` up"
+			" WHERE up.user = %s AND up.allow = 'Customer')"
+		)
+		params.append(frappe.session.user)
+
+	return frappe.db.sql(
+		f"""
+		SELECT deleted_name AS name, creation AS changed_at, 1 AS deleted
+		FROM `tabDeleted Document`
+		WHERE deleted_doctype = 'Customer'
+		  AND creation >= %s
+		  AND (creation > %s OR deleted_name > %s)
+		  {conditions}
+		ORDER BY creation, deleted_name
+		LIMIT %s
+		""",
+		(since, since, after, *params, limit + 1),
+		as_dict=True,
+	)
+
+
+def _get_tombstone_reason(row):
+	if row.get("deleted"):
+		return "deleted"
+	if cint(row.disabled):
+		return "disabled"
+	if not cint(row.in_scope):
+		return "out_of_scope"
+	return None
+
+
+def _format_customer(row):
+	"""Same shape as a get_customers row, without the sales statistics."""
+	return {
+		"name": row.name,
+		"customer_name": row.customer_name,
+		"customer_type": row.customer_type,
+		"customer_group": row.customer_group,
+		"territory": row.territory,
+		"default_currency": row.default_currency,
+		"contact": {
+			"first_name": row.first_name,
+			"last_name": row.last_name,
+			"email_id": row.email_id,
+			"phone": row.phone,
+			"mobile_no": row.mobile_no,
+		}
+		if row.first_name or row.email_id or row.phone or row.mobile_no
+		else None,
+		"address": {
+			"address_line1": row.address_line1,
+			"city": row.city,
+			"state": row.state,
+			"country": row.country,
+			"pincode": row.pincode,
+		}
+		if row.address_line1 or row.city
+		else None,
+	}
@@ -3,6 +3,7 @@ import json
 import frappe
 from frappe.utils import fmt_money, now
 
+from klik_pos.api.invoice_pdf import get_invoice_pdf_content
 from klik_pos.klik_pos.utils import get_current_pos_profile
 
 
@@ -26,7 +27,8 @@ def send_invoice_email(**kwargs):
 		pos_profile = get_current_pos_profile()
 		print_format = pos_profile.custom_pos_printformat or "Standard"
 
-		pdf_data = frappe.get_print("Sales Invoice", doc.name, print_format=print_format, as_pdf=True)
+		# Usually pre-rendered by the on_submit job
+		pdf_data = get_invoice_pdf_content(doc.name, print_format)
 
 		invoice_amount = fmt_money(doc.rounded_total or doc.grand_total, currency=doc.currency)
 
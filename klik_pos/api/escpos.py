@@ -0,0 +1,311 @@
+"""
+Native ESC/POS receipts.
+
+Turns a compact invoice payload into raw printer bytes for 80 mm and 58 mm thermal
+printers, without the Jinja print format and HTML/PDF rendering. The ZATCA QR is
+sent as a native QR block that the printer draws itself, and the logo is dithered
+to a 1-bit raster once and cached in Redis.
+"""
+
+import base64
+import io
+import textwrap
+
+import frappe
+from frappe.utils import cint, flt, get_datetime, strip_html
+
+from klik_pos.klik_pos.log import get_logger
+from klik_pos.klik_pos.utils import get_invoice_doctype
+
+logger = get_logger(__name__)
+
+ESC = b"\x1b"
+GS = b"\x1d"
+
+# Characters and printable dots per line
+PAPER_SIZES = {"80mm": (48, 576), "58mm": (32, 384)}
+
+# ESC t code page numbers (Epson numbering) by Python codec name
+CODE_PAGES = {"cp437": 0, "cp850": 2, "cp1252": 16, "cp858": 19, "cp864": 37}
+
+ALIGN = {"left": 0, "center": 1, "right": 2}
+
+# QR error correction levels for GS ( k
+QR_ERROR_CORRECTION = {"L": 48, "M": 49, "Q": 50, "H": 51}
+
+LOGO_CACHE_KEY = "klik_pos_escpos_logo"
+LOGO_MAX_HEIGHT = 160
+
+
+class EscPosBuilder:
+	"""Accumulates the ESC/POS commands of one receipt."""
+
+	def __init__(self, columns=48, code_page="cp437"):
+		self.columns = columns
+		self.encoding = code_page
+		self.buffer = bytearray(ESC + b"@")
+		self.buffer += ESC + b"t" + bytes([CODE_PAGES[code_page]])
+
+	def text(self, value="", bold=False, double=False, underline=False, align="left"):
+		self._set_style(bold, double, underline, align)
+		self.buffer += str(value).encode(self.encoding, errors="replace") + b"\n"
+		self._set_style()
+		return self
+
+	def wrapped(self, value, **style):
+		width = self.columns // 2 if style.get("double") else self.columns
+		for line in textwrap.wrap(str(value), width) or [""]:
+			self.text(line, **style)
+		return self
+
+	def row(self, left, right, bold=False, double=False):
+		"""Left and right aligned text on one line; the left side is cut to fit."""
+		width = self.columns // 2 if double else self.columns
+		left, right = str(left), str(right)
+		left = left[: max(width - len(right) - 1, 0)]
+		return self.text(left + " " * (width - len(left) - len(right)) + right, bold=bold, double=double)
+
+	def rule(self, char="-"):
+		return self.text(char * self.columns)
+
+	def qr(self, data, module_size=6, error_correction="M"):
+		"""Native QR code (model 2), drawn by the printer."""
+		payload = data.encode("utf-8")
+		store_length = len(payload) + 3
+		self.buffer += ESC + b"a" + bytes([ALIGN["center"]])
+		self.buffer += GS + b"(k" + bytes([4, 0, 49, 65, 50, 0])
+		self.buffer += GS + b"(k" + bytes([3, 0, 49, 67, module_size])
+		self.buffer += GS + b"(k" + bytes([3, 0, 49, 69, QR_ERROR_CORRECTION[error_correction]])
+		self.buffer += GS + b"(k" + bytes([store_length % 256, store_length // 256, 49, 80, 48]) + payload
+		self.buffer += GS + b"(k" + bytes([3, 0, 49, 81, 48])
+		self.buffer += b"\n" + ESC + b"a" + bytes([ALIGN["left"]])
+		return self
+
+	def raster(self, image):
+		"""Print a raster produced by rasterize_image, centered."""
+		self.buffer += ESC + b"a" + bytes([ALIGN["center"]]) + image + b"\n"
+		self.buffer += ESC + b"a" + bytes([ALIGN["left"]])
+		return self
+
+	def feed(self, lines=1):
+		self.buffer += ESC + b"d" + bytes([lines])
+		return self
+
+	def cut(self):
+		# Feed to the cutter, then partial cut
+		self.buffer += GS + b"VB" + bytes([0])
+		return self
+
+	def getvalue(self):
+		return bytes(self.buffer)
+
+	def _set_style(self, bold=False, double=False, underline=False, align="left"):
+		self.buffer += ESC + b"E" + bytes([1 if bold else 0])
+		self.buffer += ESC + b"-" + bytes([1 if underline else 0])
+		self.buffer += GS + b"!" + bytes([0x11 if double else 0])
+		self.buffer += ESC + b"a" + bytes([ALIGN[align]])
+
+
+@frappe.whitelist()
+def get_receipt_escpos(invoice_name, paper="80mm", code_page="cp437", with_logo=1):
+	"""Raw ESC/POS bytes of an invoice receipt, base64 encoded for the SPA to send to the printer."""
+	try:
+		if paper not in PAPER_SIZES:
+			frappe.throw(f"Unsupported paper size: {paper}")
+		if code_page not in CODE_PAGES:
+			frappe.throw(f"Unsupported code page: {code_page}")
+
+		doc = frappe.get_doc(get_invoice_doctype(invoice_name), invoice_name)
+		doc.check_permission("read")
+
+		logo = get_default_logo_raster(PAPER_SIZES[paper][1]) if cint(with_logo) else None
+		data = render_receipt(build_receipt_payload(doc), paper=paper, code_page=code_page, logo=logo)
+		return {
+			"success": True,
+			"data": base64.b64encode(data).decode(),
+			"encoding": "base64",
+			"size": len(data),
+		}
+	except Exception as e:
+		frappe.log_error(frappe.get_traceback(), "ESC/POS Receipt Error")
+		return {"success": False, "error": str(e)}
+
+
+def build_receipt_payload(doc):
+	"""The fields a receipt prints, read once from the invoice."""
+	precision = doc.precision("grand_total") or 2
+	posting = get_datetime(f"{doc.posting_date} {doc.posting_time or '00:00:00'}")
+
+	return {
+		"company": doc.company,
+		"company_address": strip_html(doc.get("company_address_display") or "").strip(),
+		"name": doc.name,
+		"posting": posting.strftime("%Y-%m-%d %H:%M"),
+		"is_return": cint(doc.is_return),
+		"status": doc.status or "Submitted",
+		"cashier": frappe.utils.get_fullname(doc.owner),
+		"currency": doc.currency,
+		"precision": precision,
+		"items": [
+			{
+				"item_name": item.item_name or item.item_code,
+				"qty": item.qty,
+				"rate": item.rate,
+				"amount": item.amount,
+			}
+			for item in doc.items
+		],
+		"total_qty": doc.total_qty,
+		"net_total": doc.net_total,
+		"taxes": [
+			{"description": tax.description, "amount": tax.tax_amount}
+			for tax in doc.get("taxes") or []
+			if flt(tax.tax_amount)
+		],
+		"total_taxes_and_charges": doc.total_taxes_and_charges,
+		"grand_total": doc.grand_total,
+		"rounding_adjustment": doc.get("rounding_adjustment"),
+		"payments": [
+			{"mode_of_payment": payment.mode_of_payment, "amount": payment.amount}
+			for payment in doc.get("payments") or []
+		],
+		"customer_name": doc.customer_name,
+		"contact_mobile": doc.get("contact_mobile"),
+		"qr": get_zatca_qr_data(doc, posting),
+	}
+
+
+def render_receipt(payload, paper="80mm", code_page="cp437", logo=None):
+	"""ESC/POS bytes for a payload from build_receipt_payload; mirrors the Thermal Printer PF layout."""
+	columns, _dots = PAPER_SIZES[paper]
+	precision = payload.get("precision", 2)
+
+	def money(value):
+		return f"{flt(value):,.{precision}f}"
+
+	receipt = EscPosBuilder(columns, code_page)
+	if logo:
+		receipt.raster(logo)
+
+	receipt.wrapped(payload["company"], bold=True, double=True, align="center")
+	if payload.get("company_address"):
+		receipt.wrapped(payload["company_address"], align="center")
+	receipt.text(payload["posting"], align="center")
+	receipt.text("Return" if payload.get("is_return") else "Quick Bill", bold=True, align="center")
+	receipt.text(f"Order No: {payload['name']}", bold=True, align="center")
+	receipt.rule()
+
+	receipt.row("Payment Status:", payload["status"])
+	receipt.row("Cashier:", payload["cashier"])
+	receipt.rule()
+
+	receipt.row("# Item", "Amount", bold=True)
+	for idx, item in enumerate(payload["items"], start=1):
+		receipt.wrapped(f"{idx} {item['item_name']}")
+		receipt.row(f"   {flt(item['qty']):g} x {money(item['rate'])}", money(item["amount"]))
+	receipt.rule()
+
+	receipt.row("Total Qty", f"{flt(payload['total_qty']):g}")
+	receipt.row("Subtotal:", money(payload["net_total"]))
+	for tax in payload["taxes"]:
+		receipt.row(f"{tax['description']}:", money(tax["amount"]))
+	if flt(payload["total_taxes_and_charges"]):
+		receipt.row("Total Tax:", money(payload["total_taxes_and_charges"]))
+	receipt.rule("=")
+	receipt.row("Total", f"{money(payload['grand_total'])} {payload['currency']}", bold=True, double=True)
+	receipt.rule("=")
+	if flt(payload.get("rounding_adjustment")):
+		receipt.row("Rounding:", money(payload["rounding_adjustment"]))
+
+	for payment in payload["payments"]:
+		receipt.row(f"{payment['mode_of_payment']}:", money(payment["amount"]))
+
+	if payload.get("customer_name"):
+		receipt.rule()
+		receipt.row("Customer:", payload["customer_name"])
+		if payload.get("contact_mobile"):
+			receipt.row("Phone:", payload["contact_mobile"])
+
+	if payload.get("qr"):
+		receipt.feed(1)
+		receipt.qr(payload["qr"])
+
+	receipt.feed(1)
+	receipt.text("Thank you for your business", align="center")
+	return receipt.feed(2).cut().getvalue()
+
+
+def get_zatca_qr_data(doc, posting=None):
+	"""
+	Base64 TLV of the ZATCA simplified-invoice QR (seller, VAT number, time, total, VAT).
+	Empty when the company has no VAT number.
+	"""
+	tax_id = frappe.get_cached_value("Company", doc.company, "tax_id")
+	if not tax_id:
+		return ""
+
+	posting = posting or get_datetime(f"{doc.posting_date} {doc.posting_time or '00:00:00'}")
+	values = (
+		doc.company,
+		tax_id,
+		posting.strftime("%Y-%m-%dT%H:%M:%S"),
+		f"{flt(doc.grand_total):.2f}",
+		f"{flt(doc.total_taxes_and_charges):.2f}",
+	)
+
+	tlv = bytearray()
+	for tag, value in enumerate(values, start=1):
+		encoded = str(value).encode("utf-8")
+		tlv += bytes([tag, len(encoded)]) + encoded
+	return base64.b64encode(bytes(tlv)).decode()
+
+
+def rasterize_image(content, max_width, max_height=LOGO_MAX_HEIGHT):
+	"""GS v 0 raster of an image, scaled to fit and Floyd-Steinberg dithered to 1 bit."""
+	from PIL import Image
+
+	image = Image.open(io.BytesIO(content))
+	if image.mode in ("RGBA", "LA", "P"):
+		# Transparent areas print as paper, not black
+		image = image.convert("RGBA")
+		background = Image.new("RGBA", image.size, "white")
+		image = Image.alpha_composite(background, image)
+
+	image = image.convert("L")
+	image.thumbnail((max_width, max_height))
+	bitmap = image.convert("1")
+
+	width_bytes = (bitmap.width + 7) // 8
+	# PIL stores 1 as white; the printer burns dots for 1
+	data = bytes(byte ^ 0xFF for byte in bitmap.tobytes())
+	header = (
+		GS
+		+ b"v0"
+		+ bytes([0, width_bytes % 256, width_bytes // 256, bitmap.height % 256, bitmap.height // 256])
+	)
+	return header + data
+
+
+def get_default_logo_raster(max_width):
+	"""Raster of the default Letter Head image, cached per width."""
+	file_url = frappe.db.get_value("Letter Head", {"is_default": 1}, "image")
+	if not file_url:
+		return None
+
+	cache_field = f"{file_url}|{max_width}"
+	raster = frappe.cache().hget(LOGO_CACHE_KEY, cache_field)
+	if raster is None:
+		try:
+			content = frappe.get_doc("File", {"file_url": file_url}).get_content()
+			raster = rasterize_image(content, max_width)
+		except Exception:
+			logger.warning("Could not rasterize receipt logo %s", file_url, exc_info=True)
+			raster = b""
+		frappe.cache().hset(LOGO_CACHE_KEY, cache_field, raster)
+
+	return raster or None
+
+
+def clear_logo_cache(doc=None, method=None):
+	"""doc_events hook: drop cached logo rasters when a Letter Head changes."""
+	frappe.cache().delete_value(LOGO_CACHE_KEY)
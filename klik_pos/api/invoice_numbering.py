@@ -0,0 +1,265 @@
+"""
+Per-shift invoice number blocks.
+
+When a POS Profile sets "Invoice Number Block Size", the naming-series counter is
+advanced once per block and every sale of the POS Opening Entry takes the next
+number from its own block row. Checkouts on different terminals then no longer
+queue behind the shared `tabSeries` row lock on every save.
+
+Numbers are taken inside the invoice transaction, so a failed checkout rolls the
+block counter back and leaves no gap. Numbers left over at shift close are
+returned to the series when no other block was reserved after them, otherwise the
+unused range is recorded on the block.
+"""
+
+import frappe
+from frappe.model.naming import NamingSeries, get_default_naming_series, parse_naming_series
+from frappe.utils import cint, now_datetime
+
+BLOCK_DOCTYPE = "POS Invoice Number Block"
+
+# Reserve the next block in the background once this share of the current one is used
+REFILL_THRESHOLD = 0.8
+
+
+def get_block_size(pos_profile_name):
+	if not pos_profile_name:
+		return 0
+	return cint(frappe.get_cached_value("POS Profile", pos_profile_name, "custom_invoice_number_block_size"))
+
+
+def assign_reserved_invoice_name(doc):
+	"""
+	Name a new Sales/POS Invoice from its opening entry's reserved block.
+	Does nothing when blocks are disabled on the POS Profile or the invoice has no opening entry.
+	"""
+	block_size = get_block_size(doc.get("pos_profile"))
+	opening_entry = doc.get("custom_pos_opening_entry")
+	if block_size <= 0 or not opening_entry:
+		return None
+
+	if not doc.get("naming_series"):
+		doc.naming_series = get_default_naming_series(doc.doctype)
+	if not doc.naming_series:
+		return None
+
+	series = NamingSeries(doc.naming_series).series
+	prefix, digits = get_series_key(series, doc)
+	if not prefix:
+		return None
+
+	number = _take_number(opening_entry, doc.doctype, prefix)
+	if number is None:
+		block = reserve_invoice_number_block(
+			opening_entry, doc.pos_profile, doc.doctype, doc.naming_series, prefix, digits, block_size
+		)
+		number = _take_number(opening_entry, doc.doctype, prefix, block=block)
+
+	doc.name = parse_naming_series(
+		series, doc=doc, number_generator=lambda _prefix, width: ("%0" + str(width) + "d") % number
+	)
+	doc.flags.name_set = True
+	return doc.name
+
+
+def get_series_key(series, doc=None):
+	"""Resolve the `tabSeries` key (e.g. ACC-SINV-2025-) and counter width of a naming series."""
+	key = {}
+
+	def capture(prefix, digits):
+		key.update(prefix=prefix, digits=digits)
+		return "#" * digits
+
+	parse_naming_series(series, doc=doc, number_generator=capture)
+	return key.get("prefix"), key.get("digits")
+
+
+def reserve_invoice_number_block(
+	opening_entry, pos_profile, invoice_doctype, naming_series, prefix, digits, block_size
+):
+	"""Advance the shared series counter by `block_size` in one step and record the range."""
+	start_number = _advance_series(prefix, block_size)
+
+	block = frappe.get_doc(
+		{
+			"doctype": BLOCK_DOCTYPE,
+			"pos_opening_entry": opening_entry,
+			"pos_profile": pos_profile,
+			"invoice_doctype": invoice_doctype,
+			"naming_series": naming_series,
+			"series_prefix": prefix,
+			"digits": digits,
+			"start_number": start_number,
+			"end_number": start_number + block_size - 1,
+			"next_number": start_number,
+			"status": "Active",
+		}
+	)
+	block.insert(ignore_permissions=True)
+	return block.name
+
+
+def refill_invoice_number_block(opening_entry, pos_profile, invoice_doctype, naming_series, prefix, digits):
+	"""Background job: reserve the next block before the current one runs out."""
+	if frappe.db.get_value("POS Opening Entry", opening_entry, "status") != "Open":
+		return
+
+	if len(_get_active_blocks(opening_entry, invoice_doctype, prefix)) > 1:
+		return
+
+	block_size = get_block_size(pos_profile)
+	if block_size > 0:
+		reserve_invoice_number_block(
+			opening_entry, pos_profile, invoice_doctype, naming_series, prefix, digits, block_size
+		)
+
+
+def close_invoice_number_blocks(doc, method=None):
+	"""
+	doc_events hook for POS Closing Entry on_submit: release or report the numbers
+	the shift did not use.
+	"""
+	for block in frappe.get_all(
+		BLOCK_DOCTYPE,
+		filters={"pos_opening_entry": doc.pos_opening_entry, "status": ["in", ["Active", "Exhausted"]]},
+		fields=["name", "series_prefix", "end_number", "next_number"],
+		order_by="start_number desc",
+	):
+		values = {"closed_on": now_datetime(), "unused_from": 0, "unused_to": 0, "unused_count": 0}
+
+		if block.next_number > block.end_number:
+			values["status"] = "Exhausted"
+		elif _release_to_series(block):
+			values["status"] = "Released"
+		else:
+			values.update(
+				{
+					"status": "Closed",
+					"unused_from": block.next_number,
+					"unused_to": block.end_number,
+					"unused_count": block.end_number - block.next_number + 1,
+				}
+			)
+
+		frappe.db.set_value(BLOCK_DOCTYPE, block.name, values, update_modified=False)
+
+
+@frappe.whitelist()
+def get_invoice_number_block_report(opening_entry):
+	"""Reserved ranges of a shift with the numbers left unused at close."""
+	try:
+		blocks = frappe.get_all(
+			BLOCK_DOCTYPE,
+			filters={"pos_opening_entry": opening_entry},
+			fields=[
+				"name",
+				"invoice_doctype",
+				"series_prefix",
+				"start_number",
+				"end_number",
+				"next_number",
+				"status",
+				"unused_from",
+				"unused_to",
+				"unused_count",
+			],
+			order_by="start_number asc",
+		)
+		return {
+			"success": True,
+			"data": blocks,
+			"unused_count": sum(cint(block.unused_count) for block in blocks),
+		}
+	except Exception as e:
+		frappe.log_error(frappe.get_traceback(), "Invoice Number Block Report Error")
+		return {"success": False, "error": str(e)}
+
+
+def _get_active_blocks(opening_entry, invoice_doctype, prefix):
+	return frappe.get_all(
+		BLOCK_DOCTYPE,
+		filters={
+			"pos_opening_entry": opening_entry,
+			"invoice_doctype": invoice_doctype,
+			"series_prefix": prefix,
+			"status": "Active",
+		},
+		pluck="name",
+		order_by="start_number asc",
+	)
+
+
+def _take_number(opening_entry, invoice_doctype, prefix, block=None):
+	"""Take the next number from the shift's oldest active block, locking only that block row."""
+	blocks = [block] if block else _get_active_blocks(opening_entry, invoice_doctype, prefix)
+
+	for block_name in blocks:
+		row = frappe.db.sql(
+			f"""
+			SELECT name, pos_profile, naming_series, digits, start_number, end_number, next_number
+			FROM `tab{BLOCK_DOCTYPE}`
+			WHERE name = %s AND status = 'Active'
+			FOR UPDATE
+			""",
+			(block_name,),
+			as_dict=True,
+		)
+		if not row:
+			continue
+
+		row = row[0]
+		if row.next_number > row.end_number:
+			frappe.db.set_value(BLOCK_DOCTYPE, row.name, "status", "Exhausted", update_modified=False)
+			continue
+
+		number = row.next_number
+		frappe.db.set_value(BLOCK_DOCTYPE, row.name, "next_number", number + 1, update_modified=False)
+
+		used = number - row.start_number + 1
+		if used == int((row.end_number - row.start_number + 1) * REFILL_THRESHOLD):
+			frappe.enqueue(
+				"klik_pos.api.invoice_numbering.refill_invoice_number_block",
+				queue="short",
+				job_id=f"klik_invoice_block::{opening_entry}::{invoice_doctype}::{prefix}",
+				deduplicate=True,
+				enqueue_after_commit=True,
+				opening_entry=opening_entry,
+				pos_profile=row.pos_profile,
+				invoice_doctype=invoice_doctype,
+				naming_series=row.naming_series,
+				prefix=prefix,
+				digits=row.digits,
+			)
+
+		return number
+
+	return None
+
+
+def _advance_series(prefix, count):
+	"""Same as frappe.model.naming.getseries, but moves the counter by `count`. Returns the first number."""
+	current = frappe.db.sql("SELECT `current` FROM `tabSeries` WHERE `name` = %s FOR UPDATE", (prefix,))
+	if current and current[0][0] is not None:
+		frappe.db.sql(
+			"UPDATE `tabSeries` SET `current` = `current` + %s WHERE `name` = %s",
+			(count, prefix),
+		)
+		return cint(current[0][0]) + 1
+
+	frappe.db.sql("INSERT INTO `tabSeries` (`name`, `current`) VALUES (%s, %s)", (prefix, count))
+	return 1
+
+
+def _release_to_series(block):
+	"""Hand unused numbers back when nothing was reserved after this block."""
+	current = frappe.db.sql(
+		"SELECT `current` FROM `tabSeries` WHERE `name` = %s FOR UPDATE", (block.series_prefix,)
+	)
+	if not current or cint(current[0][0]) != block.end_number:
+		return False
+
+	frappe.db.sql(
+		"UPDATE `tabSeries` SET `current` = %s WHERE `name` = %s",
+		(block.next_number - 1, block.series_prefix),
+	)
+	return True
@@ -0,0 +1,144 @@
+"""
+Pre-rendered invoice PDFs.
+
+The PDF of a submitted POS invoice is rendered once, in a background job queued
+right after submit, and saved as a private File attached to the invoice. The file
+name carries a digest of (print format, invoice modified), so email and WhatsApp
+reuse the stored file until the invoice changes, and only render in the request
+when the job has not run yet. WhatsApp fetches documents from a URL, so sending
+one publishes a copy under an unguessable file name.
+"""
+
+import hashlib
+
+import frappe
+from frappe.utils import get_url
+
+from klik_pos.klik_pos.log import get_logger
+from klik_pos.klik_pos.utils import get_current_pos_profile
+
+logger = get_logger(__name__)
+
+DEFAULT_PRINT_FORMAT = "Standard"
+
+
+def prerender_invoice_pdf(doc, method=None):
+	"""doc_events hook for Sales Invoice / POS Invoice on_submit: render the receipt PDF in the background."""
+	if not doc.get("custom_pos_opening_entry"):
+		return
+
+	print_format = get_pos_print_format(doc.get("pos_profile"))
+	frappe.enqueue(
+		"klik_pos.api.invoice_pdf.get_invoice_pdf",
+		queue="short",
+		job_id=f"klik_pos_invoice_pdf::{doc.doctype}::{doc.name}::{print_format}",
+		deduplicate=True,
+		enqueue_after_commit=True,
+		doctype=doc.doctype,
+		invoice_name=doc.name,
+		print_format=print_format,
+	)
+
+
+def get_invoice_pdf(invoice_name, print_format=None, doctype="Sales Invoice"):
+	"""File of the invoice's PDF for this print format, rendered now only if not cached yet."""
+	print_format = print_format or get_pos_print_format()
+	modified = frappe.db.get_value(doctype, invoice_name, "modified")
+	if not modified:
+		frappe.throw(f"{doctype} {invoice_name} not found")
+
+	file_name = _get_file_name(invoice_name, print_format, modified)
+	cached = frappe.db.get_value(
+		"File",
+		{"attached_to_doctype": doctype, "attached_to_name": invoice_name, "file_name": file_name},
+		"name",
+	)
+	if cached:
+		return frappe.get_doc("File", cached)
+
+	logger.debug("Rendering %s PDF for %s", print_format, invoice_name)
+	pdf_content = frappe.get_print(doctype, invoice_name, print_format, as_pdf=True)
+	filedoc = frappe.get_doc(
+		{
+			"doctype": "File",
+			"file_name": file_name,
+			"attached_to_doctype": doctype,
+			"attached_to_name": invoice_name,
+			"content": pdf_content,
+			"is_private": 1,
+		}
+	)
+	filedoc.save(ignore_permissions=True)
+	_delete_stale_pdfs(doctype, invoice_name, print_format, keep=filedoc.name)
+	return filedoc
+
+
+def get_invoice_pdf_content(invoice_name, print_format=None, doctype="Sales Invoice"):
+	return get_invoice_pdf(invoice_name, print_format, doctype).get_content()
+
+
+def get_invoice_pdf_url(invoice_name, print_format=None, doctype="Sales Invoice"):
+	"""Public URL of the invoice's PDF, for channels that fetch the document themselves (WhatsApp)."""
+	filedoc = get_invoice_pdf(invoice_name, print_format, doctype)
+	base_name = filedoc.file_name.removesuffix(".pdf")
+	public = frappe.db.get_value(
+		"File",
+		{
+			"attached_to_doctype": doctype,
+			"attached_to_name": invoice_name,
+			"is_private": 0,
+			"file_name": ["like", f"{base_name}-%.pdf"],
+		},
+		"file_url",
+	)
+	if not public:
+		public_doc = frappe.get_doc(
+			{
+				"doctype": "File",
+				"file_name": f"{base_name}-{frappe.generate_hash(length=16)}.pdf",
+				"attached_to_doctype": doctype,
+				"attached_to_name": invoice_name,
+				"content": filedoc.get_content(),
+				"is_private": 0,
+			}
+		)
+		public_doc.save(ignore_permissions=True)
+		public = public_doc.file_url
+	return get_url(public)
+
+
+def get_pos_print_format(pos_profile_name=None):
+	"""Receipt print format of a POS Profile, or of the current user's profile."""
+	if pos_profile_name:
+		print_format = frappe.get_cached_value("POS Profile", pos_profile_name, "custom_pos_printformat")
+	else:
+		pos_profile = get_current_pos_profile()
+		print_format = pos_profile.get("custom_pos_printformat") if pos_profile else None
+	return print_format or DEFAULT_PRINT_FORMAT
+
+
+def _get_file_name(invoice_name, print_format, modified):
+	return f"{invoice_name}-{_get_format_key(print_format)}-{_get_version_key(modified)}.pdf"
+
+
+def _get_format_key(print_format):
+	return hashlib.md5(print_format.encode(), usedforsecurity=False).hexdigest()[:8]
+
+
+def _get_version_key(modified):
+	return hashlib.md5(str(modified).encode(), usedforsecurity=False).hexdigest()[:8]
+
+
+def _delete_stale_pdfs(doctype, invoice_name, print_format, keep):
+	"""Drop earlier renders of the same invoice and print format, and their public copies."""
+	for name in frappe.get_all(
+		"File",
+		filters={
+			"attached_to_doctype": doctype,
+			"attached_to_name": invoice_name,
+			"file_name": ["like", f"{invoice_name}-{_get_format_key(print_format)}-%.pdf"],
+			"name": ["!=", keep],
+		},
+		pluck="name",
+	):
+		frappe.delete_doc("File", name, ignore_permissions=True, force=True)
@@ -0,0 +1,411 @@
+"""
+Materialized POS invoice summaries.
+
+One "POS Invoice Summary" row per KLiK invoice holds everything the history list
+shows: cashier name, payment methods, items with returned quantities and return
+status. Rows are written by doc_events on Sales Invoice / POS Invoice, so the
+history screen pages through one indexed table instead of rebuilding the summary
+from invoice, payment and item rows on every request. Payment Entries, POS Closing
+Entries and an hourly status sync keep the status of open invoices current; a POS
+Invoice counts as open until it is consolidated.
+"""
+
+import hashlib
+import json
+
+import frappe
+from frappe.query_builder import Order
+from frappe.query_builder.functions import Count
+from frappe.utils import cint, flt, get_datetime
+
+from klik_pos.api.return_ledger import get_returned_qty_map
+from klik_pos.klik_pos.log import get_logger
+from klik_pos.klik_pos.utils import get_klik_invoice_doctypes
+
+logger = get_logger(__name__)
+
+SUMMARY_DOCTYPE = "POS Invoice Summary"
+
+# Redis hash of invoice history row counts, one field per filter signature
+INVOICE_COUNT_CACHE_KEY = "klik_pos_invoice_counts"
+
+# Invoice columns copied as-is onto the summary
+SUMMARY_FIELDS = (
+	"posting_date",
+	"posting_time",
+	"customer",
+	"customer_name",
+	"pos_profile",
+	"currency",
+	"base_grand_total",
+	"base_rounded_total",
+	"discount_amount",
+	"total_taxes_and_charges",
+	"status",
+	"is_return",
+	"return_against",
+)
+
+REBUILD_BATCH_SIZE = 500
+
+# Statuses ERPNext can change without saving the invoice (payments, the daily overdue update)
+OPEN_STATUSES = ("Unpaid", "Partly Paid", "Overdue", "Unpaid and Discounted", "Partly Paid and Discounted")
+# POS Invoice statuses that consolidation at shift close turns into "Consolidated"
+UNCONSOLIDATED_STATUSES = ("Paid", "Return")
+
+
+def update_invoice_summary(doc, method=None):
+	"""
+	doc_events hook for Sales Invoice and POS Invoice: write the invoice's summary
+	and, for returns, refresh the original invoice's returned quantities.
+	"""
+	if method == "on_update" and doc.docstatus != 0:
+		# Submitted invoices are summarized by on_submit, after ERPNext sets the final status
+		return
+
+	if doc.get("custom_pos_opening_entry"):
+		write_invoice_summaries(doc.doctype, [doc.name])
+
+	if doc.get("is_return") and doc.get("return_against"):
+		write_invoice_summaries(doc.doctype, [doc.return_against], only_existing=True)
+
+	clear_invoice_count_cache()
+
+
+def delete_invoice_summary(doc, method=None):
+	"""doc_events hook: drop the summary of a deleted invoice."""
+	frappe.db.delete(SUMMARY_DOCTYPE, {"invoice": doc.name})
+	clear_invoice_count_cache()
+
+
+def refresh_invoice_summary(invoice_doctype, invoice_name):
+	"""Re-read an invoice after a db_set (e.g. payment entry status) that skips doc_events."""
+	write_invoice_summaries(invoice_doctype, [invoice_name], only_existing=True)
+
+
+def refresh_payment_invoice_summaries(doc, method=None):
+	"""doc_events hook for Payment Entry on_submit / on_cancel: the paid invoices' status changed."""
+	names_by_doctype = {}
+	for reference in doc.get("references") or []:
+		if reference.reference_doctype in ("Sales Invoice", "POS Invoice"):
+			names_by_doctype.setdefault(reference.reference_doctype, set()).add(reference.reference_name)
+
+	for invoice_doctype, names in names_by_doctype.items():
+		write_invoice_summaries(invoice_doctype, names, only_existing=True)
+
+
+def refresh_closing_entry_invoice_summaries(doc, method=None):
+	"""doc_events hook for POS Closing Entry on_submit: its POS Invoices were consolidated."""
+	names = [row.pos_invoice for row in doc.get("pos_transactions") or [] if row.pos_invoice]
+	write_invoice_summaries("POS Invoice", names, only_existing=True)
+
+
+def sync_invoice_summary_statuses():
+	"""
+	Scheduled job: rewrite the summaries of open invoices whose status changed
+	without doc_events, e.g. by ERPNext's daily overdue update, a Journal Entry or
+	a consolidation that ran in a background job.
+	"""
+	# Summaries of both doctypes, even once no POS Profile records POS Invoices any more
+	for invoice_doctype in ("Sales Invoice", "POS Invoice"):
+		statuses = OPEN_STATUSES
+		if invoice_doctype == "POS Invoice":
+			statuses += UNCONSOLIDATED_STATUSES
+		names = frappe.db.sql_list(
+			f"""
+			SELECT s.invoice
+			FROM `tab{SUMMARY_DOCTYPE}` s
+			JOIN `tab{invoice_doctype}` inv ON inv.name = s.invoice
+			WHERE s.status IN %(statuses)s
+			  AND s.invoice_doctype = %(invoice_doctype)s
+			  AND inv.status != s.status
+			""",
+			{"statuses": statuses, "invoice_doctype": invoice_doctype},
+		)
+		for start in range(0, len(names), REBUILD_BATCH_SIZE):
+			write_invoice_summaries(
+				invoice_doctype, names[start : start + REBUILD_BATCH_SIZE], only_existing=True
+			)
+			frappe.db.commit()
+
+		if names:
+			logger.info("Synced %s %s summary statuses", len(names), invoice_doctype)
+
+
+def write_invoice_summaries(invoice_doctype, invoice_names, only_existing=False):
+	"""Build and upsert summaries for a batch of invoices of one doctype."""
+	if not invoice_names:
+		return
+
+	meta = frappe.get_meta(invoice_doctype)
+	fields = ["name", "modified", "owner", "docstatus", "custom_pos_opening_entry", *SUMMARY_FIELDS]
+	optional_fields = {
+		"custom_zatca_submit_status": "zatca_submit_status",
+		"custom_payment_entry_status": "payment_entry_status",
+		"custom_payment_entry": "payment_entry",
+	}
+	fields.extend(field for field in optional_fields if meta.has_field(field))
+
+	invoices = frappe.get_all(
+		invoice_doctype,
+		filters={"name": ["in", list(invoice_names)], "custom_pos_opening_entry": ["!=", ""]},
+		fields=fields,
+	)
+	for inv in invoices:
+		inv["doctype"] = invoice_doctype
+	enrich_invoice_rows(invoices)
+
+	existing = set(
+		frappe.get_all(SUMMARY_DOCTYPE, filters={"invoice": ["in", list(invoice_names)]}, pluck="name")
+	)
+
+	for inv in invoices:
+		if only_existing and inv.name not in existing:
+			continue
+
+		values = {field: inv.get(field) for field in SUMMARY_FIELDS}
+		values.update(
+			{
+				"invoice_doctype": invoice_doctype,
+				"invoice": inv.name,
+				"invoice_modified": inv.modified,
+				"invoice_docstatus": inv.docstatus,
+				"pos_opening_entry": inv.custom_pos_opening_entry,
+				"cashier": inv.owner,
+				"cashier_name": inv.cashier_name,
+				"mode_of_payment": inv.mode_of_payment,
+				"payment_methods": json.dumps(inv.payment_methods, default=str),
+				"items": json.dumps(inv["items"], default=str),
+				"item_count": len(inv["items"]),
+				"return_status": _get_return_status(inv["items"]),
+			}
+		)
+		for field, summary_field in optional_fields.items():
+			values[summary_field] = inv.get(field)
+
+		if inv.name in existing:
+			frappe.db.set_value(SUMMARY_DOCTYPE, inv.name, values, update_modified=False)
+		else:
+			summary = frappe.get_doc({"doctype": SUMMARY_DOCTYPE, **values})
+			summary.db_insert()
+
+
+def get_invoice_summaries(opening_entry=None, search_term=None, cursor=None, limit=100, start=0):
+	"""
+	One page of history rows in the get_sales_invoices response shape, ordered by
+	(invoice modified, invoice name) desc and continuing after `cursor` when given.
+	"""
+	summary = frappe.qb.DocType(SUMMARY_DOCTYPE)
+	query = frappe.qb.from_(summary).select(
+		summary.invoice.as_("name"),
+		summary.invoice_doctype.as_("doctype"),
+		summary.invoice_modified.as_("modified"),
+		summary.cashier.as_("owner"),
+		summary.pos_opening_entry.as_("custom_pos_opening_entry"),
+		summary.zatca_submit_status,
+		summary.payment_entry_status,
+		summary.payment_entry,
+		summary.cashier_name,
+		summary.mode_of_payment,
+		summary.payment_methods,
+		summary.items,
+		*[summary[field] for field in SUMMARY_FIELDS],
+	)
+	for condition in _get_summary_conditions(summary, opening_entry, search_term):
+		query = query.where(condition)
+
+	if cursor:
+		cursor_modified, _sep, cursor_name = cursor.rpartition("|")
+		cursor_modified = get_datetime(cursor_modified)
+		query = query.where(
+			(summary.invoice_modified < cursor_modified)
+			| ((summary.invoice_modified == cursor_modified) & (summary.invoice < cursor_name))
+		)
+
+	query = query.orderby(summary.invoice_modified, order=Order.desc).orderby(
+		summary.invoice, order=Order.desc
+	)
+	query = query.limit(limit)
+	if start:
+		query = query.offset(start)
+
+	has_zatca_status = frappe.get_meta("Sales Invoice").has_field("custom_zatca_submit_status")
+	has_payment_entry_status = frappe.get_meta("Sales Invoice").has_field("custom_payment_entry_status")
+
+	rows = query.run(as_dict=True)
+	for row in rows:
+		row["posting_time"] = _format_posting_time(row.get("posting_time"))
+		row["payment_methods"] = [frappe._dict(p) for p in json.loads(row.payment_methods or "[]")]
+		row["items"] = [frappe._dict(i) for i in json.loads(row["items"] or "[]")]
+
+		zatca_submit_status = row.pop("zatca_submit_status")
+		if has_zatca_status and row.doctype == "Sales Invoice":
+			row["custom_zatca_submit_status"] = zatca_submit_status
+
+		payment_entry_status = row.pop("payment_entry_status")
+		payment_entry = row.pop("payment_entry")
+		if has_payment_entry_status and row.doctype == "Sales Invoice":
+			row["custom_payment_entry_status"] = payment_entry_status
+			row["custom_payment_entry"] = payment_entry
+	return rows
+
+
+def get_cached_invoice_count(opening_entry=None, search_term=None):
+	"""
+	Row count for one invoice-history filter signature, cached until an invoice
+	is created, submitted or cancelled (see clear_invoice_count_cache).
+	"""
+	signature = hashlib.sha1(json.dumps([opening_entry, search_term or ""]).encode()).hexdigest()
+	count = frappe.cache().hget(INVOICE_COUNT_CACHE_KEY, signature)
+	if count is None:
+		summary = frappe.qb.DocType(SUMMARY_DOCTYPE)
+		query = frappe.qb.from_(summary).select(Count("*"))
+		for condition in _get_summary_conditions(summary, opening_entry, search_term):
+			query = query.where(condition)
+		count = cint(query.run()[0][0])
+		frappe.cache().hset(INVOICE_COUNT_CACHE_KEY, signature, count)
+	return count
+
+
+def clear_invoice_count_cache(doc=None, method=None):
+	"""Drop cached invoice history counts."""
+	frappe.cache().delete_value(INVOICE_COUNT_CACHE_KEY)
+
+
+@frappe.whitelist()
+def rebuild_invoice_summaries():
+	"""Rebuild every summary in a background job (System Manager only)."""
+	frappe.only_for("System Manager")
+	frappe.enqueue(
+		"klik_pos.api.invoice_summary.build_all_invoice_summaries",
+		queue="long",
+		timeout=3600,
+		job_id="klik_pos_rebuild_invoice_summaries",
+		deduplicate=True,
+	)
+	return {"success": True, "message": "Invoice summary rebuild queued"}
+
+
+def build_all_invoice_summaries():
+	"""Backfill summaries for all KLiK invoices in batches (also used by the install patch)."""
+	for invoice_doctype in get_klik_invoice_doctypes():
+		last_name = ""
+		while True:
+			names = frappe.get_all(
+				invoice_doctype,
+				filters={"custom_pos_opening_entry": ["!=", ""], "name": [">", last_name]},
+				pluck="name",
+				order_by="name asc",
+				limit=REBUILD_BATCH_SIZE,
+			)
+			if not names:
+				break
+
+			write_invoice_summaries(invoice_doctype, names)
+			frappe.db.commit()
+			last_name = names[-1]
+			logger.info("Summarized %s %s up to %s", len(names), invoice_doctype, last_name)
+
+	clear_invoice_count_cache()
+
+
+def enrich_invoice_rows(invoices):
+	"""
+	Add cashier_name, payment_methods, mode_of_payment and items (with returned_qty)
+	to invoice list rows, using a fixed number of grouped queries per invoice doctype.
+	"""
+	if not invoices:
+		return invoices
+
+	owners = {inv.owner for inv in invoices if inv.get("owner")}
+	cashier_names = dict(
+		frappe.get_all(
+			"User", filters={"name": ["in", list(owners)]}, fields=["name", "full_name"], as_list=True
+		)
+	)
+
+	payments_by_invoice = {}
+	items_by_invoice = {}
+	names_by_doctype = {}
+	for inv in invoices:
+		names_by_doctype.setdefault(inv.get("doctype") or "Sales Invoice", []).append(inv.name)
+
+	for invoice_doctype, names in names_by_doctype.items():
+		for payment in frappe.get_all(
+			"Sales Invoice Payment",
+			filters={"parent": ["in", names], "parenttype": invoice_doctype},
+			fields=["parent", "mode_of_payment", "amount"],
+			order_by="parent asc, idx asc",
+		):
+			payments_by_invoice.setdefault(payment.pop("parent"), []).append(payment)
+
+		for item in frappe.get_all(
+			f"{invoice_doctype} Item",
+			filters={"parent": ["in", names]},
+			fields=["parent", "item_code", "qty", "rate", "amount"],
+			order_by="parent asc, idx asc",
+		):
+			items_by_invoice.setdefault(item.pop("parent"), []).append(item)
+
+	returned_by_item = get_returned_qty_map([inv.name for inv in invoices])
+
+	for inv in invoices:
+		inv["cashier_name"] = cashier_names.get(inv.owner) or inv.owner
+		inv["posting_time"] = _format_posting_time(inv.get("posting_time"))
+
+		payment_methods = payments_by_invoice.get(inv.name, [])
+		inv["payment_methods"] = payment_methods
+
+		# Set backward-compatible mode_of_payment field
+		if len(payment_methods) == 0:
+			inv["mode_of_payment"] = "-"
+		elif len(payment_methods) == 1:
+			inv["mode_of_payment"] = payment_methods[0]["mode_of_payment"]
+		else:
+			inv["mode_of_payment"] = "/".join([pm["mode_of_payment"] for pm in payment_methods])
+
+		items = items_by_invoice.get(inv.name, [])
+		for item in items:
+			item["returned_qty"] = returned_by_item.get((inv.name, item.item_code), 0.0)
+			item["quantity"] = item.qty  # For backward compatibility
+		inv["items"] = items
+
+	return invoices
+
+
+def _get_summary_conditions(summary, opening_entry=None, search_term=None):
+	if opening_entry:
+		conditions = [summary.pos_opening_entry == opening_entry]
+	else:
+		conditions = [summary.pos_opening_entry != ""]
+
+	if search_term:
+		pattern = f"%{search_term}%"
+		conditions.append(
+			summary.invoice.like(pattern)
+			| summary.customer_name.like(pattern)
+			| summary.customer.like(pattern)
+		)
+	return conditions
+
+
+def _get_return_status(items):
+	returned = [item for item in items if flt(item.get("returned_qty"))]
+	if not returned:
+		return ""
+	if all(flt(item.get("returned_qty")) >= abs(flt(item.get("qty"))) for item in items):
+		return "Returned"
+	return "Partly Returned"
+
+
+def _format_posting_time(posting_time):
+	"""Format posting_time from timedelta to HH:MM:SS."""
+	if not posting_time:
+		return posting_time
+	if hasattr(posting_time, "total_seconds"):
+		total_seconds = int(posting_time.total_seconds())
+		hours = total_seconds // 3600
+		minutes = (total_seconds % 3600) // 60
+		seconds = total_seconds % 60
+		return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+	return str(posting_time)
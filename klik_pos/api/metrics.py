@@ -0,0 +1,200 @@
+"""
+Stage-level latency metrics for the POS checkout pipeline.
+
+Samples are kept in Redis lists (one bounded list per pipeline, POS Profile and
+stage) and written with a single pipelined round trip per request, so recording
+adds no database writes to a sale.
+"""
+
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+import frappe
+
+from klik_pos.klik_pos.log import get_logger
+
+logger = get_logger(__name__)
+
+METRICS_KEY = "klik_pos_stage_metrics"
+METRICS_INDEX_KEY = "klik_pos_stage_metrics_index"
+
+# Samples kept per (pipeline, POS Profile, stage); older samples are trimmed
+MAX_SAMPLES = 2000
+PERCENTILES = (50, 95, 99)
+ALL_PROFILES = "__all__"
+
+
+class StageTimer:
+	"""
+	Times named stages of one request and counts the SQL queries run in each.
+	Stages may nest (e.g. validate inside save); each is reported on its own.
+	"""
+
+	def __init__(self, pipeline, pos_profile=None):
+		self.pipeline = pipeline
+		self.pos_profile = pos_profile
+		self.stages = {}
+		self.query_count = 0
+		self.started = time.perf_counter()
+		self._db_sql = None
+
+	def __enter__(self):
+		self._count_queries()
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		self._stop_counting_queries()
+		if exc_type is None:
+			self.flush()
+		return False
+
+	@contextmanager
+	def stage(self, name):
+		started = time.perf_counter()
+		queries = self.query_count
+		try:
+			yield
+		finally:
+			self.add(name, time.perf_counter() - started, self.query_count - queries)
+
+	def add(self, name, seconds, queries=0):
+		stage = self.stages.setdefault(name, {"ms": 0.0, "queries": 0})
+		stage["ms"] += seconds * 1000
+		stage["queries"] += queries
+
+	def wrap(self, doc, method, stage):
+		"""Time a document method (e.g. make_gl_entries) under `stage` for this document only."""
+		original = getattr(doc, method, None)
+		if not callable(original):
+			return
+
+		@wraps(original)
+		def timed(*args, **kwargs):
+			with self.stage(stage):
+				return original(*args, **kwargs)
+
+		setattr(doc, method, timed)
+
+	@property
+	def elapsed(self):
+		return time.perf_counter() - self.started
+
+	def summary(self):
+		return {name: {"ms": round(v["ms"], 2), "queries": v["queries"]} for name, v in self.stages.items()}
+
+	def flush(self):
+		"""Push this request's stage samples in one Redis round trip; never fails the request."""
+		if not self.stages:
+			return
+
+		self.add("total", self.elapsed, self.query_count)
+		try:
+			cache = frappe.cache()
+			pipe = cache.pipeline()
+			for profile in {ALL_PROFILES, self.pos_profile or ALL_PROFILES}:
+				for name, value in self.stages.items():
+					key = cache.make_key(_sample_key(self.pipeline, profile, name))
+					pipe.lpush(key, f"{value['ms']:.3f}|{value['queries']}")
+					pipe.ltrim(key, 0, MAX_SAMPLES - 1)
+					pipe.sadd(cache.make_key(METRICS_INDEX_KEY), f"{self.pipeline}|{profile}|{name}")
+			pipe.execute()
+		except Exception:
+			logger.warning("Could not record stage metrics", exc_info=True)
+
+	def _count_queries(self):
+		db = frappe.db
+		if not db or self._db_sql:
+			return
+
+		self._db_sql = db.sql
+
+		@wraps(self._db_sql)
+		def counted_sql(*args, **kwargs):
+			self.query_count += 1
+			return self._db_sql(*args, **kwargs)
+
+		db.sql = counted_sql
+
+	def _stop_counting_queries(self):
+		if self._db_sql:
+			# Drop the instance attribute so the class method is used again
+			frappe.db.__dict__.pop("sql", None)
+			self._db_sql = None
+
+
+@frappe.whitelist()
+def get_stage_metrics(pipeline="create_and_submit_invoice", pos_profile=None):
+	"""
+	p50/p95/p99 latency (ms) and average query count per stage, for all POS Profiles
+	and for each profile (or only `pos_profile` when given).
+	"""
+	try:
+		frappe.only_for(("System Manager", "Accounts Manager"))
+
+		cache = frappe.cache()
+		members = [
+			m.decode() if isinstance(m, bytes) else m
+			for m in cache.smembers(cache.make_key(METRICS_INDEX_KEY))
+		]
+
+		result = {}
+		for member in sorted(members):
+			member_pipeline, profile, stage = member.split("|", 2)
+			if member_pipeline != pipeline:
+				continue
+			if pos_profile and profile not in (pos_profile, ALL_PROFILES):
+				continue
+
+			samples = cache.lrange(cache.make_key(_sample_key(pipeline, profile, stage)), 0, -1)
+			stats = summarize_samples(samples)
+			if stats:
+				result.setdefault(profile, {})[stage] = stats
+
+		return {"success": True, "pipeline": pipeline, "data": result}
+	except Exception as e:
+		frappe.log_error(frappe.get_traceback(), "Stage Metrics Error")
+		return {"success": False, "error": str(e)}
+
+
+@frappe.whitelist()
+def clear_stage_metrics():
+	frappe.only_for("System Manager")
+
+	cache = frappe.cache()
+	index_key = cache.make_key(METRICS_INDEX_KEY)
+	for member in cache.smembers(index_key):
+		member = member.decode() if isinstance(member, bytes) else member
+		cache.delete(cache.make_key(_sample_key(*member.split("|", 2))))
+	cache.delete(index_key)
+	return {"success": True}
+
+
+def summarize_samples(samples):
+	"""Turn "ms|queries" samples into count, percentiles and mean query count."""
+	timings = []
+	queries = 0
+	for sample in samples:
+		sample = sample.decode() if isinstance(sample, bytes) else sample
+		ms, _sep, count = sample.partition("|")
+		timings.append(float(ms))
+		queries += int(count or 0)
+
+	if not timings:
+		return None
+
+	timings.sort()
+	stats = {"count": len(timings), "avg_queries": round(queries / len(timings), 1)}
+	for p in PERCENTILES:
+		stats[f"p{p}"] = round(_percentile(timings, p), 2)
+	return stats
+
+
+def _percentile(sorted_values, percentile):
+	"""Nearest-rank percentile of an already sorted list."""
+	rank = max(int(-(-percentile * len(sorted_values) // 100)), 1)
+	return sorted_values[rank - 1]
+
+
+def _sample_key(pipeline, profile, stage):
+	return f"{METRICS_KEY}|{pipeline}|{profile}|{stage}"
@@ -2,7 +2,10 @@ import frappe
 from frappe import _
 
 from klik_pos.api.sales_invoice import get_current_pos_opening_entry
-from klik_pos.klik_pos.utils import get_current_pos_profile
+from klik_pos.klik_pos.log import get_logger
+from klik_pos.klik_pos.utils import get_current_pos_profile, get_klik_invoice_doctypes
+
+logger = get_logger(__name__)
 
 
 @frappe.whitelist()
@@ -72,15 +75,13 @@ def get_opening_entry_payment_summary():
 		# Step 4: Aggregate sales invoice payments (including returns)
 		if is_admin_user:
 			# For admin users, aggregate all invoices for the day
-			frappe.logger().info(
-				f"Admin user {frappe.session.user} - aggregating all invoices for date: {opening_date}"
-			)
-			sales_data = frappe.db.sql(
+			logger.debug("Admin user %s - aggregating all invoices for %s", frappe.session.user, opening_date)
+			sales_data = _aggregate_invoice_payments(
 				"""
                 SELECT sip.mode_of_payment,
                        SUM(sip.amount) as total_amount,
                        COUNT(DISTINCT si.name) as transactions
-                FROM `tabSales Invoice` si
+                FROM `tab{doctype}` si
                 JOIN `tabSales Invoice Payment` sip ON si.name = sip.parent
                 WHERE si.pos_profile = %s
                   AND si.docstatus = 1
@@ -90,27 +91,25 @@ def get_opening_entry_payment_summary():
                 GROUP BY sip.mode_of_payment
             """,
 				(pos_profile_name, opening_date),
-				as_dict=True,
 			)
 		else:
 			# For regular users, aggregate only invoices for the current POS opening entry
-			frappe.logger().info(f"Aggregating payments for POS opening entry: {opening_entry_name}")
-			sales_data = frappe.db.sql(
+			logger.debug("Aggregating payments for POS opening entry: %s", opening_entry_name)
+			sales_data = _aggregate_invoice_payments(
 				"""
                 SELECT sip.mode_of_payment,
                        SUM(sip.amount) as total_amount,
                        COUNT(DISTINCT si.name) as transactions
-                FROM `tabSales Invoice` si
+                FROM `tab{doctype}` si
                 JOIN `tabSales Invoice Payment` sip ON si.name = sip.parent
                 WHERE si.custom_pos_opening_entry = %s
                   AND si.docstatus = 1
                 GROUP BY sip.mode_of_payment
             """,
 				(opening_entry_name,),
-				as_dict=True,
 			)
 
-		sales_map = {row.mode_of_payment: row for row in sales_data}
+		sales_map = sales_data
 
 		# Step 5: Merge both
 		result = []
@@ -139,3 +138,20 @@ def get_opening_entry_payment_summary():
 			message=frappe.get_traceback(),
 		)
 		return {"success": False, "error": str(e)}
+
+
+def _aggregate_invoice_payments(query, values):
+	"""
+	Run a per-payment-mode aggregate against every doctype KLiK records sales in
+	and merge the rows by mode of payment.
+	"""
+	sales_map = {}
+	for invoice_doctype in get_klik_invoice_doctypes():
+		for row in frappe.db.sql(query.format(doctype=invoice_doctype), values, as_dict=True):
+			merged = sales_map.setdefault(
+				row.mode_of_payment,
+				frappe._dict(mode_of_payment=row.mode_of_payment, total_amount=0, transactions=0),
+			)
+			merged.total_amount += row.total_amount or 0
+			merged.transactions += row.transactions or 0
+	return sales_map
@@ -5,8 +5,11 @@ import frappe
 from frappe import _
 from frappe.utils import now_datetime, today
 
+from klik_pos.klik_pos.log import get_logger
 from klik_pos.klik_pos.utils import get_current_pos_profile
 
+logger = get_logger(__name__)
+
 
 @frappe.whitelist()
 def open_pos():
@@ -127,7 +130,7 @@ def create_closing_entry():
 	try:
 		data = _parse_request_data()
 		user = frappe.session.user
-		frappe.logger().info(f"POS Closing Entry Data Received: {data}")
+		logger.debug("POS Closing Entry data received: %s", data)
 
 		opening_entry = _get_open_pos_entry(user)
 		payment_data = _calculate_payment_reconciliation(opening_entry, data)
@@ -197,26 +200,30 @@ def _calculate_payment_reconciliation(opening_entry, data):
 	)
 	opening_balance_map = {row.mode_of_payment: row.opening_amount for row in opening_modes}
 
-	# Aggregate sales by payment mode
-	sales_data = frappe.db.sql(
-		"""
-		SELECT sip.mode_of_payment,
-		       SUM(sip.amount) as total_amount,
-		       COUNT(DISTINCT si.name) as transactions
-		FROM `tabSales Invoice` si
-		JOIN `tabSales Invoice Payment` sip ON si.name = sip.parent
-		WHERE si.pos_profile = %s
-		  AND si.docstatus = 1
-		  AND si.posting_date = %s
-		  AND si.posting_time >= %s
-		  AND si.custom_pos_opening_entry IS NOT NULL
-		  AND si.custom_pos_opening_entry != ''
-		GROUP BY sip.mode_of_payment
-		""",
-		(opening_entry.pos_profile, opening_date, opening_time),
-		as_dict=True,
-	)
-	sales_map = {row.mode_of_payment: row.total_amount for row in sales_data}
+	# Aggregate sales by payment mode over Sales and POS Invoices; the POS Invoice
+	# setting may have changed during the shift
+	sales_map = {}
+	for invoice_doctype in ("Sales Invoice", "POS Invoice"):
+		sales_data = frappe.db.sql(
+			f"""
+			SELECT sip.mode_of_payment,
+			       SUM(sip.amount) as total_amount,
+			       COUNT(DISTINCT si.name) as transactions
+			FROM `tab{invoice_doctype}` si
+			JOIN `tabSales Invoice Payment` sip ON si.name = sip.parent
+			WHERE si.pos_profile = %s
+			  AND si.docstatus = 1
+			  AND si.posting_date = %s
+			  AND si.posting_time >= %s
+			  AND si.custom_pos_opening_entry IS NOT NULL
+			  AND si.custom_pos_opening_entry != ''
+			GROUP BY sip.mode_of_payment
+			""",
+			(opening_entry.pos_profile, opening_date, opening_time),
+			as_dict=True,
+		)
+		for row in sales_data:
+			sales_map[row.mode_of_payment] = sales_map.get(row.mode_of_payment, 0) + row.total_amount
 
 	# Build reconciliation entries
 	closing_balance = data.get("closing_balance", {})
@@ -291,8 +298,39 @@ def _create_and_submit_closing_doc(opening_entry, data, payment_data, user):
 			},
 		)
 
+	# POS Invoices recorded during the shift; ERPNext merges them into
+	# consolidated Sales Invoices when the closing entry is submitted
+	for pos_invoice in _get_unconsolidated_pos_invoices(opening_entry.name):
+		doc.append(
+			"pos_transactions",
+			{
+				"pos_invoice": pos_invoice.name,
+				"posting_date": pos_invoice.posting_date,
+				"grand_total": pos_invoice.grand_total,
+				"customer": pos_invoice.customer,
+			},
+		)
+
 	# Submit and link back to opening entry
 	doc.submit()
 	frappe.db.set_value("POS Opening Entry", opening_entry.name, "pos_closing_entry", doc.name)
 
 	return doc
+
+
+def _get_unconsolidated_pos_invoices(opening_entry_name):
+	"""
+	Submitted POS Invoices of the shift that have not been merged into a Sales Invoice
+	yet, whatever the POS Profile's POS Invoice setting is now (it may have been
+	switched off mid-shift).
+	"""
+	return frappe.get_all(
+		"POS Invoice",
+		filters={
+			"custom_pos_opening_entry": opening_entry_name,
+			"docstatus": 1,
+			"status": ["not in", ["Consolidated", "Cancelled"]],
+		},
+		fields=["name", "posting_date", "grand_total", "customer"],
+		order_by="posting_date asc, posting_time asc",
+	)
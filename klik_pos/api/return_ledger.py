@@ -0,0 +1,124 @@
+"""
+Returned quantity ledger.
+
+One "POS Return Ledger" row per (original invoice, item_code) holds the quantity
+already returned against that invoice. Rows are incremented when a return invoice
+is submitted and decremented when it is cancelled, so return-eligibility checks
+read one indexed row instead of summing every return invoice and its items.
+"""
+
+import frappe
+from frappe.utils import flt, now_datetime
+
+from klik_pos.klik_pos.log import get_logger
+from klik_pos.klik_pos.utils import get_klik_invoice_doctypes
+
+logger = get_logger(__name__)
+
+LEDGER_DOCTYPE = "POS Return Ledger"
+
+
+def update_return_ledger(doc, method=None):
+	"""
+	doc_events hook for Sales Invoice and POS Invoice on_submit / on_cancel: move the
+	original invoice's returned quantities by this return's item quantities.
+	"""
+	if not doc.get("is_return") or not doc.get("return_against"):
+		return
+
+	sign = -1 if method == "on_cancel" else 1
+	quantities = {}
+	for item in doc.get("items") or []:
+		if item.item_code:
+			quantities[item.item_code] = quantities.get(item.item_code, 0) + abs(flt(item.qty))
+
+	for item_code, qty in quantities.items():
+		_add_returned_qty(doc.doctype, doc.return_against, item_code, sign * qty)
+
+
+def get_returned_qty_map(invoice_names):
+	"""Returned quantities of many original invoices in one query, keyed by (invoice, item_code)."""
+	if not invoice_names:
+		return {}
+
+	rows = frappe.get_all(
+		LEDGER_DOCTYPE,
+		filters={"invoice": ["in", list(invoice_names)]},
+		fields=["invoice", "item_code", "returned_qty"],
+	)
+	return {(row.invoice, row.item_code): flt(row.returned_qty) for row in rows}
+
+
+def get_returned_qty(invoice_name, item_code):
+	return flt(
+		frappe.db.get_value(LEDGER_DOCTYPE, {"invoice": invoice_name, "item_code": item_code}, "returned_qty")
+	)
+
+
+@frappe.whitelist()
+def rebuild_return_ledger():
+	"""Rebuild the ledger from submitted returns in a background job (System Manager only)."""
+	frappe.only_for("System Manager")
+	frappe.enqueue(
+		"klik_pos.api.return_ledger.build_return_ledger",
+		queue="long",
+		timeout=3600,
+		job_id="klik_pos_rebuild_return_ledger",
+		deduplicate=True,
+	)
+	return {"success": True, "message": "Return ledger rebuild queued"}
+
+
+def build_return_ledger():
+	"""Backfill the ledger from every submitted return (also used by the install patch)."""
+	frappe.db.delete(LEDGER_DOCTYPE)
+	now = now_datetime()
+
+	for invoice_doctype in get_klik_invoice_doctypes():
+		frappe.db.sql(
+			f"""
+			INSERT INTO `tab{LEDGER_DOCTYPE}`
+				(name, creation, modified, modified_by, owner, docstatus, idx,
+				 invoice_doctype, invoice, item_code, returned_qty)
+			SELECT MD5(CONCAT(si.return_against, '::', sii.item_code)), %(now)s, %(now)s,
+				'Administrator', 'Administrator', 0, 0,
+				%(invoice_doctype)s, si.return_against, sii.item_code, SUM(ABS(sii.qty))
+			FROM `tab{invoice_doctype}` si
+			JOIN `tab{invoice_doctype} Item` sii ON si.name = sii.parent
+			WHERE si.is_return = 1
+			  AND si.docstatus = 1
+			  AND IFNULL(si.return_against, '') != ''
+			  AND IFNULL(sii.item_code, '') != ''
+			GROUP BY si.return_against, sii.item_code
+			""",
+			{"now": now, "invoice_doctype": invoice_doctype},
+		)
+		frappe.db.commit()
+		logger.info("Rebuilt return ledger for %s", invoice_doctype)
+
+
+def _add_returned_qty(invoice_doctype, invoice_name, item_code, qty):
+	"""Atomic upsert against the (invoice, item_code) unique key; safe under concurrent returns."""
+	now = now_datetime()
+	frappe.db.sql(
+		f"""
+		INSERT INTO `tab{LEDGER_DOCTYPE}`
+			(name, creation, modified, modified_by, owner, docstatus, idx,
+			 invoice_doctype, invoice, item_code, returned_qty)
+		VALUES (%(name)s, %(now)s, %(now)s, %(user)s, %(user)s, 0, 0,
+			%(invoice_doctype)s, %(invoice)s, %(item_code)s, GREATEST(%(qty)s, 0))
+		ON DUPLICATE KEY UPDATE
+			returned_qty = GREATEST(returned_qty + %(qty)s, 0),
+			modified = %(now)s,
+			modified_by = %(user)s
+		""",
+		{
+			"name": frappe.generate_hash(length=10),
+			"now": now,
+			"user": frappe.session.user,
+			"invoice_doctype": invoice_doctype,
+			"invoice": invoice_name,
+			"item_code": item_code,
+			"qty": qty,
+		},
+	)
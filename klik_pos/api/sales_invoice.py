@@ -3,10 +3,34 @@ import json
 import erpnext
 import frappe
 from erpnext.accounts.doctype.sales_invoice.sales_invoice import SalesInvoice
+from erpnext.controllers.taxes_and_totals import calculate_taxes_and_totals
 from frappe import _
-from frappe.utils import flt
-
-from klik_pos.klik_pos.utils import get_current_pos_profile, get_user_default_company
+from frappe.utils import cint, flt
+
+from klik_pos.api.invoice_numbering import assign_reserved_invoice_name
+from klik_pos.api.invoice_summary import (
+	get_cached_invoice_count,
+	get_invoice_summaries,
+	refresh_invoice_summary,
+)
+from klik_pos.api.metrics import StageTimer
+from klik_pos.api.return_ledger import get_returned_qty, get_returned_qty_map
+from klik_pos.api.tax import get_compiled_tax_template
+from klik_pos.klik_pos.log import get_logger
+from klik_pos.klik_pos.utils import (
+	get_current_pos_profile,
+	get_invoice_doctype,
+	get_klik_invoice_doctypes,
+	get_user_default_company,
+)
+
+logger = get_logger(__name__)
+
+PAYMENT_ENTRY_MAX_ATTEMPTS = 3
+
+# Receipt payloads of submitted invoices, one key per invoice
+INVOICE_DETAILS_CACHE_KEY = "klik_pos_invoice_details"
+INVOICE_DETAILS_CACHE_TTL = 6 * 60 * 60
 
 
 def get_current_pos_opening_entry():
@@ -33,9 +57,10 @@ def get_current_pos_opening_entry():
 
 
 @frappe.whitelist(allow_guest=True)
-def get_sales_invoices(limit=100, start=0, search=""):
+def get_sales_invoices(limit=100, start=0, search="", cursor=None):
 	"""
 	Get sales invoices with proper filtering based on user role and POS opening entry.
+	Pass the returned `next_cursor` as `cursor` to page by (modified, name) instead of offset.
 	"""
 	try:
 		# Get current user's POS opening entry
@@ -44,123 +69,36 @@ def get_sales_invoices(limit=100, start=0, search=""):
 		# Check if user is admin
 		user_roles = frappe.get_roles()
 		is_admin_user = "Administrator" in user_roles or "System Manager" in user_roles
-		print("user roles", search)
-		# Base filters - ALWAYS filter to only show POS-created invoices
-		filters = {
-			"custom_pos_opening_entry": ["!=", ""]  # Only show invoices with POS opening entry
-		}
+		logger.debug("get_sales_invoices search=%r", search)
+		# Always limit to POS-created invoices; non-admins only see their open shift
+		opening_entry_filter = None
 
 		if is_admin_user:
-			frappe.logger().info(
-				f"Admin user {frappe.session.user} with roles {user_roles} - showing all POS invoices"
-			)
+			logger.debug("Admin user %s - showing all POS invoices", frappe.session.user)
 		elif current_opening_entry:
-			filters["custom_pos_opening_entry"] = current_opening_entry
-			frappe.logger().info(f"Filtering invoices by POS opening entry: {current_opening_entry}")
+			opening_entry_filter = current_opening_entry
+			logger.debug("Filtering invoices by POS opening entry: %s", current_opening_entry)
 		else:
-			frappe.logger().info("No active POS opening entry found, showing all POS invoices")
-
-		# Check if ZATCA status field exists
-		sales_invoice_meta = frappe.get_meta("Sales Invoice")
-		has_zatca_status = any(
-			df.fieldname == "custom_zatca_submit_status" for df in sales_invoice_meta.fields
-		)
+			logger.debug("No active POS opening entry found, showing all POS invoices")
 
-		# Build fields list
-		fields = [
-			"name",
-			"posting_date",
-			"posting_time",
-			"owner",
-			"customer",
-			"customer_name",
-			"base_grand_total",
-			"base_rounded_total",
-			"status",
-			"discount_amount",
-			"total_taxes_and_charges",
-			"custom_pos_opening_entry",
-			"pos_profile",
-			"currency",
-		]
+		search_term = (search or "").strip()
+		limit = cint(limit)
 
-		if has_zatca_status:
-			fields.append("custom_zatca_submit_status")
-
-		# Build optional OR filters for search
-		or_filters = None
-		if search and search.strip():
-			search_term = search.strip()
-			or_filters = [
-				["name", "like", f"%{search_term}%"],
-				["customer_name", "like", f"%{search_term}%"],
-				["customer", "like", f"%{search_term}%"],
-			]
-
-		# Get invoices
-		invoices = frappe.get_all(
-			"Sales Invoice",
-			filters=filters,
-			or_filters=or_filters,
-			fields=fields,
-			order_by="modified desc",
+		# One indexed query on the summary table maintained by doc_events
+		invoices = get_invoice_summaries(
+			opening_entry=opening_entry_filter,
+			search_term=search_term,
+			cursor=cursor,
 			limit=limit,
-			start=start,
+			start=0 if cursor else cint(start),
 		)
+		total_count = get_cached_invoice_count(opening_entry_filter, search_term)
 
-		# Get total count for pagination (supports or_filters via aggregate)
-		count_rows = frappe.get_all(
-			"Sales Invoice", filters=filters, or_filters=or_filters, fields=["count(name) as total"]
-		)
-		total_count = count_rows[0].total if count_rows else 0
-
-		# Process each invoice
-		for inv in invoices:
-			# Get cashier full name
-			cashier_name = frappe.db.get_value("User", inv.owner, "full_name") or inv.owner
-			inv["cashier_name"] = cashier_name
-
-			# Format posting_time from timedelta to HH:MM:SS
-			if inv.get("posting_time"):
-				if hasattr(inv["posting_time"], "total_seconds"):
-					total_seconds = int(inv["posting_time"].total_seconds())
-					hours = total_seconds // 3600
-					minutes = (total_seconds % 3600) // 60
-					seconds = total_seconds % 60
-					inv["posting_time"] = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-				else:
-					inv["posting_time"] = str(inv["posting_time"])
-
-			# Get payment methods
-			payment_methods = frappe.get_all(
-				"Sales Invoice Payment", filters={"parent": inv.name}, fields=["mode_of_payment", "amount"]
-			)
-			inv["payment_methods"] = payment_methods
-
-			# Set backward-compatible mode_of_payment field
-			if len(payment_methods) == 0:
-				inv["mode_of_payment"] = "-"
-			elif len(payment_methods) == 1:
-				inv["mode_of_payment"] = payment_methods[0]["mode_of_payment"]
-			else:
-				inv["mode_of_payment"] = "/".join([pm["mode_of_payment"] for pm in payment_methods])
-
-			# Get items for return logic
-			items = frappe.get_all(
-				"Sales Invoice Item",
-				filters={"parent": inv.name},
-				fields=["item_code", "qty", "rate", "amount"],
-			)
-
-			# Calculate returned quantities for each item
-			for item in items:
-				returned_data = returned_qty(inv.customer, inv.name, item.item_code)
-				item["returned_qty"] = returned_data.get("total_returned_qty", 0)
-				item["quantity"] = item.qty  # For backward compatibility
-
-			inv["items"] = items
+		next_cursor = None
+		if invoices and len(invoices) == limit:
+			next_cursor = f"{invoices[-1].modified}|{invoices[-1].name}"
 
-		return {"success": True, "data": invoices, "total_count": total_count}
+		return {"success": True, "data": invoices, "total_count": total_count, "next_cursor": next_cursor}
 
 	except Exception as e:
 		frappe.log_error(frappe.get_traceback(), "Error fetching sales invoices")
@@ -171,226 +109,255 @@ def get_sales_invoices(limit=100, start=0, search=""):
 def get_invoice_details(invoice_id):
 	"""
 	Optimized invoice details fetching with batch queries for items and returns.
+	Submitted and cancelled invoices are served from cache (see get_cached_invoice_details).
 	"""
 	try:
-		invoice = frappe.get_doc("Sales Invoice", invoice_id)
-		invoice_data = invoice.as_dict()
-
-		# Batch fetch all items for this invoice
-		items_query = """
-			SELECT item_code, item_name, qty, rate, amount, description
-			FROM `tabSales Invoice Item`
-			WHERE parent = %s
-		"""
-		items_data = frappe.db.sql(items_query, (invoice_id,), as_dict=True)
-
-		# Batch fetch return quantities for all items at once
-		item_codes = [item.item_code for item in items_data]
-		returned_qty_map = {}
-
-		if item_codes:
-			returns_query = """
-				SELECT sii.item_code, COALESCE(SUM(ABS(sii.qty)), 0) as total_returned_qty
-				FROM `tabSales Invoice` si
-				JOIN `tabSales Invoice Item` sii ON si.name = sii.parent
-				WHERE si.is_return = 1
-				  AND si.return_against = %s
-				  AND sii.item_code IN ({})
-				  AND si.docstatus = 1
-				  AND si.customer = %s
-				GROUP BY sii.item_code
-			""".format(",".join([f"'{code}'" for code in item_codes]))
-
-			returns_data = frappe.db.sql(returns_query, (invoice_id, invoice.customer), as_dict=True)
-			returned_qty_map = {row.item_code: row.total_returned_qty for row in returns_data}
-
-		# Build items list with batch-fetched return data
-		items = []
-		for item in items_data:
-			returned_qty_value = returned_qty_map.get(item.item_code, 0)
-			available_qty = item.qty - returned_qty_value
-
-			items.append(
-				{
-					"item_code": item.item_code,
-					"item_name": item.item_name,
-					"qty": item.qty,
-					"rate": item.rate,
-					"amount": item.amount,
-					"description": item.description,
-					"returned_qty": returned_qty_value,
-					"available_qty": available_qty,
-				}
-			)
-
-		# Get full company address doc
-		company_address_doc = None
-		if invoice.company_address:
-			company_address_doc = frappe.get_doc("Address", invoice.company_address).as_dict()
-
-		# Get full customer address doc
-		customer_address_doc = None
-		if invoice.customer_address:
-			customer_address_doc = frappe.get_doc("Address", invoice.customer_address).as_dict()
-		else:
-			primary_address = frappe.db.get_value(
-				"Dynamic Link",
-				{
-					"link_doctype": "Customer",
-					"link_name": invoice.customer,
-					"parenttype": "Address",
-				},
-				"parent",
-			)
-			if primary_address:
-				customer_address_doc = frappe.get_doc("Address", primary_address).as_dict()
-
-		# Format posting_time from timedelta to HH:MM:SS
-		if invoice_data.get("posting_time"):
-			if hasattr(invoice_data["posting_time"], "total_seconds"):
-				total_seconds = int(invoice_data["posting_time"].total_seconds())
-				hours = total_seconds // 3600
-				minutes = (total_seconds % 3600) // 60
-				seconds = total_seconds % 60
-				invoice_data["posting_time"] = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-			else:
-				invoice_data["posting_time"] = str(invoice_data["posting_time"])
-
-		# Get cashier full name from document owner
-		cashier_name = frappe.db.get_value(
-			"User", invoice_data.get("owner"), "full_name"
-		) or invoice_data.get("owner")
-		invoice_data["cashier_name"] = cashier_name
-
-		# Get customer contact information
-		customer_email = ""
-		customer_mobile_no = ""
-		customer_address_line1 = ""
-		customer_city = ""
-		customer_state = ""
-		customer_pincode = ""
-		customer_country = ""
-
-		if invoice.customer:
-			customer_doc = frappe.get_doc("Customer", invoice.customer)
-			customer_email = customer_doc.email_id or ""
-			customer_mobile_no = customer_doc.mobile_no or ""
-
-			# Get address information from customer_address_doc
-			if customer_address_doc:
-				customer_address_line1 = customer_address_doc.get("address_line1", "")
-				customer_city = customer_address_doc.get("city", "")
-				customer_state = customer_address_doc.get("state", "")
-				customer_pincode = customer_address_doc.get("pincode", "")
-				customer_country = customer_address_doc.get("country", "")
-
-		return {
-			"success": True,
-			"data": {
-				**invoice_data,
-				"items": items,
-				"company_address_doc": company_address_doc,
-				"customer_address_doc": customer_address_doc,
-				"customer_email": customer_email,
-				"customer_mobile_no": customer_mobile_no,
-				"customer_address_line1": customer_address_line1,
-				"customer_city": customer_city,
-				"customer_state": customer_state,
-				"customer_pincode": customer_pincode,
-				"customer_country": customer_country,
-			},
-		}
+		invoice_doctype = get_invoice_doctype(invoice_id)
+		return {"success": True, "data": get_cached_invoice_details(invoice_doctype, invoice_id)}
 
 	except Exception as e:
 		frappe.log_error(frappe.get_traceback(), f"Error fetching invoice {invoice_id}")
 		return {"success": False, "error": str(e)}
 
 
-@frappe.whitelist()
-def create_and_submit_invoice(data):
-	try:
-		import time
+def get_cached_invoice_details(invoice_doctype, invoice_id):
+	"""
+	Receipt payload for an invoice, cached by name and `modified`. Only submitted and
+	cancelled invoices are cached; clear_invoice_details_cache drops the entry when
+	a return against the invoice is submitted or cancelled.
+	"""
+	values = frappe.db.get_value(invoice_doctype, invoice_id, ["modified", "docstatus"])
+	if not values:
+		frappe.throw(_("{0} {1} not found").format(invoice_doctype, invoice_id), frappe.DoesNotExistError)
+
+	modified, docstatus = values
+	if not docstatus:
+		return build_invoice_details(invoice_doctype, invoice_id)
+
+	cache_key = f"{INVOICE_DETAILS_CACHE_KEY}:{invoice_id}"
+	cached = frappe.cache().get_value(cache_key)
+	if cached and cached.get("modified") == str(modified):
+		return cached["data"]
+
+	data = build_invoice_details(invoice_doctype, invoice_id)
+	frappe.cache().set_value(
+		cache_key, {"modified": str(modified), "data": data}, expires_in_sec=INVOICE_DETAILS_CACHE_TTL
+	)
+	return data
 
-		start_time = time.time()
 
-		# Validate input data
-		if not data:
-			frappe.throw("No data provided for invoice creation")
+def clear_invoice_details_cache(doc=None, method=None):
+	"""doc_events hook: drop cached receipt payloads of an invoice and of the invoice a return is against."""
+	for name in (doc.name, doc.get("return_against")):
+		if name:
+			frappe.cache().delete_value(f"{INVOICE_DETAILS_CACHE_KEY}:{name}")
 
-		(
-			customer,
-			items,
-			amount_paid,
-			sales_and_tax_charges,
-			mode_of_payment,
-			business_type,
-			roundoff_amount,
-		) = parse_invoice_data(data)
 
-		# Validate required fields
-		if not customer:
-			frappe.throw("Customer is required")
-		if not items or len(items) == 0:
-			frappe.throw("At least one item is required")
+def build_invoice_details(invoice_doctype, invoice_id):
+	"""Assemble the get_invoice_details payload from the database."""
+	invoice = frappe.get_doc(invoice_doctype, invoice_id)
+	invoice_data = invoice.as_dict()
 
-		# Build invoice document
-		doc = build_sales_invoice_doc(
-			customer,
-			items,
-			amount_paid,
-			sales_and_tax_charges,
-			mode_of_payment,
-			business_type,
-			roundoff_amount,
-			include_payments=True,
+	# Batch fetch all items for this invoice
+	items_query = f"""
+		SELECT item_code, item_name, qty, rate, amount, description
+		FROM `tab{invoice_doctype} Item`
+		WHERE parent = %s
+	"""
+	items_data = frappe.db.sql(items_query, (invoice_id,), as_dict=True)
+
+	# Returned quantities come from the return ledger, one indexed read for all items
+	returned_by_item = get_returned_qty_map([invoice_id])
+
+	# Build items list with batch-fetched return data
+	items = []
+	for item in items_data:
+		returned_qty_value = returned_by_item.get((invoice_id, item.item_code), 0)
+		available_qty = item.qty - returned_qty_value
+
+		items.append(
+			{
+				"item_code": item.item_code,
+				"item_name": item.item_name,
+				"qty": item.qty,
+				"rate": item.rate,
+				"amount": item.amount,
+				"description": item.description,
+				"returned_qty": returned_qty_value,
+				"available_qty": available_qty,
+			}
 		)
 
-		doc.base_paid_amount = amount_paid
-		doc.paid_amount = amount_paid
-		doc.outstanding_amount = 0
+	# Get full company address doc
+	company_address_doc = None
+	if invoice.company_address:
+		company_address_doc = frappe.get_doc("Address", invoice.company_address).as_dict()
 
-		# Debug: Print document fields before save
-		frappe.log_error(
-			f"Invoice doc fields: company={doc.company}, currency={doc.currency}, conversion_rate={doc.conversion_rate}",
-			"Invoice Debug",
+	# Get full customer address doc
+	customer_address_doc = None
+	if invoice.customer_address:
+		customer_address_doc = frappe.get_doc("Address", invoice.customer_address).as_dict()
+	else:
+		primary_address = frappe.db.get_value(
+			"Dynamic Link",
+			{
+				"link_doctype": "Customer",
+				"link_name": invoice.customer,
+				"parenttype": "Address",
+			},
+			"parent",
 		)
+		if primary_address:
+			customer_address_doc = frappe.get_doc("Address", primary_address).as_dict()
+
+	# Format posting_time from timedelta to HH:MM:SS
+	if invoice_data.get("posting_time"):
+		if hasattr(invoice_data["posting_time"], "total_seconds"):
+			total_seconds = int(invoice_data["posting_time"].total_seconds())
+			hours = total_seconds // 3600
+			minutes = (total_seconds % 3600) // 60
+			seconds = total_seconds % 60
+			invoice_data["posting_time"] = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+		else:
+			invoice_data["posting_time"] = str(invoice_data["posting_time"])
+
+	# Get cashier full name from document owner
+	cashier_name = frappe.db.get_value("User", invoice_data.get("owner"), "full_name") or invoice_data.get(
+		"owner"
+	)
+	invoice_data["cashier_name"] = cashier_name
+
+	# Get customer contact information
+	customer_email = ""
+	customer_mobile_no = ""
+	customer_address_line1 = ""
+	customer_city = ""
+	customer_state = ""
+	customer_pincode = ""
+	customer_country = ""
+
+	if invoice.customer:
+		customer_doc = frappe.get_doc("Customer", invoice.customer)
+		customer_email = customer_doc.email_id or ""
+		customer_mobile_no = customer_doc.mobile_no or ""
+
+		# Get address information from customer_address_doc
+		if customer_address_doc:
+			customer_address_line1 = customer_address_doc.get("address_line1", "")
+			customer_city = customer_address_doc.get("city", "")
+			customer_state = customer_address_doc.get("state", "")
+			customer_pincode = customer_address_doc.get("pincode", "")
+			customer_country = customer_address_doc.get("country", "")
+
+	return {
+		**invoice_data,
+		"items": items,
+		"company_address_doc": company_address_doc,
+		"customer_address_doc": customer_address_doc,
+		"customer_email": customer_email,
+		"customer_mobile_no": customer_mobile_no,
+		"customer_address_line1": customer_address_line1,
+		"customer_city": customer_city,
+		"customer_state": customer_state,
+		"customer_pincode": customer_pincode,
+		"customer_country": customer_country,
+	}
+
+
+@frappe.whitelist()
+def create_and_submit_invoice(data):
+	try:
+		with StageTimer("create_and_submit_invoice") as timer:
+			# Validate input data
+			if not data:
+				frappe.throw("No data provided for invoice creation")
+
+			with timer.stage("parse"):
+				(
+					customer,
+					items,
+					amount_paid,
+					sales_and_tax_charges,
+					mode_of_payment,
+					business_type,
+					roundoff_amount,
+				) = parse_invoice_data(data)
+
+			# Validate required fields
+			if not customer:
+				frappe.throw("Customer is required")
+			if not items or len(items) == 0:
+				frappe.throw("At least one item is required")
+
+			# Build invoice document
+			with timer.stage("build"):
+				doc = build_sales_invoice_doc(
+					customer,
+					items,
+					amount_paid,
+					sales_and_tax_charges,
+					mode_of_payment,
+					business_type,
+					roundoff_amount,
+					include_payments=True,
+					allow_pos_invoice=True,
+				)
 
-		# Save and submit in one transaction
-		doc.save(ignore_permissions=True)
-		doc.submit()
+				doc.base_paid_amount = amount_paid
+				doc.paid_amount = amount_paid
+				doc.outstanding_amount = 0
 
-		payment_entry = None
-		should_create_payment_entry = False
+				# Take the name from the shift's reserved number block, if the POS Profile uses them
+				assign_reserved_invoice_name(doc)
 
-		if business_type == "B2B":
-			should_create_payment_entry = True
-		elif business_type == "B2B & B2C":
-			# For B2B & B2C, only create payment entry for company customers
-			customer_doc = frappe.get_doc("Customer", customer)
-			if customer_doc.customer_type == "Company":
-				should_create_payment_entry = True
+			timer.pos_profile = doc.pos_profile
+			timer.wrap(doc, "validate", "validate")
+			timer.wrap(doc, "make_gl_entries", "submit_gl")
+			timer.wrap(doc, "update_stock_ledger", "submit_sle")
 
-		if should_create_payment_entry and mode_of_payment and amount_paid > 0:
-			try:
-				payment_entry = create_payment_entry(doc, mode_of_payment, amount_paid)
-			except Exception:
-				frappe.log_error(frappe.get_traceback(), f"Payment Entry Error for {doc.name}")
-				payment_entry = None
+			# Save and submit in one transaction
+			with timer.stage("save"):
+				doc.save(ignore_permissions=True)
+			with timer.stage("submit"):
+				doc.submit()
 
-		processing_time = time.time() - start_time
-		frappe.logger().info(f"Invoice {doc.name} processed in {processing_time:.2f} seconds")
+			with timer.stage("payment_entry"):
+				payment_entry_status = None
+				should_create_payment_entry = False
+
+				if business_type == "B2B":
+					should_create_payment_entry = True
+				elif business_type == "B2B & B2C":
+					# For B2B & B2C, only create payment entry for company customers
+					customer_doc = frappe.get_doc("Customer", customer)
+					if customer_doc.customer_type == "Company":
+						should_create_payment_entry = True
+
+				# Payment Entry is created by a background job so the receipt is not held up by a second ledger posting
+				if should_create_payment_entry and mode_of_payment and amount_paid > 0:
+					payment_entry_status = enqueue_payment_entry(doc, mode_of_payment, amount_paid)
+
+			with timer.stage("commit"):
+				frappe.db.commit()
+
+			processing_time = timer.elapsed
 
 		# Return invoice data for print preview
 		return {
 			"success": True,
 			"invoice_name": doc.name,
 			"invoice_id": doc.name,
+			"invoice_doctype": doc.doctype,
 			"invoice": doc,
-			"payment_entry": payment_entry.name if payment_entry else None,
+			"payment_entry": None,
+			"payment_entry_status": payment_entry_status,
 			"processing_time": round(processing_time, 2),
+			"stage_timings": timer.summary(),
 		}
 
 	except Exception as e:
+		# Undo the partial invoice and hand its reserved invoice number back to the block
+		frappe.db.rollback()
 		frappe.log_error(frappe.get_traceback(), "Submit Invoice Error")
 		return {"success": False, "message": str(e)}
 
@@ -478,12 +445,8 @@ def build_sales_invoice_doc(
 	business_type,
 	roundoff_amount=0.0,
 	include_payments=False,
+	allow_pos_invoice=False,
 ):
-	doc = frappe.new_doc("Sales Invoice")
-	doc.customer = customer
-	doc.due_date = frappe.utils.nowdate()
-	doc.custom_delivery_date = frappe.utils.nowdate()
-
 	# Set company and currency from POS Profile
 	# Prefer the POS Profile from the current open POS Opening Entry (active session)
 	selected_pos_profile_name = None
@@ -501,24 +464,34 @@ def build_sales_invoice_doc(
 	else:
 		pos_profile = get_current_pos_profile()
 
-	doc.pos_profile = pos_profile.name  # Set the POS profile on the invoice
-	doc.company = pos_profile.company
-	doc.currency = get_customer_billing_currency(customer)
-	doc.conversion_rate = 1.0  # Set conversion rate to 1 for same currency
-
 	# Determine if this should be a POS invoice based on business type and customer type
 	if business_type == "B2C":
-		doc.is_pos = 1
+		is_pos = 1
 	elif business_type == "B2B":
-		doc.is_pos = 0
+		is_pos = 0
 	elif business_type == "B2B & B2C":
 		customer_doc = frappe.get_doc("Customer", customer)
 		if customer_doc.customer_type == "Individual":
-			doc.is_pos = 1
+			is_pos = 1
 		else:
-			doc.is_pos = 0
+			is_pos = 0
+	else:
+		is_pos = 0
+
+	# Paid-in-full sales can be recorded as POS Invoices and consolidated at shift close
+	if allow_pos_invoice and is_pos and pos_profile.get("custom_use_pos_invoice"):
+		doc = frappe.new_doc("POS Invoice")
 	else:
-		doc.is_pos = 0
+		doc = frappe.new_doc("Sales Invoice")
+
+	doc.customer = customer
+	doc.due_date = frappe.utils.nowdate()
+	doc.custom_delivery_date = frappe.utils.nowdate()
+	doc.pos_profile = pos_profile.name  # Set the POS profile on the invoice
+	doc.company = pos_profile.company
+	doc.currency = get_customer_billing_currency(customer)
+	doc.conversion_rate = 1.0  # Set conversion rate to 1 for same currency
+	doc.is_pos = is_pos
 
 	doc.update_stock = 1
 	doc.warehouse = pos_profile.warehouse
@@ -534,7 +507,12 @@ def build_sales_invoice_doc(
 		doc.custom_pos_opening_entry = current_opening_entry
 
 	# Set round-off fields only if roundoff_amount is not zero
-	if roundoff_amount != 0:
+	if roundoff_amount != 0 and doc.doctype == "POS Invoice":
+		# POS Invoice has no custom round-off fields; use the standard write-off instead
+		doc.write_off_amount = flt(abs(roundoff_amount))
+		doc.write_off_account = get_writeoff_account(pos_profile.name)
+		doc.write_off_cost_center = pos_profile.write_off_cost_center or pos_profile.cost_center
+	elif roundoff_amount != 0:
 		doc.custom_roundoff_amount = flt(abs(roundoff_amount))
 		doc.custom_roundoff_account = get_writeoff_account()
 		conversion_rate = doc.conversion_rate or 1
@@ -596,24 +574,12 @@ def build_sales_invoice_doc(
 
 		doc.append("items", item_data)
 
-	# If taxes_and_charges is set, populate taxes manually
+	# If taxes_and_charges is set, populate taxes from the compiled template cache
 	if doc.taxes_and_charges:
-		tax_doc = get_tax_template(doc.taxes_and_charges)
-		if tax_doc:
-			for tax in tax_doc.taxes:
-				doc.append(
-					"taxes",
-					{
-						"charge_type": tax.charge_type,
-						"account_head": tax.account_head,
-						"description": tax.description,
-						"cost_center": tax.cost_center,
-						"rate": tax.rate,
-						"row_id": tax.row_id,
-						"tax_amount": tax.tax_amount,
-						"included_in_print_rate": tax.included_in_print_rate,
-					},
-				)
+		tax_template = get_compiled_tax_template(doc.taxes_and_charges)
+		if tax_template:
+			for tax in tax_template["rows"]:
+				doc.append("taxes", dict(tax))
 
 	if roundoff_amount != 0:
 		conversion_rate = doc.conversion_rate or 1
@@ -629,20 +595,6 @@ def build_sales_invoice_doc(
 	return doc
 
 
-def get_tax_template(template_name):
-	"""
-	Custom helper function to fetch Sales Taxes and Charges Template.
-	Returns the full template document or raises an error if not found.
-	"""
-	if not template_name:
-		return None
-
-	try:
-		return frappe.get_doc("Sales Taxes and Charges Template", template_name)
-	except frappe.DoesNotExistError:
-		frappe.throw(f"Tax Template '{template_name}' not found")
-
-
 def get_customer_billing_currency(customer):
 	try:
 		customer_doc = frappe.get_doc("Customer", customer)
@@ -692,7 +644,8 @@ from frappe.model.mapper import get_mapped_doc
 @frappe.whitelist()
 def return_sales_invoice(invoice_name):
 	try:
-		original_invoice = frappe.get_doc("Sales Invoice", invoice_name)
+		invoice_doctype = get_invoice_doctype(invoice_name)
+		original_invoice = frappe.get_doc(invoice_doctype, invoice_name)
 
 		if original_invoice.docstatus != 1:
 			frappe.throw("Only submitted invoices can be returned.")
@@ -701,21 +654,7 @@ def return_sales_invoice(invoice_name):
 			frappe.throw("This invoice is already a return.")
 
 		# Exclude payment mapping
-		return_doc = get_mapped_doc(
-			"Sales Invoice",
-			invoice_name,
-			{
-				"Sales Invoice": {
-					"doctype": "Sales Invoice",
-					"field_map": {"name": "return_against"},
-					"validation": {"docstatus": ["=", 1]},
-				},
-				"Sales Invoice Item": {
-					"doctype": "Sales Invoice Item",
-					"field_map": {"name": "prevdoc_detail_docname"},
-				},
-			},
-		)
+		return_doc = get_mapped_doc(invoice_doctype, invoice_name, get_return_mapping(invoice_doctype))
 
 		return_doc.is_return = 1
 		return_doc.posting_date = frappe.utils.nowdate()
@@ -790,6 +729,21 @@ def return_sales_invoice(invoice_name):
 		return {"success": False, "message": str(e)}
 
 
+def get_return_mapping(invoice_doctype):
+	"""get_mapped_doc table map for a return against a Sales Invoice or POS Invoice."""
+	return {
+		invoice_doctype: {
+			"doctype": invoice_doctype,
+			"field_map": {"name": "return_against"},
+			"validation": {"docstatus": ["=", 1]},
+		},
+		f"{invoice_doctype} Item": {
+			"doctype": f"{invoice_doctype} Item",
+			"field_map": {"name": "prevdoc_detail_docname"},
+		},
+	}
+
+
 # Add this function to handle round-off amount calculation and write-off
 def set_base_roundoff_amount(doc, method):
 	"""Set base round-off amount based on conversion rate"""
@@ -800,19 +754,6 @@ def set_base_roundoff_amount(doc, method):
 	doc.custom_base_roundoff_amount = doc.conversion_rate * doc.custom_roundoff_amount
 
 
-def set_grand_total_with_roundoff(doc, method):
-	"""Modify grand total calculation to include round-off amount"""
-	from erpnext.controllers.taxes_and_totals import calculate_taxes_and_totals
-
-	if not doc.doctype == "Sales Invoice":
-		return
-	if not doc.custom_roundoff_account or not doc.custom_roundoff_amount:
-		return
-
-	# Monkey Patch calculate_totals method to include round-off
-	calculate_taxes_and_totals.calculate_totals = custom_calculate_totals
-
-
 def custom_calculate_totals(self):
 	"""Main function to calculate invoice totals with custom round-off logic"""
 	# Calculate basic grand total and taxes
@@ -888,7 +829,7 @@ def custom_calculate_totals(self):
 			decimal_part = flt(self.doc.grand_total - grand_total_int, 6)
 			# If decimal part is very small (<= 0.01), write it off (with small tolerance)
 			if decimal_part > 0 and decimal_part <= (0.01 + 1e-6):
-				writeoff_account = get_writeoff_account()
+				writeoff_account = get_writeoff_account(self.doc.get("pos_profile"))
 				if writeoff_account:
 					small_amount = decimal_part
 					if self.doc.custom_roundoff_amount:
@@ -907,7 +848,7 @@ def custom_calculate_totals(self):
 			abs_int = int(abs_total)
 			decimal_part = flt(abs_total - abs_int, 6)
 			if decimal_part > 0 and decimal_part <= (0.01 + 1e-6):
-				writeoff_account = get_writeoff_account()
+				writeoff_account = get_writeoff_account(self.doc.get("pos_profile"))
 				if writeoff_account:
 					small_amount = decimal_part
 					if self.doc.custom_roundoff_amount:
@@ -951,10 +892,18 @@ def create_roundoff_writeoff_entry(self):
 	self.doc.append("taxes", roundoff_entry)
 
 
-def get_writeoff_account():
-	pos_profile = get_current_pos_profile()
-	if pos_profile.write_off_account:
-		return pos_profile.write_off_account
+class RoundoffTaxesAndTotals(calculate_taxes_and_totals):
+	"""ERPNext totals calculation with KLiK round-off and small-fraction write-off applied."""
+
+	calculate_totals = custom_calculate_totals
+
+
+def get_writeoff_account(pos_profile=None):
+	"""Write-off account of the given POS Profile, or of the current user's POS Profile."""
+	if not pos_profile:
+		pos_profile = frappe.db.get_value("POS Profile User", {"user": frappe.session.user}, "parent")
+	if pos_profile:
+		return frappe.get_cached_value("POS Profile", pos_profile, "write_off_account")
 
 
 # @frappe.whitelist()
@@ -1002,6 +951,17 @@ def get_writeoff_account():
 
 
 class CustomSalesInvoice(SalesInvoice):
+	def calculate_taxes_and_totals(self):
+		# Non-POS invoices without a custom round-off keep ERPNext's own totals calculation;
+		# POS invoices always get the small-fraction write-off, as preview_cart_totals does
+		if not self.pos_profile and not (self.custom_roundoff_account and self.custom_roundoff_amount):
+			return super().calculate_taxes_and_totals()
+
+		# Same as AccountsController.calculate_taxes_and_totals, with the round-off aware totals
+		RoundoffTaxesAndTotals(self)
+		self.calculate_commission()
+		self.calculate_contribution()
+
 	def get_gl_entries(self, warehouse_account=None):
 		from erpnext.accounts.general_ledger import merge_similar_entries
 
@@ -1171,13 +1131,133 @@ def create_payment_entry(sales_invoice, mode_of_payment, amount_paid):
 		return payment_entry
 
 	except Exception as e:
-		frappe.log_error(
-			frappe.get_traceback(),
-			f"Error creating payment entry for invoice {sales_invoice.name}",
-		)
+		# Logged by process_deferred_payment_entry once its last attempt fails
 		frappe.throw(f"Failed to create payment entry: {e!s}")
 
 
+def set_payment_entry_status(invoice, status, payment_entry=None):
+	"""Record the deferred Payment Entry state on the invoice and its history summary."""
+	values = {"custom_payment_entry_status": status}
+	if status == "Queued":
+		values["custom_payment_entry_attempts"] = 0
+	if payment_entry:
+		values["custom_payment_entry"] = payment_entry
+	invoice.db_set(values, update_modified=False)
+	refresh_invoice_summary(invoice.doctype, invoice.name)
+
+
+def enqueue_payment_entry(sales_invoice, mode_of_payment, amount_paid):
+	"""Queue Payment Entry creation for a submitted B2B invoice and mark it as pending."""
+	set_payment_entry_status(sales_invoice, "Queued")
+	frappe.enqueue(
+		"klik_pos.api.sales_invoice.process_deferred_payment_entry",
+		queue="short",
+		job_id=f"klik_pos_payment_entry::{sales_invoice.name}",
+		deduplicate=True,
+		enqueue_after_commit=True,
+		invoice_name=sales_invoice.name,
+		mode_of_payment=mode_of_payment,
+		amount_paid=amount_paid,
+	)
+	return "Queued"
+
+
+def process_deferred_payment_entry(invoice_name, mode_of_payment, amount_paid, attempt=1):
+	"""
+	Background job: create and submit the Payment Entry for a B2B invoice.
+	A failed attempt is counted on the invoice, which stays Queued so that
+	retry_queued_payment_entries picks it up on a later scheduler tick; after
+	PAYMENT_ENTRY_MAX_ATTEMPTS the invoice is flagged as Failed and the error is logged.
+	"""
+	invoice = frappe.get_doc("Sales Invoice", invoice_name)
+	if invoice.docstatus != 1:
+		return
+
+	existing_payment_entry = get_linked_payment_entry(invoice_name)
+	if existing_payment_entry:
+		set_payment_entry_status(invoice, "Created", existing_payment_entry)
+		return
+
+	try:
+		frappe.db.savepoint("klik_payment_entry")
+		payment_entry = create_payment_entry(invoice, mode_of_payment, amount_paid)
+	except Exception:
+		frappe.db.rollback(save_point="klik_payment_entry")
+		if attempt < PAYMENT_ENTRY_MAX_ATTEMPTS:
+			# Retried later without holding the worker (lock wait, closed period being reopened)
+			invoice.db_set("custom_payment_entry_attempts", attempt, update_modified=False)
+			return
+
+		set_payment_entry_status(invoice, "Failed")
+		frappe.log_error(frappe.get_traceback(), f"Payment Entry Error for {invoice_name}")
+		return
+
+	set_payment_entry_status(invoice, "Created", payment_entry.name)
+
+
+def retry_queued_payment_entries():
+	"""Scheduler job: re-enqueue deferred Payment Entries whose last attempt failed."""
+	for invoice in frappe.get_all(
+		"Sales Invoice",
+		filters={
+			"custom_payment_entry_status": "Queued",
+			"docstatus": 1,
+			"custom_payment_entry_attempts": [">", 0],
+		},
+		fields=["name", "paid_amount", "custom_payment_entry_attempts"],
+	):
+		attempt = invoice.custom_payment_entry_attempts + 1
+		mode_of_payment = get_invoice_mode_of_payment(frappe.get_doc("Sales Invoice", invoice.name))
+		frappe.enqueue(
+			"klik_pos.api.sales_invoice.process_deferred_payment_entry",
+			queue="short",
+			job_id=f"klik_pos_payment_entry::{invoice.name}::{attempt}",
+			deduplicate=True,
+			invoice_name=invoice.name,
+			mode_of_payment=[{"method": mode_of_payment}] if mode_of_payment else None,
+			amount_paid=invoice.paid_amount,
+			attempt=attempt,
+		)
+
+
+def get_linked_payment_entry(invoice_name):
+	"""Return the submitted Payment Entry already allocated against the invoice, if any."""
+	return frappe.db.get_value(
+		"Payment Entry Reference",
+		{"reference_doctype": "Sales Invoice", "reference_name": invoice_name, "docstatus": 1},
+		"parent",
+	)
+
+
+@frappe.whitelist()
+def retry_payment_entry(invoice_name, mode_of_payment=None):
+	"""Re-queue Payment Entry creation for an invoice whose background job failed."""
+	try:
+		invoice = frappe.get_doc("Sales Invoice", invoice_name)
+		invoice.check_permission("write")
+
+		if invoice.custom_payment_entry_status != "Failed":
+			return {"success": False, "error": f"Invoice {invoice_name} has no failed Payment Entry"}
+
+		mode_of_payment = mode_of_payment or get_invoice_mode_of_payment(invoice)
+		if not mode_of_payment:
+			return {"success": False, "error": f"Invoice {invoice_name} has no mode of payment"}
+
+		status = enqueue_payment_entry(invoice, [{"method": mode_of_payment}], invoice.paid_amount)
+		return {"success": True, "payment_entry_status": status}
+
+	except Exception as e:
+		frappe.log_error(frappe.get_traceback(), f"Error retrying payment entry for {invoice_name}")
+		return {"success": False, "error": str(e)}
+
+
+def get_invoice_mode_of_payment(invoice):
+	"""Mode of payment the invoice was paid with at checkout: its first paid payment row."""
+	for payment in invoice.get("payments") or []:
+		if payment.mode_of_payment and flt(payment.amount):
+			return payment.mode_of_payment
+
+
 def get_customer_receivable_account(customer, company):
 	"""Get customer's receivable account using ERPNext utility"""
 	try:
@@ -1190,43 +1270,28 @@ def get_customer_receivable_account(customer, company):
 
 
 @frappe.whitelist()
-def returned_qty(customer, sales_invoice, item):
+def returned_qty(customer, sales_invoice, item, invoice_doctype=None):
 	"""
 	Get total returned quantity for a specific item (item_code) against a given sales invoice.
 	- sales_invoice should be the original invoice name.
 	- item should be the item_code (not item name or child row name).
+	- customer and invoice_doctype are accepted for compatibility; the return ledger is keyed
+	  by invoice and item only.
 	Returns: {'total_returned_qty': <float>}
 	"""
-	values = {
-		"customer": customer,
-		"sales_invoice": sales_invoice,
-		"item": item,
-	}
-
-	# Sum qty from Sales Invoice Items of return invoices that point to the original invoice
-	result = frappe.db.sql(
-		"""
-		SELECT COALESCE(SUM(sii.qty), 0) AS total_returned_qty
-		FROM `tabSales Invoice` si
-		JOIN `tabSales Invoice Item` sii ON si.name = sii.parent
-		WHERE si.is_return = 1
-		  AND si.return_against = %(sales_invoice)s
-		  AND sii.item_code = %(item)s
-		  AND si.docstatus = 1
-		  AND si.customer = %(customer)s
-		""",
-		values=values,
-		as_dict=True,
-	)
-
-	total = abs(result[0]["total_returned_qty"]) if result else 0.0
-	return {"total_returned_qty": float(total)}
+	return {"total_returned_qty": get_returned_qty(sales_invoice, item)}
 
 
 @frappe.whitelist()
 def get_valid_sales_invoices(doctype, txt, searchfield, start, page_len, filters=None):
-	"""Get valid sales invoices based on filters for multi-invoice returns"""
+	"""
+	Get valid sales invoices based on filters for multi-invoice returns.
+	Set filters["search_mode"] to "prefix" to match invoice names from the start, which can use
+	the primary key instead of scanning every name.
+	"""
 	filters = filters or {}
+	if isinstance(filters, str):
+		filters = json.loads(filters)
 
 	customer = filters.get("customer")
 	shipping_address = filters.get("shipping_address")
@@ -1238,54 +1303,53 @@ def get_valid_sales_invoices(doctype, txt, searchfield, start, page_len, filters
 
 	# Build dynamic conditions
 	conditions = [
-		"si.docstatus = 1",
+		"si.customer = %(customer)s",
 		"si.is_return = 0",
+		"si.docstatus = 1",
+		"si.posting_date >= %(start_date)s",
 		"si.custom_pos_opening_entry IS NOT NULL AND si.custom_pos_opening_entry != ''",  # Only POS-created invoices
 	]
 	query_params = {
-		"txt": f"%{txt}%",
-		"start": start,
-		"page_len": page_len,
+		"customer": customer,
+		"item_code": item_code,
+		"start_date": start_date,
+		"start": cint(start),
+		"page_len": cint(page_len) or 20,
 	}
 
-	if customer:
-		conditions.append("si.customer = %(customer)s")
-		query_params["customer"] = customer
-
 	if shipping_address:
 		conditions.append("si.shipping_address_name = %(shipping_address)s")
 		query_params["shipping_address"] = shipping_address
 
-	if item_code:
-		conditions.append("sii.item_code = %(item_code)s")
-		query_params["item_code"] = item_code
-
-	if start_date:
-		conditions.append("si.posting_date >= %(start_date)s")
-		query_params["start_date"] = start_date
-
-	conditions.append(
-		"""
-		(sii.qty + COALESCE((
-			SELECT SUM(cd.qtr)
-			FROM `tabCredit Details` cd
-			JOIN `tabSales Invoice` rsi ON cd.parent = rsi.name
-			WHERE cd.sales_invoice = si.name
-			AND cd.item = sii.item_code
-			AND rsi.customer = si.customer
-			AND rsi.docstatus = 1
-			AND rsi.status != 'Cancelled'
-		), 0)) > 0
-	"""
-	)
+	if txt:
+		conditions.append("si.name LIKE %(txt)s")
+		if filters.get("search_mode") == "prefix":
+			# Escape LIKE wildcards so the pattern stays a pure prefix (index range scan)
+			prefix = txt.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+			query_params["txt"] = f"{prefix}%"
+		else:
+			query_params["txt"] = f"%{txt}%"
 
+	# Returned quantities come pre-aggregated from the return ledger (one row per invoice
+	# and item), so eligibility is a join instead of a subquery per invoice item row
 	where_clause = " AND ".join(conditions)
-	query = f"""
-		SELECT DISTINCT si.name,si.posting_date,sii.qty
-		FROM `tabSales Invoice` si
-		JOIN `tabSales Invoice Item` sii ON si.name = sii.parent
+	branches = [
+		f"""
+		SELECT si.name, si.posting_date, SUM(sii.qty) AS qty
+		FROM `tab{invoice_doctype}` si
+		JOIN `tab{invoice_doctype} Item` sii
+			ON sii.parent = si.name AND sii.parenttype = '{invoice_doctype}' AND sii.item_code = %(item_code)s
+		LEFT JOIN `tabPOS Return Ledger` rl
+			ON rl.invoice = si.name AND rl.item_code = %(item_code)s
 		WHERE {where_clause}
-		AND si.name LIKE %(txt)s
+		GROUP BY si.name, si.posting_date, rl.returned_qty
+		HAVING SUM(sii.qty) - COALESCE(rl.returned_qty, 0) > 0
+		"""
+		for invoice_doctype in get_klik_invoice_doctypes()
+	]
+	query = f"""
+		{" UNION ALL ".join(branches)}
+		ORDER BY posting_date DESC, name DESC
 		LIMIT %(start)s, %(page_len)s
 	"""
 
@@ -1293,9 +1357,14 @@ def get_valid_sales_invoices(doctype, txt, searchfield, start, page_len, filters
 
 
 @frappe.whitelist()
-def get_customer_invoices_for_return(customer, start_date=None, end_date=None, shipping_address=None):
-	"""Get all invoices for a customer within date range that can be returned"""
+def get_customer_invoices_for_return(
+	customer, start_date=None, end_date=None, shipping_address=None, limit=100, start=0
+):
+	"""Get a page of a customer's invoices within date range that can be returned"""
 	try:
+		limit = cint(limit) or 100
+		start = cint(start)
+
 		filters = {
 			"customer": customer,
 			"docstatus": 1,
@@ -1316,66 +1385,83 @@ def get_customer_invoices_for_return(customer, start_date=None, end_date=None, s
 		if shipping_address:
 			filters["customer_address"] = shipping_address
 
-		invoices = frappe.get_all(
-			"Sales Invoice",
-			filters=filters,
-			fields=[
-				"name",
-				"posting_date",
-				"posting_time",
-				"customer",
-				"grand_total",
-				"paid_amount",
-				"status",
-			],
-			order_by="posting_date desc",
-		)
-
+		invoice_doctypes = get_klik_invoice_doctypes()
+		# With several doctypes, each one is read from the top and the merged list is paged
+		offset = start if len(invoice_doctypes) == 1 else 0
+
+		# One extra row tells whether another page follows
+		invoices = []
+		for invoice_doctype in invoice_doctypes:
+			for invoice in frappe.get_all(
+				invoice_doctype,
+				filters=filters,
+				fields=[
+					"name",
+					"posting_date",
+					"posting_time",
+					"customer",
+					"grand_total",
+					"paid_amount",
+					"status",
+				],
+				order_by="posting_date desc, name desc",
+				limit_start=offset,
+				limit_page_length=start - offset + limit + 1,
+			):
+				invoice.doctype = invoice_doctype
+				invoices.append(invoice)
+		invoices.sort(key=lambda invoice: (invoice.posting_date, invoice.name), reverse=True)
+		invoices = invoices[start - offset :]
+		has_more = len(invoices) > limit
+		invoices = invoices[:limit]
+
+		names_by_doctype = {}
 		for invoice in invoices:
-			items = frappe.get_all(
-				"Sales Invoice Item",
-				filters={"parent": invoice.name},
-				fields=["item_code", "item_name", "qty", "rate", "amount"],
+			names_by_doctype.setdefault(invoice.doctype, []).append(invoice.name)
+		names = [invoice.name for invoice in invoices]
+
+		items_by_invoice = {}
+		payments_by_invoice = {}
+		for invoice_doctype, doctype_names in names_by_doctype.items():
+			for item in frappe.get_all(
+				f"{invoice_doctype} Item",
+				filters={"parent": ["in", doctype_names]},
+				fields=["parent", "item_code", "item_name", "qty", "rate", "amount"],
+				order_by="parent asc, idx asc",
+			):
+				items_by_invoice.setdefault(item.pop("parent"), []).append(item)
+
+			for payment in frappe.get_all(
+				"Sales Invoice Payment",
+				filters={"parent": ["in", doctype_names], "parenttype": invoice_doctype},
+				fields=["parent", "mode_of_payment", "amount"],
+				order_by="parent asc, idx asc",
+			):
+				payments_by_invoice.setdefault(payment.pop("parent"), []).append(payment)
+
+		# Paid Sales Invoices without a payments table were settled through Payment Entries
+		settled_elsewhere = [
+			invoice.name
+			for invoice in invoices
+			if invoice.doctype == "Sales Invoice"
+			and invoice.name not in payments_by_invoice
+			and invoice.status in ("Paid", "Partly Paid")
+		]
+		for reference in _get_payment_entry_allocations(settled_elsewhere):
+			payments_by_invoice.setdefault(reference.reference_name, []).append(
+				{"mode_of_payment": reference.mode_of_payment, "amount": reference.allocated_amount}
 			)
 
-			# Calculate returned quantities for each item
+		returned_by_item = get_returned_qty_map(names)
+
+		for invoice in invoices:
+			items = items_by_invoice.get(invoice.name, [])
 			for item in items:
-				returned_data = returned_qty(customer, invoice.name, item.item_code)
-				item.returned_qty = returned_data.get("total_returned_qty", 0)
+				item.returned_qty = returned_by_item.get((invoice.name, item.item_code), 0)
 				item.available_qty = item.qty - item.returned_qty
-
 			invoice.items = items
 
-			# Get all payment methods from payment child table
-			invoice_doc = frappe.get_doc("Sales Invoice", invoice.name)
-			payment_methods = []
-			if invoice_doc.payments:
-				for payment in invoice_doc.payments:
-					payment_methods.append(
-						{"mode_of_payment": payment.mode_of_payment, "amount": payment.amount}
-					)
-			elif invoice_doc.status == "Draft":
-				payment_methods = []
-			else:
-				# Check Payment Entry if invoice payments table is empty but invoice is paid
-				if invoice_doc.status in ["Paid", "Partly Paid"] and not invoice_doc.payments:
-					payment_entries = frappe.get_all(
-						"Payment Entry Reference",
-						filters={"reference_name": invoice_doc.name, "reference_doctype": "Sales Invoice"},
-						fields=["parent", "allocated_amount"],
-						parent_doctype="Payment Entry",
-					)
-
-					for pe_ref in payment_entries:
-						payment_entry = frappe.get_doc("Payment Entry", pe_ref.parent)
-						if payment_entry.docstatus == 1:
-							payment_methods.append(
-								{
-									"mode_of_payment": payment_entry.mode_of_payment,
-									"amount": pe_ref.allocated_amount,
-								}
-							)
-
+			payment_methods = payments_by_invoice.get(invoice.name, [])
 			invoice.payment_methods = payment_methods
 			# Keep backward compatibility - show first payment method or combined display
 			if len(payment_methods) == 0:
@@ -1386,13 +1472,38 @@ def get_customer_invoices_for_return(customer, start_date=None, end_date=None, s
 				# Show combined payment methods like "Cash/Credit Card"
 				invoice.payment_method = "/".join([pm["mode_of_payment"] for pm in payment_methods])
 
-		return {"success": True, "data": invoices}
+		return {
+			"success": True,
+			"data": invoices,
+			"has_more": has_more,
+			"next_start": start + len(invoices) if has_more else None,
+		}
 
 	except Exception as e:
 		frappe.log_error(frappe.get_traceback(), "Error fetching customer invoices for return")
 		return {"success": False, "error": str(e)}
 
 
+def _get_payment_entry_allocations(invoice_names):
+	"""Submitted Payment Entry allocations against the given Sales Invoices, in one query."""
+	if not invoice_names:
+		return []
+
+	return frappe.db.sql(
+		"""
+		SELECT per.reference_name, pe.mode_of_payment, per.allocated_amount
+		FROM `tabPayment Entry Reference` per
+		JOIN `tabPayment Entry` pe ON pe.name = per.parent
+		WHERE per.reference_doctype = 'Sales Invoice'
+		  AND per.reference_name IN %(invoice_names)s
+		  AND pe.docstatus = 1
+		ORDER BY per.reference_name, pe.posting_date, per.idx
+		""",
+		{"invoice_names": tuple(invoice_names)},
+		as_dict=True,
+	)
+
+
 @frappe.whitelist()
 def create_partial_return(
 	invoice_name, return_items, payment_method=None, return_amount=None, expected_return_amount=None
@@ -1403,7 +1514,8 @@ def create_partial_return(
 		if isinstance(return_items, str):
 			return_items = json.loads(return_items)
 
-		original_invoice = frappe.get_doc("Sales Invoice", invoice_name)
+		invoice_doctype = get_invoice_doctype(invoice_name)
+		original_invoice = frappe.get_doc(invoice_doctype, invoice_name)
 
 		if original_invoice.docstatus != 1:
 			frappe.throw("Only submitted invoices can be returned.")
@@ -1411,163 +1523,295 @@ def create_partial_return(
 		if original_invoice.is_return:
 			frappe.throw("This invoice is already a return.")
 
-		# Create return invoice using the same approach as return_sales_invoice
-		return_doc = get_mapped_doc(
-			"Sales Invoice",
+		return_doc, final_payment_method = _build_partial_return(
+			invoice_doctype,
 			invoice_name,
-			{
-				"Sales Invoice": {
-					"doctype": "Sales Invoice",
-					"field_map": {"name": "return_against"},
-					"validation": {"docstatus": ["=", 1]},
-				},
-				"Sales Invoice Item": {
-					"doctype": "Sales Invoice Item",
-					"field_map": {"name": "prevdoc_detail_docname"},
-				},
-			},
+			return_items,
+			payment_method,
+			return_amount,
+			expected_return_amount,
+			_get_return_context(),
 		)
+		return_doc.save()
+		return_doc.submit()
 
-		return_doc.is_return = 1
-		return_doc.posting_date = frappe.utils.nowdate()
-		return_doc.custom_delivery_date = frappe.utils.nowdate()
+		return {
+			"success": True,
+			"return_invoice": return_doc.name,
+			"message": f"Return created successfully: {return_doc.name} (Payment: {final_payment_method})",
+		}
 
-		# Set the current POS opening entry
-		current_opening_entry = get_current_pos_opening_entry()
-		if current_opening_entry:
-			return_doc.custom_pos_opening_entry = current_opening_entry
+	except Exception as e:
+		frappe.log_error(frappe.get_traceback(), "Partial Return Error")
+		return {"success": False, "message": str(e)}
 
-		# Ensure no original round-off leaks into partial return
-		return_doc.custom_roundoff_amount = 0
-		return_doc.custom_base_roundoff_amount = 0
-		return_doc.custom_roundoff_account = get_writeoff_account()
 
-		# Filter items to only include selected ones with return quantities
-		filtered_items = []
-		for return_item in return_items:
-			if return_item.get("return_qty", 0) > 0:
-				for item in return_doc.items:
-					if item.item_code == return_item["item_code"]:
-						item.qty = -abs(return_item["return_qty"])
-						filtered_items.append(item)
-						break
+def _get_return_context():
+	"""Lookups shared by every return document of one request."""
+	return frappe._dict(
+		opening_entry=get_current_pos_opening_entry(),
+		writeoff_account=get_writeoff_account(),
+		has_expected_refund_field=frappe.get_meta("Sales Invoice").has_field("custom_expected_refund_amount"),
+	)
 
-		return_doc.items = filtered_items
 
-		# No custom roundoff mirroring for now
+def _build_partial_return(
+	invoice_doctype,
+	invoice_name,
+	return_items,
+	payment_method,
+	return_amount,
+	expected_return_amount,
+	context,
+):
+	"""Map an unsaved return document for the selected items; returns (doc, payment method)."""
+	# Create return invoice using the same approach as return_sales_invoice
+	return_doc = get_mapped_doc(invoice_doctype, invoice_name, get_return_mapping(invoice_doctype))
 
-		# Clear existing payments
-		return_doc.payments = []
+	return_doc.is_return = 1
+	return_doc.posting_date = frappe.utils.nowdate()
+	return_doc.custom_delivery_date = frappe.utils.nowdate()
 
-		# Calculate total returned amount (baseline expected refund)
-		# Prefer client-provided expected amount; fallback to backend computation
-		if expected_return_amount is not None:
-			try:
-				total_returned_amount = flt(expected_return_amount, return_doc.precision("grand_total") or 2)
-			except Exception:
-				total_returned_amount = sum(abs(item.qty * item.rate) for item in return_doc.items)
-		else:
-			total_returned_amount = sum(abs(item.qty * item.rate) for item in return_doc.items)
+	# Set the current POS opening entry
+	if context.opening_entry:
+		return_doc.custom_pos_opening_entry = context.opening_entry
+
+	# Ensure no original round-off leaks into partial return
+	return_doc.custom_roundoff_amount = 0
+	return_doc.custom_base_roundoff_amount = 0
+	return_doc.custom_roundoff_account = context.writeoff_account
+
+	# Filter items to only include selected ones with return quantities
+	filtered_items = []
+	for return_item in return_items:
+		if return_item.get("return_qty", 0) > 0:
+			for item in return_doc.items:
+				if item.item_code == return_item["item_code"]:
+					item.qty = -abs(return_item["return_qty"])
+					filtered_items.append(item)
+					break
 
-		final_return_amount = return_amount if return_amount is not None else total_returned_amount
+	return_doc.items = filtered_items
 
-		final_payment_method = payment_method if payment_method else "Cash"
+	# No custom roundoff mirroring for now
 
-		# Optionally persist the auto-calculated expected refund if a custom field exists
-		try:
-			_si_meta = frappe.get_meta("Sales Invoice")
-			if any(df.fieldname == "custom_expected_refund_amount" for df in _si_meta.fields):
-				return_doc.custom_expected_refund_amount = flt(
-					total_returned_amount, return_doc.precision("grand_total") or 2
-				)
-		except Exception:
-			pass
+	# Clear existing payments
+	return_doc.payments = []
 
-		# If cashier entered a custom refund (partial return), push the difference to round-off on the return
+	# Calculate total returned amount (baseline expected refund)
+	# Prefer client-provided expected amount; fallback to backend computation
+	if expected_return_amount is not None:
 		try:
-			# Only apply when there's a meaningful difference
-			prec = return_doc.precision("grand_total") or 2
-			_diff = flt(total_returned_amount, prec) - flt(final_return_amount, prec)
-			if abs(_diff) > (10 ** (-prec)) / 2:
-				# For returns, custom_calculate_totals ADDS custom_roundoff_amount to grand_total.
-				# This is a NEW write-off specific to this partial return. Do not accumulate.
-				return_doc.custom_roundoff_amount = 0
-				return_doc.custom_base_roundoff_amount = 0
-				return_doc.custom_roundoff_amount = abs(flt(_diff, prec))
-				return_doc.custom_roundoff_account = get_writeoff_account()
-				return_doc.custom_base_roundoff_amount = flt(
-					return_doc.custom_roundoff_amount * (return_doc.conversion_rate or 1), prec
-				)
+			total_returned_amount = flt(expected_return_amount, return_doc.precision("grand_total") or 2)
 		except Exception:
-			pass
+			total_returned_amount = sum(abs(item.qty * item.rate) for item in return_doc.items)
+	else:
+		total_returned_amount = sum(abs(item.qty * item.rate) for item in return_doc.items)
 
-		if final_return_amount > 0:
-			return_doc.append(
-				"payments",
-				{
-					"mode_of_payment": final_payment_method,
-					"amount": -abs(final_return_amount),
-				},
-			)
-		print("Mko 3", -abs(final_return_amount))
-		# Recalculate totals (payment amount stays as user entered)
-		try:
-			return_doc.calculate_taxes_and_totals()
-		except Exception:
-			pass
+	final_return_amount = return_amount if return_amount is not None else total_returned_amount
 
-		return_doc.save()
-		return_doc.submit()
+	final_payment_method = payment_method if payment_method else "Cash"
 
-		return {
-			"success": True,
-			"return_invoice": return_doc.name,
-			"message": f"Return created successfully: {return_doc.name} (Payment: {final_payment_method})",
-		}
+	# Optionally persist the auto-calculated expected refund if a custom field exists
+	if context.has_expected_refund_field:
+		return_doc.custom_expected_refund_amount = flt(
+			total_returned_amount, return_doc.precision("grand_total") or 2
+		)
 
-	except Exception as e:
-		frappe.log_error(frappe.get_traceback(), "Partial Return Error")
-		return {"success": False, "message": str(e)}
+	# If cashier entered a custom refund (partial return), push the difference to round-off on the return
+	try:
+		# Only apply when there's a meaningful difference
+		prec = return_doc.precision("grand_total") or 2
+		_diff = flt(total_returned_amount, prec) - flt(final_return_amount, prec)
+		if abs(_diff) > (10 ** (-prec)) / 2 and invoice_doctype == "POS Invoice":
+			# POS Invoice returns carry the difference as a standard (negative) write-off
+			return_doc.write_off_amount = -flt(_diff, prec)
+			return_doc.write_off_account = get_writeoff_account(return_doc.pos_profile)
+			return_doc.write_off_cost_center = return_doc.cost_center or frappe.get_cached_value(
+				"POS Profile", return_doc.pos_profile, "cost_center"
+			)
+		elif abs(_diff) > (10 ** (-prec)) / 2:
+			# For returns, custom_calculate_totals ADDS custom_roundoff_amount to grand_total.
+			# This is a NEW write-off specific to this partial return. Do not accumulate.
+			return_doc.custom_roundoff_amount = 0
+			return_doc.custom_base_roundoff_amount = 0
+			return_doc.custom_roundoff_amount = abs(flt(_diff, prec))
+			return_doc.custom_roundoff_account = context.writeoff_account
+			return_doc.custom_base_roundoff_amount = flt(
+				return_doc.custom_roundoff_amount * (return_doc.conversion_rate or 1), prec
+			)
+	except Exception:
+		pass
+
+	if final_return_amount > 0:
+		return_doc.append(
+			"payments",
+			{
+				"mode_of_payment": final_payment_method,
+				"amount": -abs(final_return_amount),
+			},
+		)
+	logger.debug("Partial return against %s refunds %s", return_doc.return_against, -abs(final_return_amount))
+	# Recalculate totals (payment amount stays as user entered)
+	try:
+		return_doc.calculate_taxes_and_totals()
+	except Exception:
+		pass
+
+	return return_doc, final_payment_method
 
 
 @frappe.whitelist()
 def create_multi_invoice_return(return_data):
-	"""Create multiple return invoices for items from different invoices"""
+	"""
+	Create return invoices for items from different invoices in one transaction.
+	Every line is validated against sold and already returned quantities before any
+	document is created. By default the batch is all-or-nothing; pass
+	"atomic": false to keep the returns that succeed and get a result per invoice.
+	"""
 	try:
 		if isinstance(return_data, str):
 			return_data = json.loads(return_data)
 
-		invoice_returns = return_data.get("invoice_returns", [])
+		atomic = cint(return_data.get("atomic", 1))
+		invoice_returns = [row for row in return_data.get("invoice_returns", []) if row.get("return_items")]
+		if not invoice_returns:
+			return {"success": True, "created_returns": [], "results": [], "message": "Nothing to return"}
 
-		created_returns = []
+		doctypes = _get_invoice_doctypes([row.get("invoice_name") for row in invoice_returns])
+		errors = validate_multi_invoice_return(invoice_returns, doctypes)
+		if errors:
+			return {
+				"success": False,
+				"created_returns": [],
+				"results": [
+					{"invoice_name": name, "success": False, "message": message}
+					for name, message in errors.items()
+				],
+				"message": "No returns were created: " + "; ".join(f"{k}: {v}" for k, v in errors.items()),
+			}
 
-		for _i, invoice_return in enumerate(invoice_returns):
+		context = _get_return_context()
+		created_returns = []
+		results = []
+		frappe.db.savepoint("klik_return_batch")
+		for invoice_return in invoice_returns:
 			invoice_name = invoice_return.get("invoice_name")
-			return_items = invoice_return.get("return_items", [])
-			payment_method = invoice_return.get("payment_method")
-			return_amount = invoice_return.get("return_amount")
-
-			if return_items:
-				# Call create_partial_return with payment method and return amount
-				result = create_partial_return(
-					invoice_name, return_items, payment_method=payment_method, return_amount=return_amount
+			savepoint = f"klik_return_{len(results)}"
+			frappe.db.savepoint(savepoint)
+			try:
+				return_doc, _payment_method = _build_partial_return(
+					doctypes[invoice_name],
+					invoice_name,
+					invoice_return.get("return_items"),
+					invoice_return.get("payment_method"),
+					invoice_return.get("return_amount"),
+					None,
+					context,
 				)
-				if result.get("success"):
-					created_returns.append(result.get("return_invoice"))
-				else:
-					frappe.log_error(f"Failed to create return for {invoice_name}: {result.get('message')}")
-
+				return_doc.save()
+				return_doc.submit()
+			except Exception as e:
+				frappe.db.rollback(save_point=savepoint)
+				results.append({"invoice_name": invoice_name, "success": False, "message": str(e)})
+				if atomic:
+					# Undo the returns already created in this batch
+					frappe.db.rollback(save_point="klik_return_batch")
+					frappe.log_error(frappe.get_traceback(), "Multi Invoice Return Error")
+					return {
+						"success": False,
+						"created_returns": [],
+						"results": results,
+						"message": f"No returns were created: {invoice_name}: {e!s}",
+					}
+				logger.warning("Return against %s failed: %s", invoice_name, e)
+				continue
+
+			created_returns.append(return_doc.name)
+			results.append({"invoice_name": invoice_name, "success": True, "return_invoice": return_doc.name})
+
+		failed = len(results) - len(created_returns)
 		return {
-			"success": True,
+			"success": bool(created_returns),
 			"created_returns": created_returns,
-			"message": f"Created {len(created_returns)} return invoices successfully",
+			"results": results,
+			"message": f"Created {len(created_returns)} return invoices successfully"
+			+ (f", {failed} failed" if failed else ""),
 		}
 
 	except Exception as e:
+		frappe.db.rollback()
 		frappe.log_error(frappe.get_traceback(), "Multi Invoice Return Error")
 		return {"success": False, "message": str(e)}
 
 
+def validate_multi_invoice_return(invoice_returns, doctypes):
+	"""
+	Check every return line against the original invoices in one pass.
+	Returns {invoice_name: error message} for the invoices that cannot be returned as requested.
+	"""
+	names_by_doctype = {}
+	for name, invoice_doctype in doctypes.items():
+		names_by_doctype.setdefault(invoice_doctype, []).append(name)
+
+	headers = {}
+	sold_qty = {}
+	for invoice_doctype, names in names_by_doctype.items():
+		for row in frappe.get_all(
+			invoice_doctype,
+			filters={"name": ["in", names]},
+			fields=["name", "docstatus", "is_return"],
+		):
+			headers[row.name] = row
+
+		for row in frappe.get_all(
+			f"{invoice_doctype} Item",
+			filters={"parent": ["in", names]},
+			fields=["parent", "item_code", "sum(qty) as qty"],
+			group_by="parent, item_code",
+		):
+			sold_qty[(row.parent, row.item_code)] = flt(row.qty)
+
+	returned = get_returned_qty_map(list(doctypes))
+
+	requested = {}
+	errors = {}
+	for invoice_return in invoice_returns:
+		invoice_name = invoice_return.get("invoice_name")
+		header = headers.get(invoice_name)
+		if not header:
+			errors[invoice_name] = "Invoice not found."
+		elif header.docstatus != 1:
+			errors[invoice_name] = "Only submitted invoices can be returned."
+		elif header.is_return:
+			errors[invoice_name] = "This invoice is already a return."
+		if invoice_name in errors:
+			continue
+
+		for item in invoice_return.get("return_items"):
+			qty = flt(item.get("return_qty"))
+			if qty > 0:
+				key = (invoice_name, item.get("item_code"))
+				requested[key] = requested.get(key, 0) + qty
+
+	for (invoice_name, item_code), qty in requested.items():
+		if (invoice_name, item_code) not in sold_qty:
+			errors.setdefault(invoice_name, f"Item {item_code} is not on this invoice.")
+			continue
+
+		available = sold_qty[(invoice_name, item_code)] - returned.get((invoice_name, item_code), 0)
+		if qty > available:
+			errors.setdefault(invoice_name, f"Only {available:g} of {item_code} can still be returned.")
+
+	return errors
+
+
+def _get_invoice_doctypes(invoice_names):
+	"""Like get_invoice_doctype, for many invoices in one query."""
+	pos_invoices = set(frappe.get_all("POS Invoice", filters={"name": ["in", invoice_names]}, pluck="name"))
+	return {name: "POS Invoice" if name in pos_invoices else "Sales Invoice" for name in invoice_names}
+
+
 @frappe.whitelist()
 def delete_draft_invoice(invoice_id):
 	"""
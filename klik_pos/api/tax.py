@@ -3,36 +3,36 @@ from frappe import _
 
 from klik_pos.klik_pos.utils import get_current_pos_profile
 
+# Redis hash of compiled templates (one field per template name) and the
+# list of enabled template names used by the tax picker.
+TAX_TEMPLATE_CACHE_KEY = "klik_pos_tax_templates"
+TAX_TEMPLATE_INDEX_KEY = "klik_pos_tax_template_index"
+
+# Columns copied from "Sales Taxes and Charges" rows onto a new invoice
+TAX_ROW_FIELDS = (
+	"charge_type",
+	"account_head",
+	"description",
+	"cost_center",
+	"rate",
+	"row_id",
+	"tax_amount",
+	"included_in_print_rate",
+)
+
 
 @frappe.whitelist(allow_guest=True)
 def get_sales_tax_categories():
 	try:
-		tax_categories = frappe.get_all(
-			"Sales Taxes and Charges Template",
-			filters={"disabled": 0},
-			fields=["name", "title"],
-		)
-
 		result = []
-		for cat in tax_categories:
-			# Get the first tax entry to determine rate and type
-			tax_entry = frappe.db.get_value(
-				"Sales Taxes and Charges",
-				{"parent": cat.name},
-				["rate", "included_in_print_rate"],
-				as_dict=True,
-			)
-
-			tax_rate = tax_entry.get("rate", 0.0) if tax_entry else 0.0
-			is_inclusive = tax_entry.get("included_in_print_rate", 0) if tax_entry else 0
-
+		for template in get_compiled_tax_templates(get_enabled_tax_template_names()):
 			result.append(
 				{
-					"id": cat.name,
-					"name": cat.title or cat.name,
-					"rate": float(tax_rate),
-					"is_inclusive": bool(is_inclusive),
-					"type": "inclusive" if is_inclusive else "exclusive",
+					"id": template["name"],
+					"name": template["title"] or template["name"],
+					"rate": template["rate"],
+					"is_inclusive": template["is_inclusive"],
+					"type": "inclusive" if template["is_inclusive"] else "exclusive",
 				}
 			)
 
@@ -52,3 +52,88 @@ def get_sales_tax_categories():
 def get_default_sales_tax_charges():
 	pos_doc = get_current_pos_profile()
 	return pos_doc.taxes_and_charges
+
+
+def get_enabled_tax_template_names():
+	"""Return names of enabled Sales Taxes and Charges Templates, cached until a template changes."""
+	names = frappe.cache().get_value(TAX_TEMPLATE_INDEX_KEY)
+	if names is None:
+		names = frappe.get_all(
+			"Sales Taxes and Charges Template",
+			filters={"disabled": 0},
+			pluck="name",
+		)
+		frappe.cache().set_value(TAX_TEMPLATE_INDEX_KEY, names)
+	return names
+
+
+def get_compiled_tax_template(template_name):
+	"""
+	Return a Sales Taxes and Charges Template compiled into plain rows ready to
+	append to a Sales Invoice, along with the picker summary (first row rate and
+	inclusivity).
+	"""
+	if not template_name:
+		return None
+	templates = get_compiled_tax_templates([template_name])
+	return templates[0] if templates else None
+
+
+def get_compiled_tax_templates(template_names):
+	"""
+	Compiled templates for many names, in order. Compiled templates are cached by name
+	and carry the template's `modified` timestamp; one query reads the current
+	timestamps of all requested templates, so changes made without the doc hooks
+	(db_set, data import) are recompiled too.
+	"""
+	template_names = [name for name in template_names if name]
+	if not template_names:
+		return []
+
+	cache = frappe.cache()
+	modified = dict(
+		frappe.get_all(
+			"Sales Taxes and Charges Template",
+			filters={"name": ["in", template_names]},
+			fields=["name", "modified"],
+			as_list=True,
+		)
+	)
+	templates = []
+	for template_name in template_names:
+		template = cache.hget(TAX_TEMPLATE_CACHE_KEY, template_name)
+		if template is None or template["modified"] != str(modified.get(template_name)):
+			template = compile_tax_template(template_name)
+			cache.hset(TAX_TEMPLATE_CACHE_KEY, template_name, template)
+		templates.append(template)
+	return templates
+
+
+def compile_tax_template(template_name):
+	"""Load a template document once and flatten it into a cacheable dict."""
+	try:
+		tax_doc = frappe.get_doc("Sales Taxes and Charges Template", template_name)
+	except frappe.DoesNotExistError:
+		frappe.throw(_("Tax Template '{0}' not found").format(template_name))
+
+	rows = [{field: tax.get(field) for field in TAX_ROW_FIELDS} for tax in tax_doc.taxes]
+	first_row = rows[0] if rows else {}
+
+	return {
+		"name": tax_doc.name,
+		"title": tax_doc.title,
+		"modified": str(tax_doc.modified),
+		"disabled": tax_doc.disabled,
+		"rate": float(first_row.get("rate") or 0.0),
+		"is_inclusive": bool(first_row.get("included_in_print_rate")),
+		"rows": rows,
+	}
+
+
+def clear_tax_template_cache(doc=None, method=None):
+	"""doc_events hook: drop compiled templates when a Sales Taxes and Charges Template changes."""
+	if doc and doc.get("name") and method != "after_rename":
+		frappe.cache().hdel(TAX_TEMPLATE_CACHE_KEY, doc.name)
+	else:
+		frappe.cache().delete_value(TAX_TEMPLATE_CACHE_KEY)
+	frappe.cache().delete_value(TAX_TEMPLATE_INDEX_KEY)
@@ -0,0 +1,259 @@
+import json
+
+import frappe
+from frappe import _
+from frappe.utils import cint, flt, get_field_precision, round_based_on_smallest_currency_fraction
+
+from klik_pos.api.tax import get_compiled_tax_template
+from klik_pos.klik_pos.utils import get_current_pos_profile
+
+# Fractional remainder written off automatically (e.g. 10.01 -> 10.00), see custom_calculate_totals
+AUTO_WRITEOFF_LIMIT = 0.01 + 1e-6
+
+
+@frappe.whitelist()
+def preview_cart_totals(data):
+	"""
+	Compute cart totals without building or inserting a Sales Invoice.
+	Accepts the same payload as create_and_submit_invoice (items, SalesTaxCharges, roundOffAmount).
+	"""
+	try:
+		if isinstance(data, str):
+			data = json.loads(data)
+
+		items = data.get("items") or []
+		if not items:
+			frappe.throw(_("At least one item is required"))
+
+		pos_profile = get_current_pos_profile()
+		currency = data.get("currency") or pos_profile.currency
+		writeoff_account = pos_profile.write_off_account
+
+		taxes = []
+		template = get_compiled_tax_template(data.get("SalesTaxCharges") or pos_profile.taxes_and_charges)
+		if template:
+			taxes = template["rows"]
+
+		precision = get_field_precision(
+			frappe.get_meta("Sales Invoice").get_field("grand_total"), frappe._dict({"currency": currency})
+		)
+		disable_rounded_total = cint(pos_profile.get("disable_rounded_total")) or cint(
+			frappe.db.get_single_value("Global Defaults", "disable_rounded_total")
+		)
+
+		totals = calculate_cart_totals(
+			items=[{"qty": item.get("quantity"), "rate": item.get("price")} for item in items],
+			taxes=taxes,
+			roundoff_amount=data.get("roundOffAmount", 0.0) if writeoff_account else 0.0,
+			is_return=cint(data.get("isReturn")),
+			currency=currency,
+			precision=precision,
+			allow_auto_writeoff=bool(writeoff_account),
+			disable_rounded_total=disable_rounded_total,
+		)
+
+		return {"success": True, "data": totals}
+
+	except Exception as e:
+		frappe.log_error(frappe.get_traceback(), "Cart Totals Preview Error")
+		return {"success": False, "message": str(e)}
+
+
+def calculate_cart_totals(
+	items,
+	taxes,
+	roundoff_amount=0.0,
+	is_return=False,
+	conversion_rate=1.0,
+	currency=None,
+	precision=2,
+	allow_auto_writeoff=True,
+	disable_rounded_total=False,
+):
+	"""
+	Pure totals calculator mirroring ERPNext's calculate_taxes_and_totals followed by
+	custom_calculate_totals: inclusive/exclusive taxes, custom round-off and the <= 0.01 auto write-off.
+
+	`items` are dicts with qty and rate, `taxes` are Sales Taxes and Charges rows
+	(charge_type, rate, tax_amount, row_id, included_in_print_rate).
+	"""
+	conversion_rate = flt(conversion_rate) or 1.0
+	lines = []
+	for item in items:
+		qty = flt(item.get("qty"))
+		amount = flt(flt(item.get("rate")) * qty, precision)
+		lines.append(frappe._dict({"qty": qty, "amount": amount, "net_amount": amount}))
+
+	tax_rows = [
+		frappe._dict(
+			{
+				"charge_type": tax.get("charge_type"),
+				"rate": flt(tax.get("rate")),
+				"row_id": cint(tax.get("row_id")),
+				"included_in_print_rate": cint(tax.get("included_in_print_rate")),
+				"description": tax.get("description"),
+				"account_head": tax.get("account_head"),
+				"tax_amount": flt(tax.get("tax_amount"), precision)
+				if tax.get("charge_type") == "Actual"
+				else 0.0,
+			}
+		)
+		for tax in taxes or []
+	]
+
+	if any(tax.included_in_print_rate for tax in tax_rows):
+		_determine_exclusive_rate(lines, tax_rows, precision)
+
+	total = flt(sum(line.amount for line in lines), precision)
+	net_total = flt(sum(line.net_amount for line in lines), precision)
+
+	_calculate_taxes(lines, tax_rows, net_total, precision)
+
+	grand_total_diff = 0.0
+	if tax_rows and any(tax.included_in_print_rate for tax in tax_rows):
+		non_inclusive_tax_amount = sum(tax.tax_amount for tax in tax_rows if not tax.included_in_print_rate)
+		diff = flt(total + non_inclusive_tax_amount - flt(tax_rows[-1].total, precision), precision)
+		if diff and abs(diff) <= (5.0 / 10**precision):
+			grand_total_diff = diff
+
+	# Same steps as custom_calculate_totals
+	if tax_rows:
+		grand_total = flt(tax_rows[-1].total) + grand_total_diff
+		total_taxes_and_charges = flt(grand_total - net_total - grand_total_diff, precision)
+	else:
+		grand_total = net_total
+		total_taxes_and_charges = 0.0
+
+	custom_roundoff_amount = flt(abs(flt(roundoff_amount)))
+	if custom_roundoff_amount:
+		if is_return:
+			grand_total += custom_roundoff_amount
+		else:
+			grand_total -= custom_roundoff_amount
+
+	base_net_total = flt(net_total * conversion_rate, precision)
+	base_grand_total = (
+		flt(grand_total * conversion_rate, precision) if total_taxes_and_charges else base_net_total
+	)
+	grand_total = flt(grand_total, precision)
+	base_grand_total = flt(base_grand_total, precision)
+
+	if allow_auto_writeoff and grand_total:
+		abs_total = abs(grand_total)
+		decimal_part = flt(abs_total - int(abs_total), 6)
+		if decimal_part > 0 and decimal_part <= AUTO_WRITEOFF_LIMIT:
+			custom_roundoff_amount += decimal_part
+			if grand_total > 0:
+				grand_total -= decimal_part
+			else:
+				grand_total += decimal_part
+			base_grand_total = grand_total * conversion_rate
+
+	if disable_rounded_total:
+		rounded_total = rounding_adjustment = 0.0
+	else:
+		rounded_total = round_based_on_smallest_currency_fraction(grand_total, currency, precision)
+		rounding_adjustment = flt(rounded_total - grand_total, precision)
+
+	return {
+		"total": total,
+		"net_total": net_total,
+		"taxes": [
+			{
+				"charge_type": tax.charge_type,
+				"description": tax.description,
+				"account_head": tax.account_head,
+				"rate": tax.rate,
+				"included_in_print_rate": tax.included_in_print_rate,
+				"tax_amount": tax.tax_amount,
+				"total": tax.total,
+			}
+			for tax in tax_rows
+		],
+		"total_taxes_and_charges": total_taxes_and_charges,
+		"custom_roundoff_amount": flt(custom_roundoff_amount, precision),
+		"custom_base_roundoff_amount": flt(custom_roundoff_amount * conversion_rate, precision),
+		"grand_total": flt(grand_total, precision),
+		"base_grand_total": flt(base_grand_total, precision),
+		"rounded_total": rounded_total,
+		"rounding_adjustment": rounding_adjustment,
+	}
+
+
+def _determine_exclusive_rate(lines, tax_rows, precision):
+	"""Back out inclusive (print-rate) taxes from line amounts, as ERPNext's determine_exclusive_rate."""
+	for line in lines:
+		cumulated_tax_fraction = 0.0
+		inclusive_tax_amount = 0.0
+		for i, tax in enumerate(tax_rows):
+			tax_fraction, amount_per_qty = _get_current_tax_fraction(tax, tax_rows)
+			tax.tax_fraction_for_current_item = tax_fraction
+			previous = tax_rows[i - 1].grand_total_fraction_for_current_item if i else 1
+			tax.grand_total_fraction_for_current_item = previous + tax_fraction
+			cumulated_tax_fraction += tax_fraction
+			inclusive_tax_amount += amount_per_qty * line.qty
+
+		if line.qty and (cumulated_tax_fraction or inclusive_tax_amount):
+			line.net_amount = flt(
+				(line.amount - inclusive_tax_amount) / (1 + cumulated_tax_fraction), precision
+			)
+
+
+def _get_current_tax_fraction(tax, tax_rows):
+	if not tax.included_in_print_rate:
+		return 0.0, 0.0
+
+	if tax.charge_type == "On Net Total":
+		return tax.rate / 100.0, 0.0
+	if tax.charge_type == "On Previous Row Amount":
+		return (tax.rate / 100.0) * tax_rows[tax.row_id - 1].tax_fraction_for_current_item, 0.0
+	if tax.charge_type == "On Previous Row Total":
+		return (tax.rate / 100.0) * tax_rows[tax.row_id - 1].grand_total_fraction_for_current_item, 0.0
+	if tax.charge_type == "On Item Quantity":
+		return 0.0, tax.rate
+	return 0.0, 0.0
+
+
+def _calculate_taxes(lines, tax_rows, net_total, precision):
+	"""Accumulate per-line tax amounts and cumulative totals, as ERPNext's calculate_taxes."""
+	actual_tax_remaining = {}
+	for i, tax in enumerate(tax_rows):
+		if tax.charge_type == "Actual":
+			actual_tax_remaining[i] = tax.tax_amount
+		else:
+			tax.tax_amount = 0.0
+
+	for n, line in enumerate(lines):
+		for i, tax in enumerate(tax_rows):
+			current_tax_amount = _get_current_tax_amount(line, tax, tax_rows, net_total)
+
+			if tax.charge_type == "Actual":
+				# Push the rounding remainder of the distributed amount onto the last line
+				actual_tax_remaining[i] -= current_tax_amount
+				if n == len(lines) - 1:
+					current_tax_amount += actual_tax_remaining[i]
+			else:
+				tax.tax_amount += current_tax_amount
+
+			tax.tax_amount_for_current_item = current_tax_amount
+			previous = tax_rows[i - 1].grand_total_for_current_item if i else line.net_amount
+			tax.grand_total_for_current_item = flt(previous + current_tax_amount)
+
+			if n == len(lines) - 1:
+				tax.tax_amount = flt(tax.tax_amount, precision)
+				previous_total = tax_rows[i - 1].total if i else net_total
+				tax.total = flt(previous_total + tax.tax_amount, precision)
+
+
+def _get_current_tax_amount(line, tax, tax_rows, net_total):
+	if tax.charge_type == "Actual":
+		return line.net_amount * tax.tax_amount / net_total if net_total else 0.0
+	if tax.charge_type == "On Net Total":
+		return (tax.rate / 100.0) * line.net_amount
+	if tax.charge_type == "On Previous Row Amount":
+		return (tax.rate / 100.0) * tax_rows[tax.row_id - 1].tax_amount_for_current_item
+	if tax.charge_type == "On Previous Row Total":
+		return (tax.rate / 100.0) * tax_rows[tax.row_id - 1].grand_total_for_current_item
+	if tax.charge_type == "On Item Quantity":
+		return tax.rate * line.qty
+	return 0.0
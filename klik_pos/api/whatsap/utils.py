@@ -9,10 +9,13 @@ import frappe
 from frappe import _
 from frappe.desk.form.utils import get_pdf_link
 from frappe.integrations.utils import make_post_request
-from frappe.utils import get_url
 
+from klik_pos.api.invoice_pdf import get_invoice_pdf_url
+from klik_pos.klik_pos.log import get_logger
 from klik_pos.klik_pos.utils import get_current_pos_profile
 
+logger = get_logger("whatsapp")
+
 
 @frappe.whitelist()
 def send_whatsapp_message(
@@ -296,7 +299,7 @@ def make_whatsapp_api_call(
 			data=json.dumps(data),
 		)
 
-		frappe.logger().debug(f"WhatsApp API Response: {json.dumps(response, indent=2)}")
+		logger.debug("WhatsApp API response: %s", response)
 
 		# Create WhatsApp message record
 		message_doc = frappe.new_doc("WhatsApp Chat")
@@ -386,7 +389,7 @@ def get_document_attachment_url(doctype, docname):
 
 			# # Check if we're using a local URL
 			if "127.0.0.1" in site_url or "localhost" in site_url:
-				frappe.logger().warning(f"Local URL detected: {site_url}. Using static cloud PDF.")
+				logger.warning("Local URL detected: %s. Using static cloud PDF.", site_url)
 				return "https://clik-pos.k.frappe.cloud/files/REPC-SRET-000001_PDFA3%20(14).pdf"
 
 			return pdf_
@@ -413,8 +416,8 @@ def get_document_attachment_url(doctype, docname):
 
 		# Check if we're using a local URL
 		if "127.0.0.1" in site_url or "localhost" in site_url:
-			frappe.logger().warning(
-				f"Local URL detected: {site_url}. Document sharing may not work with WhatsApp API."
+			logger.warning(
+				"Local URL detected: %s. Document sharing may not work with WhatsApp API.", site_url
 			)
 			return None
 
@@ -1064,30 +1067,13 @@ def test_template_with_parameters(template_name, phone_number, parameters=None):
 
 def generate_and_attach_invoice_pdf(invoice_name, print_format="Standard", lang="en"):
 	"""
-	Generate PDF for a Sales Invoice, attach it, and return full URL
+	Return the full URL of the Sales Invoice PDF attached to the invoice, reusing the pre-rendered file
 	"""
 	pos_profile = get_current_pos_profile()
 	if pos_profile:
-		print_format = pos_profile.custom_pos_printformat
+		print_format = pos_profile.custom_pos_printformat or print_format
 	try:
-		# Generate PDF content
-		pdf_content = frappe.get_print("Sales Invoice", invoice_name, print_format, as_pdf=True)
-
-		# Create File record in /files
-		filedoc = frappe.get_doc(
-			{
-				"doctype": "File",
-				"file_name": f"{invoice_name}.pdf",
-				"attached_to_doctype": "Sales Invoice",
-				"attached_to_name": invoice_name,
-				"content": pdf_content,
-				"is_private": 0,
-			}
-		)
-		filedoc.save(ignore_permissions=True)
-
-		# Return full URL to the file
-		return get_url(filedoc.file_url)
+		return get_invoice_pdf_url(invoice_name, print_format)
 
 	except Exception:
 		frappe.log_error(frappe.get_traceback(), "generate_and_attach_invoice_pdf Failed")
@@ -4,8 +4,11 @@ import frappe
 from frappe.utils import fmt_money, now
 
 from klik_pos.api.whatsap.utils import send_whatsapp_message
+from klik_pos.klik_pos.log import get_logger
 from klik_pos.klik_pos.utils import get_current_pos_profile
 
+logger = get_logger(__name__)
+
 
 def _send_invoice_whatsapp(invoice_name=None, mobile_no=None, message=None, customer_name=None):
 	"""
@@ -76,7 +79,7 @@ def send_invoice_whatsapp(**kwargs):
 	Accepts frontend payload and sends invoice WhatsApp message with PDF attachment.
 	"""
 	data = kwargs
-	print("Invoice WhatsApp data", data)
+	logger.debug("Invoice WhatsApp data: %s", data)
 	mobile = data.get("mobile_no")
 	# customer_name is not used here; message_text may already include name
 	invoice_no = data.get("invoice_data")
@@ -129,7 +132,7 @@ def send_template_whatsapp(**kwargs):
 	Send template WhatsApp message from frontend
 	"""
 	data = kwargs
-	print("Template WhatsApp data", data)
+	logger.debug("Template WhatsApp data: %s", data)
 
 	mobile = data.get("mobile_no")
 	template_name = data.get("template_name")
@@ -50,6 +50,12 @@ fixtures = [
 					"POS Profile-custom_enable_whatsapp",
 					"POS Profile-custom_enable_sms",
 					"POS Profile-custom_scale_barcodes_start_with",
+					"Sales Invoice-custom_payment_entry_status",
+					"Sales Invoice-custom_payment_entry",
+					"Sales Invoice-custom_payment_entry_attempts",
+					"POS Profile-custom_use_pos_invoice",
+					"POS Invoice-custom_pos_opening_entry",
+					"POS Profile-custom_invoice_number_block_size",
 				),
 			]
 		],
@@ -69,17 +75,81 @@ doc_events = {
 	"Sales Invoice": {
 		"validate": [
 			"klik_pos.api.sales_invoice.set_base_roundoff_amount",
-			"klik_pos.api.sales_invoice.set_grand_total_with_roundoff",
 		],
+		"on_update": "klik_pos.api.invoice_summary.update_invoice_summary",
+		"on_submit": [
+			"klik_pos.api.return_ledger.update_return_ledger",
+			"klik_pos.api.invoice_summary.update_invoice_summary",
+			"klik_pos.api.sales_invoice.clear_invoice_details_cache",
+			"klik_pos.api.customer_statistics.update_customer_statistics",
+			"klik_pos.api.invoice_pdf.prerender_invoice_pdf",
+		],
+		"on_cancel": [
+			"klik_pos.api.return_ledger.update_return_ledger",
+			"klik_pos.api.invoice_summary.update_invoice_summary",
+			"klik_pos.api.sales_invoice.clear_invoice_details_cache",
+			"klik_pos.api.customer_statistics.update_customer_statistics",
+		],
+		"on_update_after_submit": "klik_pos.api.invoice_summary.update_invoice_summary",
+		"on_trash": "klik_pos.api.invoice_summary.delete_invoice_summary",
 		# "before_save": [
 		# 	"klik_pos.api.sales_invoice.sync_return_payments_before_save",
 		# ],
 	},
+	"POS Invoice": {
+		"on_update": "klik_pos.api.invoice_summary.update_invoice_summary",
+		"on_submit": [
+			"klik_pos.api.return_ledger.update_return_ledger",
+			"klik_pos.api.invoice_summary.update_invoice_summary",
+			"klik_pos.api.sales_invoice.clear_invoice_details_cache",
+			"klik_pos.api.customer_statistics.update_customer_statistics",
+			"klik_pos.api.invoice_pdf.prerender_invoice_pdf",
+		],
+		"on_cancel": [
+			"klik_pos.api.return_ledger.update_return_ledger",
+			"klik_pos.api.invoice_summary.update_invoice_summary",
+			"klik_pos.api.sales_invoice.clear_invoice_details_cache",
+			"klik_pos.api.customer_statistics.update_customer_statistics",
+		],
+		"on_update_after_submit": "klik_pos.api.invoice_summary.update_invoice_summary",
+		"on_trash": "klik_pos.api.invoice_summary.delete_invoice_summary",
+	},
+	"Payment Entry": {
+		"on_submit": "klik_pos.api.invoice_summary.refresh_payment_invoice_summaries",
+		"on_cancel": "klik_pos.api.invoice_summary.refresh_payment_invoice_summaries",
+	},
 	"POS Opening Entry": {
 		"validate": [
 			"klik_pos.api.pos_entry.validate_opening_entry",
 		],
 	},
+	"POS Closing Entry": {
+		"on_submit": [
+			"klik_pos.api.invoice_numbering.close_invoice_number_blocks",
+			"klik_pos.api.invoice_summary.refresh_closing_entry_invoice_summaries",
+		],
+	},
+	"Sales Taxes and Charges Template": {
+		"on_update": "klik_pos.api.tax.clear_tax_template_cache",
+		"on_trash": "klik_pos.api.tax.clear_tax_template_cache",
+		"after_rename": "klik_pos.api.tax.clear_tax_template_cache",
+	},
+	"Customer": {
+		"on_update": "klik_pos.api.customer_search.update_customer_search_keys",
+		"after_rename": [
+			"klik_pos.api.customer_statistics.rename_customer_statistics",
+			"klik_pos.api.customer_search.rename_customer_search_keys",
+		],
+		"on_trash": "klik_pos.api.customer_search.delete_customer_search_keys",
+	},
+	"Contact": {
+		"on_update": "klik_pos.api.customer_search.update_contact_search_keys",
+		"on_trash": "klik_pos.api.customer_search.update_contact_search_keys",
+	},
+	"Letter Head": {
+		"on_update": "klik_pos.api.escpos.clear_logo_cache",
+		"on_trash": "klik_pos.api.escpos.clear_logo_cache",
+	},
 }
 
 override_doctype_class = {
@@ -88,6 +158,7 @@ override_doctype_class = {
 
 # Migration hooks
 before_migrate = ["klik_pos.setup.pos_opening_entry_links.ensure_pos_opening_entry_links"]
+after_migrate = ["klik_pos.setup.indexes.ensure_pos_indexes"]
 # Includes in <head>
 # ------------------
 
@@ -217,6 +288,15 @@ doctype_js.update({"Company": "public/js/company.js"})
 # Scheduled Tasks
 # ---------------
 
+scheduler_events = {
+	"all": [
+		"klik_pos.api.sales_invoice.retry_queued_payment_entries",
+	],
+	"hourly": [
+		"klik_pos.api.invoice_summary.sync_invoice_summary_statuses",
+	],
+}
+
 # scheduler_events = {
 # 	"all": [
 # 		"klik_pos.tasks.all"
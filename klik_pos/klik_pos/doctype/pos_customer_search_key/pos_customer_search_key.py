@@ -0,0 +1,16 @@
+# Copyright (c) 2025, Beveren Sooftware Inc and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class POSCustomerSearchKey(Document):
+	pass
+
+
+def on_doctype_update():
+	# Customer search is a prefix range scan on (key_type, search_key)
+	frappe.db.add_index("POS Customer Search Key", ["key_type", "search_key"])
+	frappe.db.add_index("POS Customer Search Key", ["customer"])
+	frappe.db.add_index("POS Customer Search Key", ["contact"])
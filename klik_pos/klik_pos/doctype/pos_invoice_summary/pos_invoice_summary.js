@@ -0,0 +1,8 @@
+// Copyright (c) 2025, Beveren Sooftware Inc and contributors
+// For license information, please see license.txt
+
+// frappe.ui.form.on("POS Invoice Summary", {
+// 	refresh(frm) {
+
+// 	},
+// });
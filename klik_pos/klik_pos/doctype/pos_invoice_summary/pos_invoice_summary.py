@@ -0,0 +1,19 @@
+# Copyright (c) 2025, Beveren Sooftware Inc and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class POSInvoiceSummary(Document):
+	pass
+
+
+def on_doctype_update():
+	# Invoice history pages newest-first within a shift, a profile or a customer
+	frappe.db.add_index("POS Invoice Summary", ["pos_opening_entry", "invoice_modified"])
+	frappe.db.add_index("POS Invoice Summary", ["pos_profile", "posting_date"])
+	frappe.db.add_index("POS Invoice Summary", ["customer", "posting_date"])
+	frappe.db.add_index("POS Invoice Summary", ["invoice_modified", "invoice"])
+	# Status sync looks up open invoices only
+	frappe.db.add_index("POS Invoice Summary", ["status", "invoice_doctype"])
@@ -0,0 +1,9 @@
+# Copyright (c) 2025, Beveren Sooftware Inc and Contributors
+# See license.txt
+
+# import frappe
+from frappe.tests.utils import FrappeTestCase
+
+
+class TestPOSInvoiceSummary(FrappeTestCase):
+	pass
@@ -0,0 +1,8 @@
+// Copyright (c) 2025, Beveren Sooftware Inc and contributors
+// For license information, please see license.txt
+
+// frappe.ui.form.on("POS Return Ledger", {
+// 	refresh(frm) {
+
+// 	},
+// });
@@ -0,0 +1,14 @@
+# Copyright (c) 2025, Beveren Sooftware Inc and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class POSReturnLedger(Document):
+	pass
+
+
+def on_doctype_update():
+	# One row per original invoice and item; the return hooks upsert against this key
+	frappe.db.add_unique("POS Return Ledger", ["invoice", "item_code"], constraint_name="unique_invoice_item")
@@ -0,0 +1,162 @@
+"""
+KLiK PoS logger for hot API paths.
+
+Routine diagnostics go to the `klik_pos` log file, never to Error Log. Each module
+gets its own level, DEBUG/INFO records can be sampled, and records are handed to a
+background thread through a queue so a request never waits on file I/O.
+
+Site config (all optional):
+
+	"klik_pos_log_level": "WARNING",
+	"klik_pos_log_levels": {"sales_invoice": "DEBUG", "customer": "INFO"},
+	"klik_pos_log_sample_rates": {"customer": 0.05}
+
+Module keys are the last part of the module path (`klik_pos.api.customer` -> `customer`).
+"""
+
+import atexit
+import logging
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
+
+import frappe
+
+DEFAULT_LEVEL = logging.WARNING
+QUEUE_SIZE = 10_000
+
+_loggers = {}
+_handler = None
+_listener = None
+
+
+class KlikLogger:
+	"""Thin wrapper over a stdlib logger that applies per-module level and sampling first."""
+
+	__slots__ = ("_logger", "module")
+
+	def __init__(self, module):
+		self.module = module
+		self._logger = logging.getLogger(f"klik_pos.{module}")
+		self._logger.setLevel(logging.DEBUG)
+		self._logger.propagate = False
+		if not self._logger.handlers:
+			self._logger.addHandler(_get_queue_handler())
+
+	def is_enabled_for(self, level):
+		return level >= _get_module_level(self.module)
+
+	def debug(self, msg, *args, **kwargs):
+		self._log(logging.DEBUG, msg, args, **kwargs)
+
+	def info(self, msg, *args, **kwargs):
+		self._log(logging.INFO, msg, args, **kwargs)
+
+	def warning(self, msg, *args, **kwargs):
+		self._log(logging.WARNING, msg, args, **kwargs)
+
+	def error(self, msg, *args, **kwargs):
+		self._log(logging.ERROR, msg, args, **kwargs)
+
+	def exception(self, msg, *args, **kwargs):
+		kwargs.setdefault("exc_info", True)
+		self._log(logging.ERROR, msg, args, **kwargs)
+
+	def _log(self, level, msg, args, exc_info=None, **kwargs):
+		if not self.is_enabled_for(level):
+			return
+
+		# Warnings and errors are never sampled away
+		if level < logging.WARNING:
+			rate = _get_sample_rate(self.module)
+			if rate < 1 and random.random() >= rate:
+				return
+
+		extra = kwargs.pop("extra", None) or {}
+		extra.setdefault("site", getattr(frappe.local, "site", None))
+		self._logger.log(level, msg, *args, exc_info=exc_info, extra=extra, **kwargs)
+
+
+def get_logger(module):
+	"""Return the KLiK logger for a module path or short name, e.g. get_logger(__name__)."""
+	module = module.rsplit(".", 1)[-1]
+	logger = _loggers.get(module)
+	if logger is None:
+		logger = _loggers[module] = KlikLogger(module)
+	return logger
+
+
+def flush():
+	"""Write out every queued record, e.g. before a worker exits or in tests."""
+	if _listener and _listener._thread:
+		_listener.stop()
+		_listener.start()
+
+
+def _stop():
+	if _listener and _listener._thread:
+		_listener.stop()
+
+
+class _SiteFileHandler(logging.Handler):
+	"""Runs on the listener thread: writes each record to the site's klik_pos log file."""
+
+	def __init__(self):
+		super().__init__()
+		self._site_loggers = {}
+
+	def emit(self, record):
+		site = getattr(record, "site", None) or False
+		target = self._site_loggers.get(site)
+		if target is None:
+			target = self._site_loggers[site] = frappe.logger("klik_pos", allow_site=site)
+		for handler in target.handlers:
+			if record.levelno >= handler.level:
+				handler.handle(record)
+
+
+def _get_queue_handler():
+	global _handler, _listener
+	if _handler is None:
+		records = queue.Queue(QUEUE_SIZE)
+		_handler = _DroppingQueueHandler(records)
+		_listener = QueueListener(records, _SiteFileHandler())
+		_listener.start()
+	return _handler
+
+
+class _DroppingQueueHandler(QueueHandler):
+	"""Drop records instead of blocking the request when the writer falls behind."""
+
+	def enqueue(self, record):
+		try:
+			self.queue.put_nowait(record)
+		except queue.Full:
+			pass
+
+
+def _get_module_level(module):
+	conf = _get_conf()
+	level = (conf.get("klik_pos_log_levels") or {}).get(module) or conf.get("klik_pos_log_level")
+	if not level:
+		return DEFAULT_LEVEL
+	if isinstance(level, int):
+		return level
+
+	level = logging.getLevelName(str(level).upper())
+	return level if isinstance(level, int) else DEFAULT_LEVEL
+
+
+def _get_sample_rate(module):
+	rates = _get_conf().get("klik_pos_log_sample_rates") or {}
+	try:
+		return float(rates.get(module, 1))
+	except (TypeError, ValueError):
+		return 1.0
+
+
+def _get_conf():
+	return getattr(frappe.local, "conf", None) or {}
+
+
+atexit.register(_stop)
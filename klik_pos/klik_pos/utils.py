@@ -12,3 +12,23 @@ def get_current_pos_profile():
 def get_user_default_company():
 	user = frappe.session.user
 	return frappe.defaults.get_user_default(user, "Company")
+
+
+def get_klik_invoice_doctypes():
+	"""
+	Doctypes KLiK records sales in: always Sales Invoice, plus POS Invoice once
+	any POS Profile records sales as POS Invoices.
+	"""
+	doctypes = ["Sales Invoice"]
+	if frappe.get_meta("POS Profile").has_field("custom_use_pos_invoice") and frappe.db.exists(
+		"POS Profile", {"custom_use_pos_invoice": 1}
+	):
+		doctypes.append("POS Invoice")
+	return doctypes
+
+
+def get_invoice_doctype(invoice_name):
+	"""Return "POS Invoice" for sales recorded in POS Invoice mode, otherwise "Sales Invoice"."""
+	if invoice_name and frappe.db.exists("POS Invoice", invoice_name):
+		return "POS Invoice"
+	return "Sales Invoice"
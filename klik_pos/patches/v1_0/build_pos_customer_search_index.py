@@ -0,0 +1,5 @@
+from klik_pos.api.customer_search import build_customer_search_index
+
+
+def execute():
+	build_customer_search_index()
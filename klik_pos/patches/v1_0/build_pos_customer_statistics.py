@@ -0,0 +1,5 @@
+from klik_pos.api.customer_statistics import build_customer_statistics
+
+
+def execute():
+	build_customer_statistics()
@@ -0,0 +1,5 @@
+from klik_pos.api.invoice_summary import build_all_invoice_summaries
+
+
+def execute():
+	build_all_invoice_summaries()
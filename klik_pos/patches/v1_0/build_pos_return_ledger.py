@@ -0,0 +1,5 @@
+from klik_pos.api.return_ledger import build_return_ledger
+
+
+def execute():
+	build_return_ledger()
@@ -0,0 +1,300 @@
+"""
+Managed database indexes for the POS endpoints.
+
+POS_INDEXES declares every index KLiK PoS relies on, together with a sample of the
+query it serves. `ensure_pos_indexes` runs after each migrate and creates what is
+missing; it is safe to run any number of times. `get_index_report` lists drift
+(missing indexes, indexes with other columns, leftovers of the old manual script)
+and EXPLAINs each sample query to confirm the optimizer picks the index.
+"""
+
+import frappe
+from frappe.utils import cint
+
+from klik_pos.klik_pos.log import get_logger
+
+logger = get_logger(__name__)
+
+POS_INDEXES = (
+	# Invoice history, closing entry and summary backfill: invoices of one shift
+	{
+		"doctype": "Sales Invoice",
+		"index_name": "klik_pos_opening_entry_index",
+		"columns": ("custom_pos_opening_entry", "docstatus", "modified"),
+		"query": "SELECT name FROM `tabSales Invoice` WHERE custom_pos_opening_entry = 'x' AND docstatus = 1 "
+		"ORDER BY modified DESC",
+	},
+	# Closing entry: POS Invoices of one shift still to be consolidated
+	{
+		"doctype": "POS Invoice",
+		"index_name": "klik_pos_opening_entry_index",
+		"columns": ("custom_pos_opening_entry", "docstatus", "status"),
+		"query": "SELECT name FROM `tabPOS Invoice` WHERE custom_pos_opening_entry = 'x' AND docstatus = 1 "
+		"AND status NOT IN ('Consolidated', 'Cancelled')",
+	},
+	# Closing reconciliation: a profile's submitted sales of the day
+	{
+		"doctype": "Sales Invoice",
+		"index_name": "klik_pos_profile_posting_index",
+		"columns": ("pos_profile", "docstatus", "posting_date"),
+		"query": "SELECT name FROM `tabSales Invoice` WHERE pos_profile = 'x' AND docstatus = 1 "
+		"AND posting_date = '2025-01-01'",
+	},
+	# Return picker and customer return dialog: a customer's original invoices since a date
+	{
+		"doctype": "Sales Invoice",
+		"index_name": "klik_return_eligibility_index",
+		"columns": ("customer", "is_return", "docstatus", "posting_date"),
+		"query": "SELECT name FROM `tabSales Invoice` WHERE customer = 'x' AND is_return = 0 "
+		"AND docstatus = 1 AND posting_date >= '2025-01-01'",
+	},
+	# Return ledger backfill and invoice details: returns made against an invoice
+	{
+		"doctype": "Sales Invoice",
+		"index_name": "klik_return_against_index",
+		"columns": ("return_against", "is_return", "docstatus"),
+		"query": "SELECT name FROM `tabSales Invoice` WHERE return_against = 'x' AND is_return = 1 "
+		"AND docstatus = 1",
+	},
+	# Deferred Payment Entry retries: the few invoices still waiting for one
+	{
+		"doctype": "Sales Invoice",
+		"index_name": "klik_payment_entry_status_index",
+		"columns": ("custom_payment_entry_status", "docstatus"),
+		"query": "SELECT name FROM `tabSales Invoice` WHERE custom_payment_entry_status = 'Queued' "
+		"AND docstatus = 1",
+	},
+	{
+		"doctype": "Sales Invoice Item",
+		"index_name": "klik_parent_item_code_index",
+		"columns": ("parent", "item_code"),
+		"query": "SELECT qty FROM `tabSales Invoice Item` WHERE parent = 'x' AND item_code = 'y'",
+	},
+	# Closing reconciliation groups payments of many invoices by mode of payment
+	{
+		"doctype": "Sales Invoice Payment",
+		"index_name": "klik_parent_mode_of_payment_index",
+		"columns": ("parent", "parenttype", "mode_of_payment"),
+		"query": "SELECT mode_of_payment, amount FROM `tabSales Invoice Payment` WHERE parent = 'x' "
+		"AND parenttype = 'Sales Invoice'",
+	},
+	# Item grid with "hide unavailable items": stock of one warehouse
+	{
+		"doctype": "Bin",
+		"index_name": "klik_warehouse_actual_qty_index",
+		"columns": ("warehouse", "actual_qty"),
+		"query": "SELECT item_code FROM `tabBin` WHERE warehouse = 'x' AND actual_qty > 0",
+	},
+	{
+		"doctype": "Item Price",
+		"index_name": "klik_item_price_list_index",
+		"columns": ("item_code", "price_list", "selling", "uom"),
+		"query": "SELECT price_list_rate FROM `tabItem Price` WHERE item_code = 'x' AND price_list = 'y' "
+		"AND selling = 1",
+	},
+	{
+		"doctype": "Batch",
+		"index_name": "klik_batch_item_index",
+		"columns": ("item", "expiry_date"),
+		"query": "SELECT name, batch_id FROM `tabBatch` WHERE item = 'x'",
+	},
+	{
+		"doctype": "Serial No",
+		"index_name": "klik_serial_item_warehouse_index",
+		"columns": ("item_code", "warehouse", "status"),
+		"query": "SELECT name FROM `tabSerial No` WHERE item_code = 'x' AND warehouse = 'y' "
+		"AND status = 'Active'",
+	},
+	# Customer search and invoice details: contacts and addresses linked to a customer
+	{
+		"doctype": "Dynamic Link",
+		"index_name": "klik_dynamic_link_index",
+		"columns": ("link_doctype", "link_name", "parenttype"),
+		"query": "SELECT parent FROM `tabDynamic Link` WHERE link_doctype = 'Customer' AND link_name = 'x' "
+		"AND parenttype = 'Contact'",
+	},
+	{
+		"doctype": "Contact Email",
+		"index_name": "klik_email_id_index",
+		"columns": ("email_id", "parent"),
+		"query": "SELECT parent FROM `tabContact Email` WHERE email_id = 'x'",
+	},
+	{
+		"doctype": "Contact Phone",
+		"index_name": "klik_phone_index",
+		"columns": ("phone", "parent"),
+		"query": "SELECT parent FROM `tabContact Phone` WHERE phone = 'x'",
+	},
+	# Customer delta sync: customers whose primary contact or address changed
+	{
+		"doctype": "Customer",
+		"index_name": "klik_primary_contact_index",
+		"columns": ("customer_primary_contact",),
+		"query": "SELECT name FROM `tabCustomer` WHERE customer_primary_contact = 'x'",
+	},
+	{
+		"doctype": "Customer",
+		"index_name": "klik_primary_address_index",
+		"columns": ("customer_primary_address",),
+		"query": "SELECT name FROM `tabCustomer` WHERE customer_primary_address = 'x'",
+	},
+	{
+		"doctype": "Deleted Document",
+		"index_name": "klik_deleted_doctype_index",
+		"columns": ("deleted_doctype", "creation"),
+		"query": "SELECT deleted_name FROM `tabDeleted Document` WHERE deleted_doctype = 'Customer' "
+		"AND creation >= '2025-01-01'",
+	},
+	# Customer list and permission checks: semi-join on a user's permitted customers
+	{
+		"doctype": "User Permission",
+		"index_name": "klik_user_allow_value_index",
+		"columns": ("user", "allow", "for_value"),
+		"query": "SELECT for_value FROM `tabUser Permission` WHERE user = 'x' AND allow = 'Customer'",
+	},
+	# WhatsApp webhook status updates look chats up by the provider's message id
+	{
+		"doctype": "WhatsApp Chat",
+		"index_name": "klik_message_id_index",
+		"columns": ("message_id",),
+		"query": "SELECT name FROM `tabWhatsApp Chat` WHERE message_id = 'x'",
+	},
+	{
+		"doctype": "WhatsApp Chat",
+		"index_name": "klik_reference_index",
+		"columns": ("reference_doctype", "reference_name"),
+		"query": "SELECT name FROM `tabWhatsApp Chat` WHERE reference_doctype = 'Sales Invoice' "
+		"AND reference_name = 'x'",
+	},
+)
+
+# Created by the old optimize_invoice_performance.py script or earlier releases; dropped on migrate
+LEGACY_INDEXES = {
+	"idx_sales_invoice_pos_opening_entry": "Sales Invoice",
+	"idx_sales_invoice_pos_composite": "Sales Invoice",
+	"idx_sales_invoice_posting_date": "Sales Invoice",
+	"idx_sales_invoice_customer": "Sales Invoice",
+	"idx_sales_invoice_return_against": "Sales Invoice",
+	"idx_sales_invoice_payment_parent": "Sales Invoice Payment",
+	"idx_sales_invoice_item_parent": "Sales Invoice Item",
+	# Duplicates of ERPNext's own unique keys on Item Barcode.barcode and Serial No.serial_no
+	"klik_barcode_index": "Item Barcode",
+	"klik_serial_no_index": "Serial No",
+}
+
+
+def ensure_pos_indexes():
+	"""after_migrate hook: create missing managed indexes and drop the legacy ones."""
+	for spec in POS_INDEXES:
+		state = _get_index_state(spec)
+		if state == "ok":
+			continue
+		if state == "skipped":
+			logger.info("Skipping index %s: %s is not installed", spec["index_name"], spec["doctype"])
+			continue
+
+		if state == "mismatch":
+			_drop_index(spec["doctype"], spec["index_name"])
+
+		frappe.db.add_index(spec["doctype"], list(spec["columns"]), index_name=spec["index_name"])
+		logger.info("Created index %s on %s", spec["index_name"], spec["doctype"])
+
+	for index_name, doctype in LEGACY_INDEXES.items():
+		if _get_table_indexes(doctype).get(index_name):
+			_drop_index(doctype, index_name)
+			logger.info("Dropped legacy index %s on %s", index_name, doctype)
+
+
+@frappe.whitelist()
+def get_index_report(verify=True):
+	"""Drift and EXPLAIN verification of the managed indexes (System Manager only)."""
+	try:
+		frappe.only_for("System Manager")
+		return {
+			"success": True,
+			"data": get_index_drift(),
+			"plans": verify_index_usage() if cint(verify) else [],
+		}
+	except Exception as e:
+		frappe.log_error(frappe.get_traceback(), "Index Report Error")
+		return {"success": False, "error": str(e)}
+
+
+def get_index_drift():
+	"""Managed indexes that are missing or differ from their declaration, and legacy leftovers."""
+	drift = []
+	for spec in POS_INDEXES:
+		state = _get_index_state(spec)
+		if state not in ("ok", "skipped"):
+			drift.append(
+				{
+					"doctype": spec["doctype"],
+					"index_name": spec["index_name"],
+					"state": state,
+					"expected": list(spec["columns"]),
+					"actual": _get_table_indexes(spec["doctype"]).get(spec["index_name"]),
+				}
+			)
+
+	for index_name, doctype in LEGACY_INDEXES.items():
+		if _get_table_indexes(doctype).get(index_name):
+			drift.append({"doctype": doctype, "index_name": index_name, "state": "legacy"})
+
+	return drift
+
+
+def verify_index_usage():
+	"""EXPLAIN each sample query and report whether the optimizer chose its managed index."""
+	plans = []
+	for spec in POS_INDEXES:
+		if _get_index_state(spec) == "skipped":
+			continue
+
+		rows = frappe.db.sql(f"EXPLAIN {spec['query']}", as_dict=True)
+		row = rows[0] if rows else {}
+		possible_keys = (row.get("possible_keys") or "").split(",")
+		if row.get("key") == spec["index_name"]:
+			status = "used"
+		elif spec["index_name"] in possible_keys:
+			# Tiny or empty tables can make a scan cheaper; the index is still a candidate
+			status = "possible"
+		else:
+			status = "not_used"
+
+		plans.append(
+			{
+				"doctype": spec["doctype"],
+				"index_name": spec["index_name"],
+				"status": status,
+				"key": row.get("key"),
+				"rows": row.get("rows"),
+			}
+		)
+	return plans
+
+
+def _get_index_state(spec):
+	if not frappe.db.table_exists(spec["doctype"]):
+		return "skipped"
+	if not all(frappe.db.has_column(spec["doctype"], column) for column in spec["columns"]):
+		return "skipped"
+
+	columns = _get_table_indexes(spec["doctype"]).get(spec["index_name"])
+	if columns is None:
+		return "missing"
+	return "ok" if columns == list(spec["columns"]) else "mismatch"
+
+
+def _get_table_indexes(doctype):
+	"""{index name: [columns in order]} for a doctype's table."""
+	indexes = {}
+	if not frappe.db.table_exists(doctype):
+		return indexes
+
+	for row in frappe.db.sql(f"SHOW INDEX FROM `tab{doctype}`", as_dict=True):
+		indexes.setdefault(row.Key_name, []).append((row.Seq_in_index, row.Column_name))
+	return {name: [column for _seq, column in sorted(columns)] for name, columns in indexes.items()}
+
+
+def _drop_index(doctype, index_name):
+	frappe.db.sql_ddl(f"ALTER TABLE `tab{doctype}` DROP INDEX `{index_name}`")
@@ -0,0 +1,94 @@
+"""
+Query-plan assertions for endpoint tests.
+
+`capture_queries` records every SELECT an endpoint sends through frappe.db.sql.
+`check_plans` runs EXPLAIN on each one and returns the statements that read more
+rows than their budget or scan a table without an index.
+"""
+
+import re
+from contextlib import contextmanager
+from functools import wraps
+
+import frappe
+
+# Framework metadata reads that every request makes; not the endpoint's own SQL
+IGNORED_TABLES = (
+	"tabSingles",
+	"tabDefaultValue",
+	"tabDocType",
+	"tabDocField",
+	"tabDocPerm",
+	"tabCustom DocPerm",
+	"tabCustom Field",
+	"tabProperty Setter",
+	"tabHas Role",
+	"tabRole",
+	"tabUser",
+	"tabUser Permission",
+	"tabSeries",
+	"tabError Log",
+	"__UserSettings",
+)
+
+# EXPLAIN access types that read the whole table or the whole index
+SCAN_TYPES = ("ALL", "index")
+
+_FROM_TABLES = re.compile(r"`(tab[^`]+|__[^`]+)`")
+
+
+@contextmanager
+def capture_queries():
+	"""Collect (query, values) of the SELECTs run inside the block."""
+	statements = []
+	db_sql = frappe.db.sql
+
+	@wraps(db_sql)
+	def capturing_sql(query, values=(), *args, **kwargs):
+		text = str(query).strip()
+		if text[:6].upper() == "SELECT" and not _is_ignored(text):
+			statements.append((text, values))
+		return db_sql(query, values, *args, **kwargs)
+
+	frappe.db.sql = capturing_sql
+	try:
+		yield statements
+	finally:
+		# Drop the instance attribute so the class method is used again
+		frappe.db.__dict__.pop("sql", None)
+
+
+def explain(query, values=()):
+	return frappe.db.sql(f"EXPLAIN {query}", values, as_dict=True)
+
+
+def check_plans(statements, row_budget, allow_scan=()):
+	"""
+	Problems found in the plans of `statements`, one string each (empty when all pass).
+	`allow_scan` names tables or aliases that may be scanned, e.g. a contains-search.
+	"""
+	problems = []
+	for query, values in statements:
+		for row in explain(query, values):
+			table = row.get("table") or ""
+			if not table or table.startswith("<"):
+				# Derived tables and unions are checked through their own rows
+				continue
+			if table in allow_scan or f"tab{table}" in allow_scan:
+				continue
+
+			rows = row.get("rows") or 0
+			if row.get("type") in SCAN_TYPES and rows > row_budget:
+				problems.append(
+					f"{table}: {row.get('type')} scan of {rows} rows without an index in {query!r}"
+				)
+			elif rows > row_budget:
+				problems.append(
+					f"{table}: {rows} rows over budget {row_budget} using {row.get('key')} in {query!r}"
+				)
+	return problems
+
+
+def _is_ignored(query):
+	tables = _FROM_TABLES.findall(query)
+	return bool(tables) and all(table in IGNORED_TABLES for table in tables)
@@ -3,7 +3,12 @@ from unittest.mock import MagicMock, patch
 import frappe
 from frappe.tests.utils import FrappeTestCase
 
-from klik_pos.api.customer import check_customer_permission, get_customers
+from klik_pos.api.customer import (
+	check_customer_permission,
+	get_customer_list_conditions,
+	get_customers,
+	has_customer_user_permissions,
+)
 
 
 class TestCustomerAPI(FrappeTestCase):
@@ -12,19 +17,15 @@ class TestCustomerAPI(FrappeTestCase):
 	def setUp(self):
 		super().setUp()
 
-	@patch("klik_pos.api.customer.get_customer_statistics")
-	@patch("frappe.db.get_value")
-	@patch("frappe.get_doc")
+	@patch("klik_pos.api.customer.get_customer_statistics_map")
 	@patch("klik_pos.api.customer.get_current_pos_profile")
 	@patch("klik_pos.api.customer.get_user_company_and_currency")
-	@patch("frappe.permissions.get_user_permissions")
+	@patch("klik_pos.api.customer.has_customer_user_permissions")
 	def test_get_customers_basic_functionality(
 		self,
 		mock_user_permissions,
 		mock_company_currency,
 		mock_pos_profile,
-		mock_get_doc,
-		mock_db_get_value,
 		mock_get_stats,
 	):
 		"""Test basic functionality of get_customers function"""
@@ -34,64 +35,74 @@ class TestCustomerAPI(FrappeTestCase):
 		mock_company_currency.return_value = ("Test Company", "USD")
 
 		# Mock user permissions (no specific customer permissions)
-		mock_user_permissions.return_value = {}
-
-		from types import SimpleNamespace
-
-		with patch("frappe.get_all") as mock_get_all:
-			mock_get_all.return_value = [
-				SimpleNamespace(name="CUST-001"),
-				SimpleNamespace(name="CUST-002"),
-			]
-
-			# Mock frappe.get_doc to return full Customer docs for each name
-			doc1 = MagicMock()
-			doc1.name = "CUST-001"
-			doc1.customer_name = "Test Customer 1"
-			doc1.customer_type = "Individual"
-			doc1.customer_group = "All Customer Groups"
-			doc1.territory = "All Territories"
-			doc1.default_currency = "USD"
-			doc1.customer_primary_contact = None
-			doc1.customer_primary_address = None
-
-			doc2 = MagicMock()
-			doc2.name = "CUST-002"
-			doc2.customer_name = "Test Customer 2"
-			doc2.customer_type = "Individual"
-			doc2.customer_group = "All Customer Groups"
-			doc2.territory = "All Territories"
-			doc2.default_currency = "USD"
-			doc2.customer_primary_contact = None
-			doc2.customer_primary_address = None
-
-			mock_get_doc.side_effect = [doc1, doc2]
-
-			mock_db_get_value.return_value = None
-
-			mock_get_stats.return_value = {"success": True, "data": {}}
-
+		mock_user_permissions.return_value = False
+
+		customers = [
+			frappe._dict(
+				name="CUST-001",
+				customer_name="Test Customer 1",
+				customer_type="Individual",
+				customer_group="All Customer Groups",
+				territory="All Territories",
+				default_currency="USD",
+				customer_primary_contact="CONT-001",
+				customer_primary_address=None,
+			),
+			frappe._dict(
+				name="CUST-002",
+				customer_name="Test Customer 2",
+				customer_type="Individual",
+				customer_group="All Customer Groups",
+				territory="All Territories",
+				default_currency="USD",
+				customer_primary_contact=None,
+				customer_primary_address=None,
+			),
+		]
+		contacts = [frappe._dict(name="CONT-001", first_name="Test", email_id="test@example.com")]
+
+		def get_all(doctype, *args, **kwargs):
+			return {"Contact": contacts}.get(doctype, [])
+
+		mock_get_stats.return_value = {
+			"CUST-001": {"total_orders": 3, "total_spent": 150, "last_visit": None}
+		}
+
+		with (
+			patch("frappe.get_all", side_effect=get_all) as mock_get_all,
+			patch("frappe.db.sql", side_effect=[customers, [frappe._dict(total=2)]]) as mock_sql,
+		):
 			result = get_customers(limit=10, start=0, search="")
 
-			self.assertTrue(result["success"])
-			self.assertEqual(len(result["data"]), 2)
-			self.assertEqual(result["data"][0]["name"], "CUST-001")
-			self.assertEqual(result["data"][0]["customer_name"], "Test Customer 1")
-			self.assertIn(result["data"][0]["customer_type"], ["individual", "Individual"])
-
-			mock_pos_profile.assert_called_once()
-			mock_company_currency.assert_called_once()
-			mock_user_permissions.assert_called_once()
+		self.assertTrue(result["success"])
+		self.assertEqual(len(result["data"]), 2)
+		self.assertEqual(result["data"][0]["name"], "CUST-001")
+		self.assertEqual(result["data"][0]["customer_name"], "Test Customer 1")
+		self.assertIn(result["data"][0]["customer_type"], ["individual", "Individual"])
+		self.assertEqual(result["data"][0]["contact"]["email_id"], "test@example.com")
+		self.assertEqual(result["data"][0]["custom_total_orders"], 3)
+		self.assertEqual(result["data"][1]["custom_total_orders"], 0)
+		self.assertIsNone(result["data"][1]["contact"])
+
+		# One batched lookup per detail, not one per customer
+		self.assertEqual(result["total_count"], 2)
+		self.assertEqual([c.args[0] for c in mock_get_all.call_args_list], ["Contact"])
+		# Page and count only; no permitted-customer list is sent along
+		self.assertEqual(mock_sql.call_count, 2)
+		mock_get_stats.assert_called_once_with(["CUST-001", "CUST-002"])
+		mock_pos_profile.assert_called_once()
+		mock_company_currency.assert_called_once()
+		mock_user_permissions.assert_called_once()
 
 	@patch("klik_pos.api.customer.get_current_pos_profile")
-	@patch("frappe.permissions.get_user_permissions")
+	@patch("klik_pos.api.customer.has_customer_user_permissions")
 	def test_check_customer_permission_b2c_individual(self, mock_user_permissions, mock_pos_profile):
 		"""Test check_customer_permission for B2C business type with Individual customer"""
 
 		# Mock POS profile for B2C
 		mock_pos_profile.return_value = MagicMock(custom_business_type="B2C", customer_groups=[])
 
-		mock_user_permissions.return_value = {}
+		mock_user_permissions.return_value = False
 
 		mock_customer = MagicMock()
 		mock_customer.customer_type = "Individual"
@@ -114,7 +125,7 @@ class TestCustomerAPI(FrappeTestCase):
 			mock_get_doc.assert_called_once_with("Customer", "CUST-001")
 
 	@patch("klik_pos.api.customer.get_current_pos_profile")
-	@patch("frappe.permissions.get_user_permissions")
+	@patch("klik_pos.api.customer.has_customer_user_permissions")
 	def test_check_customer_permission_b2c_company_denied(self, mock_user_permissions, mock_pos_profile):
 		"""Test check_customer_permission for B2C business type with Company customer (should be denied)"""
 
@@ -122,7 +133,7 @@ class TestCustomerAPI(FrappeTestCase):
 		mock_pos_profile.return_value = MagicMock(custom_business_type="B2C", customer_groups=[])
 
 		# Mock user permissions (no specific customer permissions)
-		mock_user_permissions.return_value = {}
+		mock_user_permissions.return_value = False
 
 		mock_customer = MagicMock()
 		mock_customer.customer_type = "Company"
@@ -145,15 +156,17 @@ class TestCustomerAPI(FrappeTestCase):
 			mock_get_doc.assert_called_once_with("Customer", "CUST-COMPANY-001")
 
 	@patch("klik_pos.api.customer.get_current_pos_profile")
-	@patch("frappe.permissions.get_user_permissions")
+	@patch("klik_pos.api.customer.has_customer_user_permissions")
 	def test_check_customer_permission_user_permissions_denied(self, mock_user_permissions, mock_pos_profile):
 		"""Test check_customer_permission when user doesn't have permission to specific customer"""
 
 		mock_pos_profile.return_value = MagicMock(custom_business_type="B2C", customer_groups=[])
 
-		mock_user_permissions.return_value = {"Customer": [{"doc": "CUST-001"}]}
+		# Restricted by User Permissions, and CUST-002 is not among the permitted customers
+		mock_user_permissions.return_value = True
 
-		result = check_customer_permission("CUST-002")
+		with patch("frappe.db.exists", return_value=None), patch("frappe.db.count", return_value=1):
+			result = check_customer_permission("CUST-002")
 
 		# Assertions
 		self.assertTrue(result["success"])
@@ -185,3 +198,35 @@ class TestCustomerAPI(FrappeTestCase):
 			# Verify mock calls
 			mock_pos_profile.assert_called_once()
 			mock_get_doc.assert_called_once_with("Customer", "NON-EXISTENT")
+
+	def test_user_permission_semi_join(self):
+		"""Permitted customers are filtered in SQL with a constant-size condition"""
+		customer = frappe.get_doc(
+			{
+				"doctype": "Customer",
+				"customer_name": "_Test Permitted Customer",
+				"customer_type": "Individual",
+				"customer_group": "All Customer Groups",
+				"territory": "All Territories",
+			}
+		).insert(ignore_permissions=True)
+
+		user = "test@example.com"
+		for permitted_user in (user, "Administrator"):
+			frappe.get_doc(
+				{
+					"doctype": "User Permission",
+					"user": permitted_user,
+					"allow": "Customer",
+					"for_value": customer.name,
+				}
+			).insert(ignore_permissions=True)
+
+		conditions, params = get_customer_list_conditions(None, [], user=user)
+		names = frappe.db.sql_list(f"SELECT c.name FROM `tabCustomer` c WHERE {conditions}", params)
+		self.assertEqual(names, [customer.name])
+		self.assertEqual(params, [user])
+
+		# User Permissions never restrict Administrator
+		self.assertFalse(has_customer_user_permissions("Administrator"))
+		self.assertEqual(get_customer_list_conditions(None, [], user="Administrator"), ("1 = 1", []))
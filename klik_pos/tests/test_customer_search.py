@@ -0,0 +1,92 @@
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from klik_pos.api.customer_search import (
+	SEARCH_KEY_DOCTYPE,
+	get_search_condition,
+	normalize_phone,
+)
+
+CUSTOMER_NAME = "_Test Search Customer Fatima"
+
+
+class TestCustomerSearchIndex(FrappeTestCase):
+	@classmethod
+	def setUpClass(cls):
+		super().setUpClass()
+		customer = frappe.get_doc(
+			{
+				"doctype": "Customer",
+				"customer_name": CUSTOMER_NAME,
+				"customer_type": "Individual",
+				"customer_group": "All Customer Groups",
+				"territory": "All Territories",
+			}
+		).insert(ignore_permissions=True)
+		cls.customer = customer.name
+
+		contact = frappe.get_doc({"doctype": "Contact", "first_name": "Fatima"})
+		contact.append("phone_nos", {"phone": "+966 55 123 4567", "is_primary_mobile_no": 1})
+		contact.append("email_ids", {"email_id": "Fatima.Search@Example.com", "is_primary": 1})
+		contact.append("links", {"link_doctype": "Customer", "link_name": customer.name})
+		cls.contact = contact.insert(ignore_permissions=True).name
+
+	def search(self, term):
+		condition, params = get_search_condition(term)
+		return {row[0] for row in frappe.db.sql(condition, params)}
+
+	def test_normalize_phone(self):
+		self.assertEqual(normalize_phone("+966 (55) 123-4567"), "765432155669")
+		self.assertEqual(normalize_phone("0551234567"), "765432155")
+
+	def test_contact_keys_are_indexed(self):
+		keys = frappe.get_all(
+			SEARCH_KEY_DOCTYPE,
+			filters={"customer": self.customer},
+			fields=["key_type", "search_key"],
+		)
+		self.assertIn(("phone", "765432155669"), {(k.key_type, k.search_key) for k in keys})
+		self.assertIn(("email", "fatima.search@example.com"), {(k.key_type, k.search_key) for k in keys})
+
+	def test_search_by_phone_suffix_email_and_name(self):
+		# Local number with trunk zero finds the international one
+		self.assertIn(self.customer, self.search("055 123 4567"))
+		self.assertIn(self.customer, self.search("4567"))
+		self.assertIn(self.customer, self.search("fatima.sea"))
+		self.assertIn(self.customer, self.search("search fat"))
+		self.assertNotIn(self.customer, self.search("1234567890"))
+		self.assertNotIn(self.customer, self.search("atima"))
+
+	def test_contact_deletion_drops_its_keys(self):
+		contact = frappe.get_doc({"doctype": "Contact", "first_name": "Second"})
+		contact.append("phone_nos", {"phone": "0500 999 888", "is_primary_phone": 1})
+		contact.append("links", {"link_doctype": "Customer", "link_name": self.customer})
+		contact.insert(ignore_permissions=True)
+		self.assertIn(self.customer, self.search("999888"))
+
+		frappe.delete_doc("Contact", contact.name, ignore_permissions=True, force=True)
+		self.assertNotIn(self.customer, self.search("999888"))
+		self.assertIn(self.customer, self.search("4567"))
+
+	def test_name_tokens_split_on_punctuation(self):
+		customer = frappe.get_doc(
+			{
+				"doctype": "Customer",
+				"customer_name": "_Test Al-Rashid Trading",
+				"customer_type": "Company",
+				"customer_group": "All Customer Groups",
+				"territory": "All Territories",
+			}
+		).insert(ignore_permissions=True)
+
+		self.assertIn(customer.name, self.search("rashid"))
+		self.assertIn(customer.name, self.search("al-rash"))
+		self.assertIn(customer.name, self.search("rashid trad"))
+
+	def test_email_fragment_with_space_matches_nothing(self):
+		# A falsy condition would make get_customers skip the search filter altogether
+		self.assertTrue(get_search_condition("fatima @example")[0])
+		self.assertEqual(self.search("fatima @example"), set())
+
+	def test_empty_search(self):
+		self.assertEqual(get_search_condition("  "), (None, []))
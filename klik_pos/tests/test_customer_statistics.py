@@ -0,0 +1,82 @@
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from klik_pos.api.customer_statistics import (
+	STATISTICS_DOCTYPE,
+	get_customer_statistics_map,
+	refresh_customer_statistics,
+	update_customer_statistics,
+)
+
+CUSTOMER = "_Test Statistics Customer"
+
+
+class TestCustomerStatistics(FrappeTestCase):
+	def make_invoice(self, grand_total, posting_date, is_return=0):
+		return frappe._dict(
+			doctype="Sales Invoice",
+			customer=CUSTOMER,
+			custom_pos_opening_entry="_Test Opening",
+			is_return=is_return,
+			grand_total=grand_total,
+			posting_date=posting_date,
+		)
+
+	def tearDown(self):
+		frappe.db.delete(STATISTICS_DOCTYPE, {"name": CUSTOMER})
+
+	def test_submits_roll_up(self):
+		update_customer_statistics(self.make_invoice(100, "2025-01-05"), "on_submit")
+		update_customer_statistics(self.make_invoice(50, "2025-01-02"), "on_submit")
+		update_customer_statistics(self.make_invoice(-20, "2025-01-06", is_return=1), "on_submit")
+
+		stats = get_customer_statistics_map([CUSTOMER])[CUSTOMER]
+		self.assertEqual(stats.total_orders, 2)
+		self.assertEqual(stats.total_spent, 150)
+		self.assertEqual(str(stats.last_visit), "2025-01-05")
+		self.assertEqual(stats.average_basket, 75)
+		self.assertEqual((stats.total_returns, stats.total_returned), (1, 20))
+
+	def test_non_pos_invoices_are_ignored(self):
+		invoice = self.make_invoice(100, "2025-01-05")
+		invoice.custom_pos_opening_entry = None
+		update_customer_statistics(invoice, "on_submit")
+		self.assertEqual(get_customer_statistics_map([CUSTOMER]), {})
+
+	def test_consolidated_invoices_are_ignored(self):
+		invoice = self.make_invoice(100, "2025-01-05")
+		invoice.is_consolidated = 1
+		update_customer_statistics(invoice, "on_submit")
+		self.assertEqual(get_customer_statistics_map([CUSTOMER]), {})
+
+	def test_refresh_recomputes_from_invoices(self):
+		frappe.db.bulk_insert(
+			"Sales Invoice",
+			[
+				"name",
+				"customer",
+				"docstatus",
+				"is_return",
+				"is_consolidated",
+				"grand_total",
+				"posting_date",
+				"custom_pos_opening_entry",
+			],
+			[
+				("_T-KLIK-STATS-1", CUSTOMER, 1, 0, 0, 100, "2025-01-05", "_Test Opening"),
+				("_T-KLIK-STATS-2", CUSTOMER, 1, 0, 0, 50, "2025-01-02", "_Test Opening"),
+				("_T-KLIK-STATS-3", CUSTOMER, 1, 1, 0, -20, "2025-01-06", "_Test Opening"),
+				# Cancelled, and consolidated from POS Invoices: not counted
+				("_T-KLIK-STATS-4", CUSTOMER, 2, 0, 0, 500, "2025-01-07", "_Test Opening"),
+				("_T-KLIK-STATS-5", CUSTOMER, 1, 0, 1, 300, "2025-01-08", "_Test Opening"),
+			],
+		)
+		# A stale row is replaced
+		update_customer_statistics(self.make_invoice(999, "2024-12-01"), "on_submit")
+
+		refresh_customer_statistics(CUSTOMER)
+
+		stats = get_customer_statistics_map([CUSTOMER])[CUSTOMER]
+		self.assertEqual((stats.total_orders, stats.total_spent), (2, 150))
+		self.assertEqual(str(stats.last_visit), "2025-01-05")
+		self.assertEqual((stats.total_returns, stats.total_returned), (1, 20))
@@ -0,0 +1,112 @@
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from klik_pos.api.customer_sync import MAX_PAGE_SIZE, get_customer_changes, get_scope_signature
+
+
+class TestCustomerSync(FrappeTestCase):
+	def setUp(self):
+		profile = frappe._dict(custom_business_type="B2C", customer_groups=[])
+		patcher = patch("klik_pos.api.customer_sync.get_current_pos_profile", return_value=profile)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def make_customer(self, customer_name, customer_type="Individual"):
+		return frappe.get_doc(
+			{
+				"doctype": "Customer",
+				"customer_name": customer_name,
+				"customer_type": customer_type,
+				"customer_group": "All Customer Groups",
+				"territory": "All Territories",
+			}
+		).insert(ignore_permissions=True)
+
+	def current_watermark(self):
+		"""Watermark of a terminal that is up to date with the B2C profile right now."""
+		return {
+			"since": str(frappe.utils.now_datetime()),
+			"after": "",
+			"scope": get_scope_signature("B2C", []),
+		}
+
+	def sync_all(self, watermark, index):
+		"""Follow the watermark until the last page, keeping a local index like a terminal does."""
+		tombstones = {}
+		while True:
+			result = get_customer_changes(limit=2, **watermark)
+			self.assertTrue(result["success"], result.get("error"))
+			if result["reset"]:
+				index.clear()
+			index.update({row["name"]: row for row in result["data"]})
+			for row in result["tombstones"]:
+				tombstones[row["name"]] = row["reason"]
+				index.pop(row["name"], None)
+			watermark = result["watermark"]
+			if not result["has_more"]:
+				return tombstones, watermark
+
+	def test_delta_sync_with_tombstones(self):
+		index = {}
+		watermark = self.current_watermark()
+
+		first = self.make_customer("_Test Sync Customer 1")
+		second = self.make_customer("_Test Sync Customer 2")
+		third = self.make_customer("_Test Sync Customer 3")
+		company = self.make_customer("_Test Sync Company", customer_type="Company")
+		_tombstones, watermark = self.sync_all(watermark, index)
+		self.assertTrue({first.name, second.name, third.name} <= set(index))
+		# B2C profile: company customers are not synced
+		self.assertNotIn(company.name, index)
+
+		# Nothing new after the watermark
+		tombstones, watermark = self.sync_all(watermark, index)
+		self.assertEqual(tombstones, {})
+
+		frappe.db.set_value("Customer", first.name, "disabled", 1, update_modified=True)
+		frappe.delete_doc("Customer", second.name, ignore_permissions=True, force=True)
+		frappe.db.set_value("Customer", third.name, "customer_type", "Company", update_modified=True)
+		tombstones, watermark = self.sync_all(watermark, index)
+		self.assertEqual(
+			tombstones,
+			{first.name: "disabled", second.name: "deleted", third.name: "out_of_scope"},
+		)
+		self.assertFalse({first.name, second.name, third.name} & set(index))
+
+	def test_scope_change_resets_the_cache(self):
+		watermark = self.current_watermark()
+		company = self.make_customer("_Test Sync Reset Company", customer_type="Company")
+
+		# The profile now serves companies: customers enter the scope without changing
+		profile = frappe._dict(custom_business_type="B2B", customer_groups=[])
+		with patch("klik_pos.api.customer_sync.get_current_pos_profile", return_value=profile):
+			result = get_customer_changes(limit=MAX_PAGE_SIZE, **watermark)
+
+		self.assertTrue(result["reset"])
+		self.assertIn(company.name, [row["name"] for row in result["data"]])
+		self.assertNotEqual(result["watermark"]["scope"], watermark["scope"])
+
+	def test_restricted_user_sync_reads_only_permitted_customers(self):
+		permitted = self.make_customer("_Test Sync Permitted Customer")
+		user = "test@example.com"
+		frappe.get_doc(
+			{"doctype": "User Permission", "user": user, "allow": "Customer", "for_value": permitted.name}
+		).insert(ignore_permissions=True)
+
+		frappe.set_user(user)
+		self.addCleanup(frappe.set_user, "Administrator")
+
+		result = get_customer_changes(limit=MAX_PAGE_SIZE)
+		self.assertTrue(result["success"], result.get("error"))
+		self.assertEqual([row["name"] for row in result["data"]], [permitted.name])
+		self.assertFalse(result["has_more"])
+
+		# Changes to customers outside the user's permissions are not even named
+		frappe.set_user("Administrator")
+		other = self.make_customer("_Test Sync Other Customer", customer_type="Company")
+		frappe.set_user(user)
+		result = get_customer_changes(limit=MAX_PAGE_SIZE, **result["watermark"])
+		self.assertFalse(result["reset"])
+		self.assertNotIn(other.name, [row["name"] for row in result["data"] + result["tombstones"]])
@@ -0,0 +1,88 @@
+import io
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from PIL import Image
+
+from klik_pos.api.escpos import (
+	GS,
+	LOGO_CACHE_KEY,
+	EscPosBuilder,
+	clear_logo_cache,
+	get_default_logo_raster,
+	rasterize_image,
+	render_receipt,
+)
+
+PAYLOAD = {
+	"company": "_Test Company",
+	"company_address": "Main Street 1",
+	"name": "ACC-SINV-0001",
+	"posting": "2025-01-01 10:00",
+	"is_return": 0,
+	"status": "Paid",
+	"cashier": "Cashier",
+	"currency": "SAR",
+	"precision": 2,
+	"items": [{"item_name": "Coffee", "qty": 2, "rate": 5, "amount": 10}],
+	"total_qty": 2,
+	"net_total": 10,
+	"taxes": [{"description": "VAT 15%", "amount": 1.5}],
+	"total_taxes_and_charges": 1.5,
+	"grand_total": 11.5,
+	"rounding_adjustment": 0,
+	"payments": [{"mode_of_payment": "Cash", "amount": 11.5}],
+	"customer_name": "Walk-in",
+	"contact_mobile": None,
+	"qr": "AQ1fVGVzdCBDb21wYW55",
+}
+
+
+class TestEscPosReceipt(FrappeTestCase):
+	def test_receipt_bytes(self):
+		data = render_receipt(PAYLOAD, paper="58mm")
+
+		self.assertTrue(data.startswith(b"\x1b@"))
+		self.assertTrue(data.endswith(GS + b"VB\x00"))
+		self.assertIn(b"Coffee", data)
+		# QR payload stored with its length prefix, then printed
+		qr = PAYLOAD["qr"].encode()
+		self.assertIn(GS + b"(k" + bytes([len(qr) + 3, 0, 49, 80, 48]) + qr, data)
+		self.assertIn(GS + b"(k" + bytes([3, 0, 49, 81, 48]), data)
+
+	def test_row_fits_paper_width(self):
+		builder = EscPosBuilder(columns=32)
+		builder.row("A very long item description that overflows", "123.45")
+		line = builder.getvalue().split(b"\n")[0][-32:]
+		self.assertEqual(len(line), 32)
+		self.assertTrue(line.endswith(b"123.45"))
+
+	def test_rasterize_image(self):
+		image = Image.new("L", (20, 4), "white")
+		image.putpixel((0, 0), 0)
+		content = io.BytesIO()
+		image.save(content, format="PNG")
+
+		raster = rasterize_image(content.getvalue(), max_width=576)
+		header, data = raster[:8], raster[8:]
+		# 20 dots -> 3 bytes per row, 4 rows
+		self.assertEqual(header, GS + b"v0" + bytes([0, 3, 0, 4, 0]))
+		self.assertEqual(len(data), 12)
+		self.assertEqual(data[0], 0x80)
+		self.assertEqual(data[1:], bytes(11))
+
+	def test_logo_raster_cached(self):
+		clear_logo_cache()
+		self.addCleanup(clear_logo_cache)
+		with (
+			patch("frappe.db.get_value", return_value="/files/logo.png"),
+			patch("frappe.get_doc") as get_doc,
+			patch("klik_pos.api.escpos.rasterize_image", return_value=b"raster") as rasterize,
+		):
+			self.assertEqual(get_default_logo_raster(576), b"raster")
+			self.assertEqual(get_default_logo_raster(576), b"raster")
+			get_doc.assert_called_once()
+			rasterize.assert_called_once()
+
+		self.assertIsNotNone(frappe.cache().hget(LOGO_CACHE_KEY, "/files/logo.png|576"))
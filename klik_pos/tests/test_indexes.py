@@ -0,0 +1,31 @@
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from klik_pos.setup.indexes import (
+	POS_INDEXES,
+	ensure_pos_indexes,
+	get_index_drift,
+	verify_index_usage,
+)
+
+
+class TestManagedIndexes(FrappeTestCase):
+	def test_ensure_is_idempotent_and_leaves_no_drift(self):
+		ensure_pos_indexes()
+		ensure_pos_indexes()
+		self.assertEqual(get_index_drift(), [])
+
+	def test_mismatched_index_is_rebuilt(self):
+		ensure_pos_indexes()
+		spec = next(spec for spec in POS_INDEXES if spec["doctype"] == "Bin")
+		frappe.db.sql_ddl(f"ALTER TABLE `tabBin` DROP INDEX `{spec['index_name']}`")
+		frappe.db.sql_ddl(f"ALTER TABLE `tabBin` ADD INDEX `{spec['index_name']}` (`warehouse`)")
+
+		self.assertEqual([row["state"] for row in get_index_drift()], ["mismatch"])
+		ensure_pos_indexes()
+		self.assertEqual(get_index_drift(), [])
+
+	def test_sample_queries_can_use_their_index(self):
+		ensure_pos_indexes()
+		not_used = [plan["index_name"] for plan in verify_index_usage() if plan["status"] == "not_used"]
+		self.assertEqual(not_used, [])
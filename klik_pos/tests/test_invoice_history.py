@@ -0,0 +1,253 @@
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from klik_pos.api.invoice_summary import (
+	INVOICE_COUNT_CACHE_KEY,
+	SUMMARY_DOCTYPE,
+	clear_invoice_count_cache,
+	enrich_invoice_rows,
+	get_cached_invoice_count,
+	refresh_closing_entry_invoice_summaries,
+	refresh_payment_invoice_summaries,
+	sync_invoice_summary_statuses,
+	write_invoice_summaries,
+)
+from klik_pos.api.metrics import StageTimer
+from klik_pos.api.sales_invoice import get_customer_invoices_for_return, get_sales_invoices
+
+PREFIX = "_T-KLIK-HIST-"
+CUSTOMER = "_Test Klik History Customer"
+ITEM = "_Test Item"
+INVOICES = 12
+POS_INVOICE = "_T-KLIK-POS-HIST-001"
+
+
+class InvoiceHistoryTestCase(FrappeTestCase):
+	"""Seeds a shift of submitted POS Sales Invoices with items, payments and summaries."""
+
+	@classmethod
+	def setUpClass(cls):
+		super().setUpClass()
+		cls.names = [f"{PREFIX}{i:03d}" for i in range(INVOICES)]
+		invoices, items, payments = [], [], []
+		for i, name in enumerate(cls.names):
+			# The first invoice is a credit sale, the rest are paid at the counter
+			status = "Unpaid" if i == 0 else "Paid"
+			invoices.append(
+				(
+					name,
+					CUSTOMER,
+					CUSTOMER,
+					1,
+					0,
+					f"2025-01-{i + 1:02d}",
+					"10:00:00",
+					"_Test Opening Entry",
+					"Administrator",
+					status,
+					f"2025-01-01 10:{i:02d}:00",
+					100,
+					100,
+				)
+			)
+			# Item counts differ between invoices
+			for idx in range(1, 2 + i % 2):
+				items.append((f"{name}-{idx}", name, "Sales Invoice", "items", idx, ITEM, 2, 25, 50))
+			payments.append((f"{name}-P", name, "Sales Invoice", "payments", "Cash", 100))
+
+		frappe.db.bulk_insert(
+			"Sales Invoice",
+			[
+				"name",
+				"customer",
+				"customer_name",
+				"docstatus",
+				"is_return",
+				"posting_date",
+				"posting_time",
+				"custom_pos_opening_entry",
+				"owner",
+				"status",
+				"modified",
+				"grand_total",
+				"base_grand_total",
+			],
+			invoices,
+		)
+		frappe.db.bulk_insert(
+			"Sales Invoice Item",
+			["name", "parent", "parenttype", "parentfield", "idx", "item_code", "qty", "rate", "amount"],
+			items,
+		)
+		frappe.db.bulk_insert(
+			"Sales Invoice Payment",
+			["name", "parent", "parenttype", "parentfield", "mode_of_payment", "amount"],
+			payments,
+		)
+		# A paid-in-full sale recorded as a POS Invoice, not consolidated yet
+		frappe.db.bulk_insert(
+			"POS Invoice",
+			[
+				"name",
+				"customer",
+				"customer_name",
+				"docstatus",
+				"is_return",
+				"posting_date",
+				"custom_pos_opening_entry",
+				"owner",
+				"status",
+				"grand_total",
+				"base_grand_total",
+			],
+			[
+				(
+					POS_INVOICE,
+					CUSTOMER,
+					CUSTOMER,
+					1,
+					0,
+					"2025-01-31",
+					"_Test Opening Entry",
+					"Administrator",
+					"Paid",
+					100,
+					100,
+				)
+			],
+		)
+		frappe.db.bulk_insert(
+			"POS Return Ledger",
+			["name", "invoice_doctype", "invoice", "item_code", "returned_qty"],
+			[(f"{cls.names[1]}-L", "Sales Invoice", cls.names[1], ITEM, 1)],
+		)
+		write_invoice_summaries("Sales Invoice", cls.names)
+		write_invoice_summaries("POS Invoice", [POS_INVOICE])
+
+	def get_rows(self, limit):
+		rows = frappe.get_all(
+			"Sales Invoice",
+			filters={"name": ["in", self.names[:limit]]},
+			fields=["name", "owner", "customer", "posting_time"],
+		)
+		for row in rows:
+			row["doctype"] = "Sales Invoice"
+		return rows
+
+
+class TestInvoiceHistoryEnrichment(InvoiceHistoryTestCase):
+	"""Invoice list enrichment must not issue queries per invoice or per item."""
+
+	def count_queries(self, rows):
+		with StageTimer("klik_test_enrichment") as timer:
+			enrich_invoice_rows(rows)
+		return timer.query_count
+
+	def test_query_count_is_constant(self):
+		self.assertEqual(self.count_queries(self.get_rows(2)), self.count_queries(self.get_rows(INVOICES)))
+
+	def test_response_shape(self):
+		rows = {row.name: row for row in enrich_invoice_rows(self.get_rows(INVOICES))}
+		for row in rows.values():
+			self.assertEqual(row["mode_of_payment"], "Cash")
+			self.assertIsInstance(row["payment_methods"], list)
+			self.assertIn("cashier_name", row)
+			for item in row["items"]:
+				self.assertEqual(
+					set(item), {"item_code", "qty", "rate", "amount", "returned_qty", "quantity"}
+				)
+
+		self.assertEqual(rows[self.names[1]]["items"][0].returned_qty, 1)
+
+
+class TestInvoiceHistoryPagination(InvoiceHistoryTestCase):
+	def test_cursor_pages_follow_offset_order(self):
+		first = get_sales_invoices(limit=5, search=PREFIX)
+		self.assertTrue(first["success"])
+		self.assertEqual([row.name for row in first["data"]], self.names[::-1][:5])
+
+		by_cursor = get_sales_invoices(limit=5, search=PREFIX, cursor=first["next_cursor"])
+		by_offset = get_sales_invoices(limit=5, search=PREFIX, start=5)
+
+		self.assertEqual([row.name for row in by_cursor["data"]], [row.name for row in by_offset["data"]])
+		self.assertEqual([row.name for row in by_cursor["data"]], self.names[::-1][5:10])
+
+	def test_count_cached_until_invoice_changes(self):
+		clear_invoice_count_cache()
+		count = get_cached_invoice_count(search_term=PREFIX)
+		self.assertEqual(count, INVOICES)
+		self.assertEqual(list(frappe.cache().hgetall(INVOICE_COUNT_CACHE_KEY).values()), [count])
+
+		clear_invoice_count_cache()
+		self.assertFalse(frappe.cache().hgetall(INVOICE_COUNT_CACHE_KEY))
+
+
+class TestCustomerInvoicesForReturn(InvoiceHistoryTestCase):
+	def test_query_count_does_not_grow_with_page_size(self):
+		def count_queries(limit):
+			with StageTimer("klik_test_return_invoices") as timer:
+				result = get_customer_invoices_for_return(CUSTOMER, limit=limit)
+			self.assertTrue(result["success"])
+			self.assertEqual(len(result["data"]), limit)
+			return timer.query_count
+
+		self.assertEqual(count_queries(1), count_queries(10))
+
+	def test_pages_do_not_overlap(self):
+		first = get_customer_invoices_for_return(CUSTOMER, limit=5)
+		self.assertTrue(first["has_more"])
+
+		second = get_customer_invoices_for_return(CUSTOMER, limit=5, start=first["next_start"])
+		self.assertFalse({row.name for row in first["data"]} & {row.name for row in second["data"]})
+		self.assertEqual(len(first["data"]) + len(second["data"]), 10)
+
+		for invoice in first["data"] + second["data"]:
+			for item in invoice["items"]:
+				self.assertEqual(item.available_qty, item.qty - item.returned_qty)
+
+
+class TestInvoiceSummary(InvoiceHistoryTestCase):
+	def test_summary_matches_live_enrichment(self):
+		live = {row.name: row for row in enrich_invoice_rows(self.get_rows(INVOICES))}
+
+		for name in self.names:
+			summary = frappe.get_doc(SUMMARY_DOCTYPE, name)
+			self.assertEqual(summary.cashier_name, live[name].cashier_name)
+			self.assertEqual(summary.mode_of_payment, live[name].mode_of_payment)
+			self.assertEqual(summary.item_count, len(live[name]["items"]))
+
+	def test_payment_entry_refreshes_status(self):
+		name = self.names[0]
+		frappe.db.set_value("Sales Invoice", name, "status", "Paid", update_modified=False)
+
+		refresh_payment_invoice_summaries(
+			frappe._dict(references=[frappe._dict(reference_doctype="Sales Invoice", reference_name=name)])
+		)
+		self.assertEqual(frappe.db.get_value(SUMMARY_DOCTYPE, name, "status"), "Paid")
+
+	@patch("klik_pos.api.invoice_summary.frappe.db.commit")
+	def test_overdue_status_synced_without_doc_events(self, _commit):
+		name = self.names[0]
+		# ERPNext's daily job updates the status column directly
+		frappe.db.set_value("Sales Invoice", name, "status", "Overdue", update_modified=False)
+
+		sync_invoice_summary_statuses()
+		self.assertEqual(frappe.db.get_value(SUMMARY_DOCTYPE, name, "status"), "Overdue")
+
+	@patch("klik_pos.api.invoice_summary.frappe.db.commit")
+	def test_consolidated_pos_invoice_status_synced(self, _commit):
+		# Consolidation ran in a background job, without KLiK's doc_events
+		frappe.db.set_value("POS Invoice", POS_INVOICE, "status", "Consolidated", update_modified=False)
+
+		sync_invoice_summary_statuses()
+		self.assertEqual(frappe.db.get_value(SUMMARY_DOCTYPE, POS_INVOICE, "status"), "Consolidated")
+
+	def test_closing_entry_refreshes_consolidated_pos_invoices(self):
+		frappe.db.set_value("POS Invoice", POS_INVOICE, "status", "Consolidated", update_modified=False)
+
+		refresh_closing_entry_invoice_summaries(
+			frappe._dict(pos_transactions=[frappe._dict(pos_invoice=POS_INVOICE)])
+		)
+		self.assertEqual(frappe.db.get_value(SUMMARY_DOCTYPE, POS_INVOICE, "status"), "Consolidated")
@@ -0,0 +1,71 @@
+from unittest.mock import patch
+
+import frappe
+from erpnext.accounts.doctype.sales_invoice.test_sales_invoice import create_sales_invoice
+from frappe.model.naming import getseries
+from frappe.tests.utils import FrappeTestCase
+
+from klik_pos.api.invoice_numbering import (
+	BLOCK_DOCTYPE,
+	_advance_series,
+	_release_to_series,
+	assign_reserved_invoice_name,
+	get_series_key,
+)
+
+
+class TestInvoiceNumberBlocks(FrappeTestCase):
+	"""A reserved block moves the shared series once and can hand unused numbers back."""
+
+	prefix = "KLIK-TEST-BLK-"
+
+	def test_series_key_resolves_prefix_and_width(self):
+		self.assertEqual(get_series_key("KLIK-TEST-BLK-.#####"), (self.prefix, 5))
+
+	def test_block_advances_series_once(self):
+		start = _advance_series(self.prefix, 50)
+		self.assertEqual(getseries(self.prefix, 5), f"{start + 50:05d}")
+
+	def test_unused_numbers_released_only_at_series_tip(self):
+		start = _advance_series(self.prefix, 10)
+		block = frappe._dict(series_prefix=self.prefix, end_number=start + 9, next_number=start + 4)
+
+		self.assertTrue(_release_to_series(block))
+		self.assertEqual(getseries(self.prefix, 5), f"{start + 4:05d}")
+
+		# A later reservation moved the counter: the range can only be reported
+		_advance_series(self.prefix, 10)
+		self.assertFalse(_release_to_series(block))
+
+	@patch("klik_pos.api.invoice_numbering.get_block_size", return_value=10)
+	def test_failed_checkout_returns_its_number_to_the_block(self, _block_size):
+		start = _advance_series(self.prefix, 10)
+		block = frappe.get_doc(
+			{
+				"doctype": BLOCK_DOCTYPE,
+				"pos_opening_entry": "_Test Opening",
+				"invoice_doctype": "Sales Invoice",
+				"naming_series": "KLIK-TEST-BLK-.#####",
+				"series_prefix": self.prefix,
+				"digits": 5,
+				"start_number": start,
+				"end_number": start + 9,
+				"next_number": start,
+				"status": "Active",
+			}
+		).insert(ignore_permissions=True, ignore_links=True)
+
+		def make_invoice():
+			doc = create_sales_invoice(do_not_save=1, do_not_submit=1)
+			doc.naming_series = "KLIK-TEST-BLK-.#####"
+			doc.custom_pos_opening_entry = "_Test Opening"
+			return doc
+
+		# The checkout fails after taking its number: the transaction is rolled back
+		frappe.db.savepoint("klik_test_checkout")
+		failed_name = assign_reserved_invoice_name(make_invoice())
+		frappe.db.rollback(save_point="klik_test_checkout")
+
+		self.assertEqual(failed_name, f"{self.prefix}{start:05d}")
+		self.assertEqual(frappe.db.get_value(BLOCK_DOCTYPE, block.name, "next_number"), start)
+		self.assertEqual(assign_reserved_invoice_name(make_invoice()), failed_name)
@@ -0,0 +1,52 @@
+from unittest.mock import patch
+
+import frappe
+from erpnext.accounts.doctype.sales_invoice.test_sales_invoice import create_sales_invoice
+from frappe.tests.utils import FrappeTestCase
+
+from klik_pos.api.invoice_pdf import get_invoice_pdf, get_invoice_pdf_url
+
+
+class TestInvoicePdfCache(FrappeTestCase):
+	def render_count(self, invoice_name):
+		with patch("frappe.get_print", return_value=b"%PDF-1.4 test") as get_print:
+			filedoc = get_invoice_pdf(invoice_name, "Standard")
+		return get_print.call_count, filedoc
+
+	def test_pdf_rendered_once_per_invoice_version(self):
+		invoice = create_sales_invoice()
+
+		first_renders, first = self.render_count(invoice.name)
+		second_renders, second = self.render_count(invoice.name)
+		self.assertEqual((first_renders, second_renders), (1, 0))
+		self.assertEqual(first.name, second.name)
+		self.assertTrue(first.is_private)
+
+		# A change to the invoice invalidates the cached file and replaces it
+		frappe.db.set_value("Sales Invoice", invoice.name, "remarks", "changed")
+		third_renders, third = self.render_count(invoice.name)
+		self.assertEqual(third_renders, 1)
+		self.assertFalse(frappe.db.exists("File", first.name))
+		self.assertTrue(frappe.db.exists("File", third.name))
+
+	def test_public_copy_only_for_whatsapp_links(self):
+		invoice = create_sales_invoice()
+		_renders, private = self.render_count(invoice.name)
+
+		url = get_invoice_pdf_url(invoice.name, "Standard")
+		self.assertEqual(get_invoice_pdf_url(invoice.name, "Standard"), url)
+
+		public = frappe.get_all(
+			"File",
+			filters={
+				"attached_to_doctype": "Sales Invoice",
+				"attached_to_name": invoice.name,
+				"is_private": 0,
+			},
+			fields=["file_name", "file_url"],
+		)
+		self.assertEqual(len(public), 1)
+		self.assertTrue(url.endswith(public[0].file_url))
+		# Not derivable from the private file's name
+		self.assertNotEqual(public[0].file_name, private.file_name)
+		self.assertTrue(public[0].file_name.startswith(private.file_name.removesuffix(".pdf") + "-"))
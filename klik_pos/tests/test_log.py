@@ -0,0 +1,41 @@
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from klik_pos.klik_pos.log import get_logger
+
+
+class TestKlikLogger(FrappeTestCase):
+	def setUp(self):
+		self.logger = get_logger("klik_pos.api.klik_log_test")
+
+	def test_module_level_gates_records(self):
+		conf = {"klik_pos_log_level": "WARNING", "klik_pos_log_levels": {"klik_log_test": "DEBUG"}}
+		with patch.object(frappe.local, "conf", frappe._dict(conf)):
+			self.assertTrue(self.logger.is_enabled_for(10))
+
+		with patch.object(frappe.local, "conf", frappe._dict({"klik_pos_log_level": "ERROR"})):
+			self.assertFalse(self.logger.is_enabled_for(30))
+
+	def test_sampling_skips_debug_but_not_errors(self):
+		conf = {
+			"klik_pos_log_levels": {"klik_log_test": "DEBUG"},
+			"klik_pos_log_sample_rates": {"klik_log_test": 0},
+		}
+		with (
+			patch.object(frappe.local, "conf", frappe._dict(conf)),
+			patch.object(self.logger._logger, "log") as log,
+		):
+			self.logger.debug("routine %s", 1)
+			self.logger.error("failure %s", 2)
+
+		self.assertEqual(log.call_count, 1)
+		self.assertEqual(log.call_args[0][:2], (40, "failure %s"))
+
+	def test_routine_logging_does_not_write_error_log(self):
+		before = frappe.db.count("Error Log")
+		with patch.object(frappe.local, "conf", frappe._dict({"klik_pos_log_level": "DEBUG"})):
+			for i in range(50):
+				self.logger.info("sale %s", i)
+		self.assertEqual(frappe.db.count("Error Log"), before)
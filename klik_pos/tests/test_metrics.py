@@ -0,0 +1,27 @@
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from klik_pos.api.metrics import StageTimer, get_stage_metrics, summarize_samples
+
+
+class TestStageMetrics(FrappeTestCase):
+	def test_percentiles(self):
+		samples = [f"{ms}|2" for ms in range(1, 101)]
+		stats = summarize_samples(samples)
+		self.assertEqual(stats["count"], 100)
+		self.assertEqual((stats["p50"], stats["p95"], stats["p99"]), (50, 95, 99))
+		self.assertEqual(stats["avg_queries"], 2)
+
+	def test_stage_timer_counts_queries_and_records(self):
+		with StageTimer("klik_test_pipeline", pos_profile="_Test POS Profile") as timer:
+			with timer.stage("lookup"):
+				frappe.db.sql("select 1")
+				frappe.db.sql("select 2")
+
+		self.assertEqual(timer.summary()["lookup"]["queries"], 2)
+		self.assertNotIn("sql", frappe.db.__dict__)
+
+		result = get_stage_metrics("klik_test_pipeline", pos_profile="_Test POS Profile")
+		self.assertTrue(result["success"])
+		self.assertIn("lookup", result["data"]["_Test POS Profile"])
+		self.assertIn("total", result["data"]["__all__"])
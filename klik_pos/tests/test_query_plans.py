@@ -0,0 +1,177 @@
+import datetime
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from klik_pos.api.customer import get_customer_info, get_customers
+from klik_pos.api.item import get_item_by_identifier, get_serial_nos_for_item
+from klik_pos.api.pos_entry import _calculate_payment_reconciliation
+from klik_pos.api.sales_invoice import get_customer_invoices_for_return, get_valid_sales_invoices
+from klik_pos.setup.indexes import ensure_pos_indexes
+from klik_pos.tests.query_plans import capture_queries, check_plans
+
+ROWS = 2000
+ROW_BUDGET = 200
+
+WAREHOUSE = "_QP Warehouse"
+PRICE_LIST = "_QP Price List"
+CUSTOMER = "_QP-CUST-00000"
+
+
+class TestEndpointQueryPlans(FrappeTestCase):
+	"""
+	Runs POS endpoints against a seeded dataset and EXPLAINs every SELECT they issue.
+	A query that reads more than ROW_BUDGET rows, or scans a table it used to reach
+	through an index, fails the test.
+	"""
+
+	@classmethod
+	def setUpClass(cls):
+		super().setUpClass()
+		# DDL commits implicitly, so indexes go in before the seeded rows
+		ensure_pos_indexes()
+		cls.seed()
+
+	@classmethod
+	def seed(cls):
+		now = frappe.utils.now_datetime()
+		items = [f"_QP-ITEM-{i:05d}" for i in range(ROWS)]
+		frappe.db.bulk_insert(
+			"Item",
+			[
+				"name",
+				"item_code",
+				"item_name",
+				"stock_uom",
+				"is_stock_item",
+				"disabled",
+				"creation",
+				"modified",
+			],
+			[(code, code, code, "Nos", 1, 0, now, now) for code in items],
+		)
+		frappe.db.bulk_insert(
+			"Item Barcode",
+			["name", "parent", "parenttype", "parentfield", "barcode"],
+			[(f"{code}-B", code, "Item", "barcodes", f"QP{i:08d}") for i, code in enumerate(items)],
+		)
+		frappe.db.bulk_insert(
+			"Bin",
+			["name", "item_code", "warehouse", "actual_qty"],
+			[(f"{code}-BIN", code, WAREHOUSE, 5) for code in items],
+		)
+		frappe.db.bulk_insert(
+			"Item Price",
+			["name", "item_code", "price_list", "selling", "price_list_rate", "uom"],
+			[(f"{code}-P", code, PRICE_LIST, 1, 10, "Nos") for code in items],
+		)
+		frappe.db.bulk_insert(
+			"Serial No",
+			["name", "serial_no", "item_code", "warehouse", "status"],
+			[(f"QP-SN-{i:05d}", f"QP-SN-{i:05d}", items[i % 20], WAREHOUSE, "Active") for i in range(ROWS)],
+		)
+		frappe.db.bulk_insert(
+			"Customer",
+			["name", "customer_name", "customer_type", "creation", "modified"],
+			[(f"_QP-CUST-{i:05d}", f"QP Customer {i}", "Individual", now, now) for i in range(ROWS)],
+		)
+
+		invoices = [f"_QP-SINV-{i:05d}" for i in range(ROWS)]
+		frappe.db.bulk_insert(
+			"Sales Invoice",
+			[
+				"name",
+				"customer",
+				"pos_profile",
+				"custom_pos_opening_entry",
+				"posting_date",
+				"posting_time",
+				"docstatus",
+				"is_return",
+				"status",
+				"modified",
+			],
+			[
+				(
+					name,
+					f"_QP-CUST-{i % 100:05d}",
+					# A small shift among older sales of other profiles
+					"_QP Profile" if i < 50 else "_QP Other Profile",
+					"_QP Opening" if i < 50 else "_QP Other Opening",
+					"2025-01-01" if i < 50 else "2024-06-01",
+					"10:00:00",
+					1,
+					0,
+					"Paid",
+					now,
+				)
+				for i, name in enumerate(invoices)
+			],
+		)
+		frappe.db.bulk_insert(
+			"Sales Invoice Item",
+			["name", "parent", "parenttype", "parentfield", "item_code", "qty", "rate", "amount"],
+			[(f"{name}-I", name, "Sales Invoice", "items", items[1], 1, 10, 10) for name in invoices],
+		)
+		frappe.db.bulk_insert(
+			"Sales Invoice Payment",
+			["name", "parent", "parenttype", "parentfield", "mode_of_payment", "amount"],
+			[(f"{name}-P", name, "Sales Invoice", "payments", "Cash", 10) for name in invoices],
+		)
+
+	def assert_plans(self, call, allow_scan=()):
+		with capture_queries() as statements:
+			call()
+		self.assertTrue(statements, "endpoint issued no SELECT")
+		problems = check_plans(statements, ROW_BUDGET, allow_scan)
+		self.assertFalse(problems, "\n".join(problems))
+
+	def pos_profile(self):
+		return frappe._dict(
+			name="_QP Profile",
+			warehouse=WAREHOUSE,
+			selling_price_list=PRICE_LIST,
+			item_groups=[],
+			customer_groups=[],
+			hide_unavailable_items=1,
+			custom_business_type="B2C",
+		)
+
+	def test_item_lookup(self):
+		with patch("klik_pos.api.item.get_current_pos_profile", return_value=self.pos_profile()):
+			self.assert_plans(lambda: get_item_by_identifier("QP00001234"))
+			self.assert_plans(lambda: get_item_by_identifier("QP-SN-01234"))
+			self.assert_plans(lambda: get_serial_nos_for_item("_QP-ITEM-00003"))
+
+	def test_customer_endpoints(self):
+		self.assert_plans(lambda: get_customer_info(CUSTOMER))
+		with patch("klik_pos.api.customer.get_current_pos_profile", return_value=self.pos_profile()):
+			# Newest customers first; the customer list itself is read through `creation` order
+			self.assert_plans(lambda: get_customers(limit=20), allow_scan=("tabCustomer",))
+
+	def test_return_endpoints(self):
+		self.assert_plans(lambda: get_customer_invoices_for_return(CUSTOMER, limit=20))
+		self.assert_plans(
+			lambda: get_valid_sales_invoices(
+				"Sales Invoice",
+				"_QP-SINV-001",
+				"name",
+				0,
+				20,
+				{
+					"customer": CUSTOMER,
+					"item_code": "_QP-ITEM-00001",
+					"start_date": "2024-01-01",
+					"search_mode": "prefix",
+				},
+			)
+		)
+
+	def test_closing_reconciliation(self):
+		opening_entry = frappe._dict(
+			name="_QP Opening",
+			pos_profile="_QP Profile",
+			period_start_date=datetime.datetime(2025, 1, 1, 9, 0),
+		)
+		self.assert_plans(lambda: _calculate_payment_reconciliation(opening_entry, {"closing_balance": {}}))
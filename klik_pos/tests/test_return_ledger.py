@@ -0,0 +1,62 @@
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from klik_pos.api.return_ledger import (
+	LEDGER_DOCTYPE,
+	build_return_ledger,
+	get_returned_qty,
+	update_return_ledger,
+)
+
+
+class TestReturnLedger(FrappeTestCase):
+	def make_return(self, qty, item_code="_Test Ledger Item"):
+		return frappe._dict(
+			doctype="Sales Invoice",
+			is_return=1,
+			return_against="_Test Ledger Invoice",
+			items=[frappe._dict(item_code=item_code, qty=qty)],
+		)
+
+	def tearDown(self):
+		frappe.db.delete(LEDGER_DOCTYPE, {"invoice": "_Test Ledger Invoice"})
+
+	def test_submit_and_cancel_move_the_ledger(self):
+		first = self.make_return(-2)
+		second = self.make_return(-3)
+
+		update_return_ledger(first, "on_submit")
+		update_return_ledger(second, "on_submit")
+		self.assertEqual(get_returned_qty("_Test Ledger Invoice", "_Test Ledger Item"), 5)
+
+		update_return_ledger(first, "on_cancel")
+		self.assertEqual(get_returned_qty("_Test Ledger Invoice", "_Test Ledger Item"), 3)
+		self.assertEqual(
+			frappe.db.count(LEDGER_DOCTYPE, {"invoice": "_Test Ledger Invoice"}),
+			1,
+		)
+
+	def test_non_returns_are_ignored(self):
+		doc = self.make_return(2)
+		doc.is_return = 0
+		update_return_ledger(doc, "on_submit")
+		self.assertEqual(get_returned_qty("_Test Ledger Invoice", "_Test Ledger Item"), 0)
+
+	def test_backfill_matches_live_sum(self):
+		build_return_ledger()
+		live = frappe.db.sql(
+			"""
+			SELECT si.return_against, sii.item_code, SUM(ABS(sii.qty)) AS qty
+			FROM `tabSales Invoice` si
+			JOIN `tabSales Invoice Item` sii ON si.name = sii.parent
+			WHERE si.is_return = 1 AND si.docstatus = 1 AND IFNULL(si.return_against, '') != ''
+			GROUP BY si.return_against, sii.item_code
+			LIMIT 20
+			""",
+			as_dict=True,
+		)
+		if not live:
+			self.skipTest("No submitted Sales Invoice returns")
+
+		for row in live:
+			self.assertEqual(get_returned_qty(row.return_against, row.item_code), row.qty)
@@ -0,0 +1,361 @@
+import time
+import timeit
+from unittest.mock import patch
+
+import frappe
+from erpnext.accounts.doctype.pos_invoice.test_pos_invoice import create_pos_invoice
+from erpnext.accounts.doctype.sales_invoice.test_sales_invoice import create_sales_invoice
+from erpnext.controllers.taxes_and_totals import calculate_taxes_and_totals
+from frappe.tests.utils import FrappeTestCase
+
+from klik_pos.api.pos_entry import _get_unconsolidated_pos_invoices
+from klik_pos.api.sales_invoice import (
+	PAYMENT_ENTRY_MAX_ATTEMPTS,
+	CustomSalesInvoice,
+	_build_partial_return,
+	build_sales_invoice_doc,
+	clear_invoice_details_cache,
+	create_multi_invoice_return,
+	create_partial_return,
+	custom_calculate_totals,
+	get_cached_invoice_details,
+	get_customer_invoices_for_return,
+	get_invoice_mode_of_payment,
+	get_linked_payment_entry,
+	get_valid_sales_invoices,
+	process_deferred_payment_entry,
+	retry_payment_entry,
+	retry_queued_payment_entries,
+	validate_multi_invoice_return,
+)
+
+WRITE_OFF_ACCOUNT = "_Test Write Off - _TC"
+POS_PROFILE = "_Test POS Profile"
+
+
+class TestScopedRoundoffTotals(FrappeTestCase):
+	"""Round-off totals must apply to Sales Invoice only, without patching ERPNext globally."""
+
+	def make_invoice(self, rate=13, roundoff_amount=3.01):
+		doc = create_sales_invoice(rate=rate, do_not_save=1, do_not_submit=1)
+		doc.custom_roundoff_amount = roundoff_amount
+		doc.custom_roundoff_account = WRITE_OFF_ACCOUNT
+		return doc
+
+	def test_roundoff_applied_without_global_patch(self):
+		original_calculate_totals = calculate_taxes_and_totals.calculate_totals
+
+		doc = self.make_invoice()
+		self.assertIsInstance(doc, CustomSalesInvoice)
+		doc.calculate_taxes_and_totals()
+
+		self.assertEqual(doc.grand_total, 9.99)
+		self.assertIs(calculate_taxes_and_totals.calculate_totals, original_calculate_totals)
+		self.assertIsNot(calculate_taxes_and_totals.calculate_totals, custom_calculate_totals)
+
+	@patch("klik_pos.api.sales_invoice.get_writeoff_account", return_value=WRITE_OFF_ACCOUNT)
+	def test_validate_leaves_erpnext_totals_untouched(self, _mock_writeoff):
+		original_calculate_totals = calculate_taxes_and_totals.calculate_totals
+
+		# Only the doc_events hooks; the controller's own validate is not under test
+		with patch.object(CustomSalesInvoice, "validate", lambda self: None):
+			self.make_invoice().run_method("validate")
+			create_sales_invoice(rate=13, do_not_save=1, do_not_submit=1).run_method("validate")
+
+		self.assertIs(calculate_taxes_and_totals.calculate_totals, original_calculate_totals)
+
+	@patch("klik_pos.api.sales_invoice.get_writeoff_account", return_value=WRITE_OFF_ACCOUNT)
+	def test_validate_hook_overhead(self, _mock_writeoff):
+		"""Micro-benchmark: the Sales Invoice validate hooks no longer re-install totals logic."""
+		original_calculate_totals = calculate_taxes_and_totals.calculate_totals
+		doc = self.make_invoice()
+
+		def run_validate_hooks():
+			doc.run_method("validate")
+
+		with patch.object(CustomSalesInvoice, "validate", lambda self: None):
+			per_call = min(timeit.repeat(run_validate_hooks, number=200, repeat=3)) / 200
+
+		self.assertIs(calculate_taxes_and_totals.calculate_totals, original_calculate_totals)
+		self.assertLess(per_call, 0.005)
+
+	@patch("klik_pos.api.sales_invoice.get_writeoff_account", return_value=WRITE_OFF_ACCOUNT)
+	def test_pos_invoice_without_roundoff_writes_off_small_fraction(self, _mock_writeoff):
+		doc = self.make_invoice(rate=10.01, roundoff_amount=0)
+		doc.pos_profile = POS_PROFILE
+		doc.calculate_taxes_and_totals()
+
+		self.assertEqual(doc.grand_total, 10)
+		self.assertAlmostEqual(doc.custom_roundoff_amount, 0.01)
+
+	def test_non_pos_invoice_without_roundoff_uses_erpnext_totals(self):
+		doc = self.make_invoice(roundoff_amount=0)
+
+		with patch("klik_pos.api.sales_invoice.RoundoffTaxesAndTotals") as roundoff_totals:
+			doc.calculate_taxes_and_totals()
+
+		roundoff_totals.assert_not_called()
+		self.assertEqual(doc.grand_total, 13)
+
+
+class TestInvoiceDetailsCache(FrappeTestCase):
+	def test_submitted_invoice_details_cached_until_return(self):
+		invoice = create_sales_invoice()
+		get_cached_invoice_details("Sales Invoice", invoice.name)
+
+		with patch("klik_pos.api.sales_invoice.build_invoice_details") as build:
+			data = get_cached_invoice_details("Sales Invoice", invoice.name)
+		build.assert_not_called()
+		self.assertEqual(data["name"], invoice.name)
+
+		clear_invoice_details_cache(frappe._dict(name="_Test Return", return_against=invoice.name))
+		with patch("klik_pos.api.sales_invoice.build_invoice_details", return_value={}) as build:
+			get_cached_invoice_details("Sales Invoice", invoice.name)
+		build.assert_called_once()
+
+	def test_missing_invoice_raises_does_not_exist(self):
+		with self.assertRaises(frappe.DoesNotExistError):
+			get_cached_invoice_details("Sales Invoice", "_Test Missing Invoice")
+
+
+class TestMultiInvoiceReturn(FrappeTestCase):
+	def make_batch(self, *lines):
+		return [
+			{"invoice_name": name, "return_items": [{"item_code": "_Test Item", "return_qty": qty}]}
+			for name, qty in lines
+		]
+
+	def test_validation_rejects_over_return_before_creating_anything(self):
+		first = create_sales_invoice(qty=2)
+		second = create_sales_invoice(qty=1)
+		batch = self.make_batch((first.name, 2), (second.name, 3))
+
+		errors = validate_multi_invoice_return(
+			batch, {first.name: "Sales Invoice", second.name: "Sales Invoice"}
+		)
+		self.assertEqual(list(errors), [second.name])
+
+		with patch("klik_pos.api.sales_invoice._build_partial_return") as build:
+			result = create_multi_invoice_return({"invoice_returns": batch})
+		build.assert_not_called()
+		self.assertFalse(result["success"])
+		self.assertEqual(result["created_returns"], [])
+
+	def test_duplicate_lines_are_validated_together(self):
+		invoice = create_sales_invoice(qty=2)
+		batch = self.make_batch((invoice.name, 1), (invoice.name, 2))
+
+		errors = validate_multi_invoice_return(batch, {invoice.name: "Sales Invoice"})
+		self.assertIn(invoice.name, errors)
+
+	def test_atomic_batch_rolls_back_on_failure(self):
+		first = create_sales_invoice(qty=2)
+		second = create_sales_invoice(qty=2)
+		batch = self.make_batch((first.name, 1), (second.name, 1))
+
+		def fail_second(invoice_doctype, invoice_name, *args):
+			if invoice_name == second.name:
+				raise frappe.ValidationError("boom")
+			return _build_partial_return(invoice_doctype, invoice_name, *args)
+
+		with patch("klik_pos.api.sales_invoice.get_current_pos_opening_entry", return_value=None):
+			with patch("klik_pos.api.sales_invoice.get_writeoff_account", return_value=WRITE_OFF_ACCOUNT):
+				with patch("klik_pos.api.sales_invoice._build_partial_return", side_effect=fail_second):
+					result = create_multi_invoice_return({"invoice_returns": batch})
+
+		self.assertFalse(result["success"])
+		self.assertEqual(result["created_returns"], [])
+		self.assertEqual(result["results"][-1]["invoice_name"], second.name)
+		# The return against the first invoice was submitted before the failure and is gone again
+		self.assertTrue(frappe.db.exists("Sales Invoice", first.name))
+		self.assertFalse(frappe.db.exists("Sales Invoice", {"is_return": 1, "return_against": first.name}))
+
+
+class TestDeferredPaymentEntry(FrappeTestCase):
+	def test_payment_entry_created_in_background(self):
+		invoice = create_sales_invoice()
+
+		process_deferred_payment_entry(invoice.name, [{"method": "Cash"}], invoice.grand_total)
+
+		invoice.reload()
+		self.assertEqual(invoice.custom_payment_entry_status, "Created")
+		self.assertEqual(invoice.custom_payment_entry, get_linked_payment_entry(invoice.name))
+		self.assertEqual(frappe.db.get_value("Sales Invoice", invoice.name, "outstanding_amount"), 0)
+
+	@patch("klik_pos.api.sales_invoice.frappe.log_error")
+	@patch("klik_pos.api.sales_invoice.create_payment_entry", side_effect=frappe.ValidationError("locked"))
+	def test_failed_attempt_is_left_for_the_scheduler_and_only_last_one_logged(self, _create, log_error):
+		invoice = create_sales_invoice()
+		invoice.db_set("custom_payment_entry_status", "Queued")
+
+		process_deferred_payment_entry(invoice.name, [{"method": "Cash"}], invoice.grand_total)
+		log_error.assert_not_called()
+		invoice.reload()
+		self.assertEqual(invoice.custom_payment_entry_status, "Queued")
+		self.assertEqual(invoice.custom_payment_entry_attempts, 1)
+
+		with patch("klik_pos.api.sales_invoice.frappe.enqueue") as enqueue:
+			retry_queued_payment_entries()
+		retries = [c for c in enqueue.call_args_list if c.kwargs["invoice_name"] == invoice.name]
+		self.assertEqual(len(retries), 1)
+		self.assertEqual(retries[0].kwargs["attempt"], 2)
+
+		process_deferred_payment_entry(
+			invoice.name, [{"method": "Cash"}], invoice.grand_total, attempt=PAYMENT_ENTRY_MAX_ATTEMPTS
+		)
+		log_error.assert_called_once()
+		self.assertEqual(invoice.reload().custom_payment_entry_status, "Failed")
+
+		with patch("klik_pos.api.sales_invoice.frappe.enqueue") as enqueue:
+			retry_queued_payment_entries()
+		self.assertNotIn(invoice.name, [c.kwargs["invoice_name"] for c in enqueue.call_args_list])
+
+	@patch("klik_pos.api.sales_invoice.enqueue_payment_entry", return_value="Queued")
+	def test_retry_uses_the_invoice_mode_of_payment(self, enqueue_payment_entry):
+		invoice = create_sales_invoice()
+		invoice.db_set("custom_payment_entry_status", "Failed")
+
+		with patch("klik_pos.api.sales_invoice.get_invoice_mode_of_payment", return_value="Wire Transfer"):
+			result = retry_payment_entry(invoice.name)
+
+		self.assertTrue(result["success"])
+		self.assertEqual(enqueue_payment_entry.call_args.args[1], [{"method": "Wire Transfer"}])
+
+	def test_invoice_mode_of_payment_skips_unpaid_rows(self):
+		invoice = frappe._dict(
+			payments=[
+				frappe._dict(mode_of_payment="Cash", amount=0),
+				frappe._dict(mode_of_payment="Wire Transfer", amount=100),
+			]
+		)
+		self.assertEqual(get_invoice_mode_of_payment(invoice), "Wire Transfer")
+		self.assertIsNone(get_invoice_mode_of_payment(frappe._dict(payments=[])))
+
+
+class TestPOSInvoiceMode(FrappeTestCase):
+	"""Paid-in-full sales recorded as POS Invoices can be listed and returned like Sales Invoices."""
+
+	def setUp(self):
+		self.pos_invoice = create_pos_invoice(qty=2, rate=100, do_not_save=1)
+		self.pos_invoice.append("payments", {"mode_of_payment": "Cash", "amount": 200, "default": 1})
+		self.pos_invoice.insert()
+		self.pos_invoice.submit()
+		self.pos_invoice.db_set("custom_pos_opening_entry", "_Test Opening")
+
+		self.pos_profile = frappe.get_doc("POS Profile", self.pos_invoice.pos_profile)
+		self.pos_profile.db_set("custom_use_pos_invoice", 1)
+
+	def test_paid_sale_is_built_as_pos_invoice(self):
+		with (
+			patch("klik_pos.api.sales_invoice.get_current_pos_opening_entry", return_value=None),
+			patch("klik_pos.api.sales_invoice.get_current_pos_profile", return_value=self.pos_profile),
+		):
+			doc = build_sales_invoice_doc(
+				self.pos_invoice.customer,
+				[{"id": "_Test Item", "quantity": 1, "price": 100}],
+				100,
+				None,
+				[{"method": "Cash", "amount": 100}],
+				"B2C",
+				include_payments=True,
+				allow_pos_invoice=True,
+			)
+		self.assertEqual(doc.doctype, "POS Invoice")
+
+	def test_shift_pos_invoices_consolidated_after_setting_is_switched_off(self):
+		self.pos_profile.db_set("custom_use_pos_invoice", 0)
+
+		pos_invoices = _get_unconsolidated_pos_invoices("_Test Opening")
+		self.assertIn(self.pos_invoice.name, [row.name for row in pos_invoices])
+
+	def test_pos_invoice_listed_for_return(self):
+		result = get_customer_invoices_for_return(self.pos_invoice.customer, limit=100)
+		invoices = {invoice.name: invoice for invoice in result["data"]}
+		self.assertEqual(invoices[self.pos_invoice.name].doctype, "POS Invoice")
+		self.assertEqual(invoices[self.pos_invoice.name]["items"][0].available_qty, 2)
+		self.assertEqual(invoices[self.pos_invoice.name].payment_method, "Cash")
+
+		valid = get_valid_sales_invoices(
+			"Sales Invoice",
+			self.pos_invoice.name,
+			"name",
+			0,
+			20,
+			{
+				"customer": self.pos_invoice.customer,
+				"item_code": "_Test Item",
+				"start_date": self.pos_invoice.posting_date,
+			},
+		)
+		self.assertIn(self.pos_invoice.name, [row[0] for row in valid])
+
+	def test_pos_invoice_partial_return(self):
+		with (
+			patch("klik_pos.api.sales_invoice.get_current_pos_opening_entry", return_value=None),
+			patch("klik_pos.api.sales_invoice.get_writeoff_account", return_value=WRITE_OFF_ACCOUNT),
+		):
+			result = create_partial_return(
+				self.pos_invoice.name, [{"item_code": "_Test Item", "return_qty": 1}], payment_method="Cash"
+			)
+
+		self.assertTrue(result["success"])
+		return_doc = frappe.get_doc("POS Invoice", result["return_invoice"])
+		self.assertEqual(return_doc.return_against, self.pos_invoice.name)
+
+		invoices = get_customer_invoices_for_return(self.pos_invoice.customer, limit=100)["data"]
+		(invoice,) = [invoice for invoice in invoices if invoice.name == self.pos_invoice.name]
+		self.assertEqual(invoice["items"][0].available_qty, 1)
+
+
+class TestValidSalesInvoicesBenchmark(FrappeTestCase):
+	"""Return-invoice picker for a customer with a long history."""
+
+	CUSTOMER = "_Test Klik Long History Customer"
+	ITEM = "_Test Klik Return Item"
+	INVOICES = 10_000
+
+	@classmethod
+	def setUpClass(cls):
+		super().setUpClass()
+		invoices = []
+		items = []
+		ledger = []
+		for i in range(cls.INVOICES):
+			name = f"_T-KLIK-RET-{i:05d}"
+			invoices.append((name, cls.CUSTOMER, 1, 0, "2025-01-01", "_Test Opening Entry"))
+			items.append((f"{name}-1", name, "Sales Invoice", "items", cls.ITEM, 2))
+			# Every third invoice is fully returned already
+			if i % 3 == 0:
+				ledger.append((f"{name}-L", "Sales Invoice", name, cls.ITEM, 2))
+
+		frappe.db.bulk_insert(
+			"Sales Invoice",
+			["name", "customer", "docstatus", "is_return", "posting_date", "custom_pos_opening_entry"],
+			invoices,
+		)
+		frappe.db.bulk_insert(
+			"Sales Invoice Item", ["name", "parent", "parenttype", "parentfield", "item_code", "qty"], items
+		)
+		frappe.db.bulk_insert(
+			"POS Return Ledger", ["name", "invoice_doctype", "invoice", "item_code", "returned_qty"], ledger
+		)
+
+	def search(self, txt="", **filters):
+		filters = {"customer": self.CUSTOMER, "item_code": self.ITEM, "start_date": "2024-01-01", **filters}
+		return get_valid_sales_invoices("Sales Invoice", txt, "name", 0, 20, filters)
+
+	def test_fully_returned_invoices_are_excluded(self):
+		rows = self.search()
+		self.assertEqual(len(rows), 20)
+		self.assertFalse([row for row in rows if int(row[0].rsplit("-", 1)[1]) % 3 == 0])
+
+	def test_prefix_search(self):
+		rows = self.search("_T-KLIK-RET-0999", search_mode="prefix")
+		self.assertEqual({row[0] for row in rows}, {f"_T-KLIK-RET-0999{i}" for i in range(10) if i % 3})
+
+	def test_picker_stays_fast_for_long_history(self):
+		started = time.perf_counter()
+		self.search()
+		self.search("0999")
+		self.search("_T-KLIK-RET-09", search_mode="prefix")
+		self.assertLess(time.perf_counter() - started, 1.0)
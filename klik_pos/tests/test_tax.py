@@ -0,0 +1,46 @@
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from klik_pos.api.tax import TAX_TEMPLATE_CACHE_KEY, get_compiled_tax_template, get_compiled_tax_templates
+
+TEMPLATE = "_Test Cached Tax Template"
+TEMPLATES = [f"{TEMPLATE} {i}" for i in range(3)]
+
+
+def compile_stub(modified):
+	return lambda name: {"name": name, "modified": modified[name], "rows": []}
+
+
+class TestCompiledTaxTemplateCache(FrappeTestCase):
+	def tearDown(self):
+		frappe.cache().hdel(TAX_TEMPLATE_CACHE_KEY, TEMPLATE, *TEMPLATES)
+
+	def test_recompiled_when_modified_changes_without_hooks(self):
+		modified = {TEMPLATE: "2025-01-01 10:00:00"}
+		with (
+			patch("klik_pos.api.tax.frappe.get_all", side_effect=lambda *a, **kw: list(modified.items())),
+			patch(
+				"klik_pos.api.tax.compile_tax_template", side_effect=compile_stub(modified)
+			) as compile_template,
+		):
+			get_compiled_tax_template(TEMPLATE)
+			get_compiled_tax_template(TEMPLATE)
+			self.assertEqual(compile_template.call_count, 1)
+
+			# e.g. a db_set or data import that bypassed clear_tax_template_cache
+			modified[TEMPLATE] = "2025-01-02 10:00:00"
+			template = get_compiled_tax_template(TEMPLATE)
+			self.assertEqual(compile_template.call_count, 2)
+			self.assertEqual(template["modified"], "2025-01-02 10:00:00")
+
+	def test_freshness_checked_in_one_query(self):
+		modified = dict.fromkeys(TEMPLATES, "2025-01-01 10:00:00")
+		with (
+			patch("klik_pos.api.tax.frappe.get_all", return_value=list(modified.items())) as get_all,
+			patch("klik_pos.api.tax.compile_tax_template", side_effect=compile_stub(modified)),
+		):
+			templates = get_compiled_tax_templates(TEMPLATES)
+			self.assertEqual([template["name"] for template in templates], TEMPLATES)
+			self.assertEqual(get_all.call_count, 1)
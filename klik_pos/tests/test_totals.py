@@ -0,0 +1,168 @@
+import random
+from unittest.mock import patch
+
+import frappe
+from erpnext.accounts.doctype.sales_invoice.test_sales_invoice import create_sales_invoice
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import flt
+
+from klik_pos.api.totals import calculate_cart_totals
+
+WRITE_OFF_ACCOUNT = "_Test Write Off - _TC"
+TAX_ACCOUNT = "_Test Account VAT - _TC"
+POS_PROFILE = "_Test POS Profile"
+COMPARED_FIELDS = (
+	"total",
+	"net_total",
+	"total_taxes_and_charges",
+	"grand_total",
+	"rounded_total",
+	"custom_roundoff_amount",
+)
+
+
+def random_cart(rng):
+	"""Generate a random cart: line items, a tax template and an optional round-off."""
+	items = [
+		{"qty": rng.randint(1, 12), "rate": round(rng.uniform(0.1, 500), 2)} for _ in range(rng.randint(1, 6))
+	]
+	inclusive = rng.random() < 0.5
+	taxes = [
+		{
+			"charge_type": "On Net Total",
+			"account_head": TAX_ACCOUNT,
+			"description": "VAT",
+			"rate": rng.choice([5, 7.5, 12.5, 15, 16]),
+			"included_in_print_rate": int(inclusive),
+		}
+	]
+	if not inclusive and rng.random() < 0.3:
+		taxes.append(
+			{
+				"charge_type": "Actual",
+				"account_head": TAX_ACCOUNT,
+				"description": "Service",
+				"tax_amount": round(rng.uniform(0.5, 20), 2),
+			}
+		)
+	roundoff_amount = round(rng.uniform(0, 0.99), 2) if rng.random() < 0.5 else 0.0
+	return items, taxes, roundoff_amount
+
+
+def expected_totals(items, taxes, roundoff_amount, precision):
+	"""
+	Oracle for the grand total: gross line amounts plus exclusive taxes, less the custom
+	round-off, with a remaining fraction of at most 0.01 written off. Inclusive taxes
+	leave the gross unchanged.
+	"""
+	net = gross = sum(flt(item["qty"] * item["rate"], precision) for item in items)
+	for tax in taxes:
+		if tax["charge_type"] == "Actual":
+			gross += tax["tax_amount"]
+		elif not tax.get("included_in_print_rate"):
+			gross += flt(net * tax["rate"] / 100, precision)
+
+	grand_total = flt(gross - roundoff_amount, precision)
+	fraction = flt(grand_total - int(grand_total), 6)
+	if 0 < fraction <= 0.01 + 1e-6:
+		roundoff_amount += fraction
+		grand_total -= fraction
+	return {
+		"grand_total": flt(grand_total, precision),
+		"custom_roundoff_amount": flt(roundoff_amount, precision),
+	}
+
+
+class TestCartTotals(FrappeTestCase):
+	"""The stateless calculator must agree with the Sales Invoice document path."""
+
+	def document_totals(self, items, taxes, roundoff_amount):
+		doc = create_sales_invoice(do_not_save=1, do_not_submit=1)
+		doc.pos_profile = POS_PROFILE
+		doc.items = []
+		for item in items:
+			doc.append(
+				"items",
+				{
+					"item_code": "_Test Item",
+					"qty": item["qty"],
+					"rate": item["rate"],
+					"income_account": "Sales - _TC",
+					"expense_account": "Cost of Goods Sold - _TC",
+					"cost_center": "_Test Cost Center - _TC",
+				},
+			)
+		doc.taxes = []
+		for tax in taxes:
+			doc.append("taxes", {**tax, "cost_center": "_Test Cost Center - _TC"})
+		if roundoff_amount:
+			doc.custom_roundoff_amount = roundoff_amount
+			doc.custom_roundoff_account = WRITE_OFF_ACCOUNT
+
+		doc.calculate_taxes_and_totals()
+		return doc
+
+	@patch("klik_pos.api.sales_invoice.get_writeoff_account", return_value=WRITE_OFF_ACCOUNT)
+	def test_calculator_matches_document_path(self, _mock_writeoff):
+		rng = random.Random(20251019)
+		for _ in range(200):
+			items, taxes, roundoff_amount = random_cart(rng)
+			doc = self.document_totals(items, taxes, roundoff_amount)
+			precision = doc.precision("grand_total")
+
+			totals = calculate_cart_totals(
+				items=items,
+				taxes=taxes,
+				roundoff_amount=roundoff_amount,
+				currency=doc.currency,
+				precision=precision,
+				disable_rounded_total=doc.is_rounded_total_disabled(),
+			)
+
+			expected = expected_totals(items, taxes, roundoff_amount, precision)
+			for fieldname, value in expected.items():
+				for path, actual in (("calculator", totals[fieldname]), ("document", doc.get(fieldname))):
+					self.assertAlmostEqual(
+						flt(actual, precision),
+						value,
+						places=precision,
+						msg=f"{path} {fieldname} differs for cart {items} / {taxes} / round-off {roundoff_amount}",
+					)
+
+			for fieldname in COMPARED_FIELDS:
+				self.assertAlmostEqual(
+					totals[fieldname],
+					frappe.utils.flt(doc.get(fieldname), precision),
+					places=precision,
+					msg=f"{fieldname} differs for cart {items} / {taxes} / round-off {roundoff_amount}",
+				)
+
+	@patch("klik_pos.api.sales_invoice.get_writeoff_account", return_value=WRITE_OFF_ACCOUNT)
+	def test_inclusive_tax_fraction_written_off_on_both_paths(self, _mock_writeoff):
+		# Seeded cart 156: 5% inclusive tax on a gross of 14294.01
+		items = [{"qty": 1, "rate": 14294.01}]
+		taxes = [
+			{
+				"charge_type": "On Net Total",
+				"account_head": TAX_ACCOUNT,
+				"rate": 5,
+				"included_in_print_rate": 1,
+			}
+		]
+		doc = self.document_totals(items, taxes, 0.0)
+		totals = calculate_cart_totals(items=items, taxes=taxes, precision=doc.precision("grand_total"))
+
+		self.assertEqual(totals["grand_total"], 14294)
+		self.assertEqual(doc.grand_total, 14294)
+		self.assertAlmostEqual(doc.custom_roundoff_amount, totals["custom_roundoff_amount"])
+
+	def test_auto_writeoff_of_small_fraction(self):
+		totals = calculate_cart_totals(items=[{"qty": 1, "rate": 10.01}], taxes=[])
+		self.assertEqual(totals["grand_total"], 10.0)
+		self.assertEqual(totals["custom_roundoff_amount"], 0.01)
+
+	def test_return_adds_roundoff(self):
+		totals = calculate_cart_totals(
+			items=[{"qty": -1, "rate": 13}], taxes=[], roundoff_amount=3.01, is_return=True
+		)
+		self.assertEqual(totals["grand_total"], -9.99)
@@ -4,6 +4,9 @@ interface CustomerStatistics {
   total_orders: number;
   total_spent: number;
   last_visit: string | null;
+  average_basket?: number;
+  total_returns?: number;
+  total_returned?: number;
 }
 
 interface UseCustomerStatisticsReturn {
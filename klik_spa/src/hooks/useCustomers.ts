@@ -2,6 +2,7 @@
 
 import { useEffect, useState } from "react";
 import type { Customer } from "../types/customer";
+import { getCachedCustomer, searchCachedCustomers, syncCustomers } from "../services/customerSync";
 
 interface ERPCustomer {
   name: string;
@@ -20,13 +21,44 @@ interface ERPCustomer {
     email_id?: string;
     phone?: string;
     mobile_no?:string;
-  };
+  } | null;
   address?: {
     address_line1?: string;
     city?: string;
     state?: string;
     country?: string;
     pincode?: string;
+  } | null;
+}
+
+function toCustomer(customer: ERPCustomer): Customer {
+  return {
+    id: customer.name,
+    type: customer.customer_type === "Company" ? "company" : "individual",
+    name: customer.customer_name || `Customer ${customer.name.slice(0, 5)}`,
+    email: customer.contact?.email_id || "",
+    phone: customer.contact?.mobile_no || customer.contact?.phone || "",
+    address: {
+      street: customer.address?.address_line1 || "",
+      city: customer.address?.city || "",
+      state: customer.address?.state || "",
+      zipCode: customer.address?.pincode || "",
+      country: customer.address?.country || ""
+    },
+    dateOfBirth: "",
+    gender: "other",
+    loyaltyPoints: 0,
+    totalSpent: customer.custom_total_spent || 0,
+    totalOrders: customer.custom_total_orders || 0,
+    preferredPaymentMethod: "Cash",
+    notes: "",
+    tags: [],
+    status: "active",
+    createdAt: new Date().toISOString(),
+    lastVisit: customer.custom_last_visit || undefined,
+    avatar: undefined,
+    defaultCurrency: customer.default_currency,
+    companyCurrency: customer.company_currency
   };
 }
 
@@ -55,36 +87,7 @@ export function useCustomers(searchQuery?: string) {
       }
 
       const data: ERPCustomer[] = resData.message.data;
-      const enhanced = data.map((customer): Customer => {
-        return {
-          id: customer.name,
-          type: customer.customer_type === "Company" ? "company" : "individual",
-          name: customer.customer_name || `Customer ${customer.name.slice(0, 5)}`,
-          email: customer.contact?.email_id || "",
-          phone: customer.contact?.mobile_no || customer.contact?.phone || "",
-          address: {
-            street: customer.address?.address_line1 || "",
-            city: customer.address?.city || "",
-            state: customer.address?.state || "",
-            zipCode: customer.address?.pincode || "",
-            country: customer.address?.country || ""
-          },
-          dateOfBirth: "",
-          gender: "other",
-          loyaltyPoints: 0,
-          totalSpent: customer.custom_total_spent || 0,
-          totalOrders: customer.custom_total_orders || 0,
-          preferredPaymentMethod: "Cash",
-          notes: "",
-          tags: [],
-          status: "active",
-          createdAt: new Date().toISOString(),
-          lastVisit: customer.custom_last_visit || undefined,
-          avatar: undefined,
-          defaultCurrency: customer.default_currency,
-          companyCurrency: customer.company_currency
-        };
-      });
+      const enhanced = data.map(toCustomer);
 
       setCustomers(prev => append ? [...prev, ...enhanced] : enhanced);
       const total = resData.message.total_count || 0;
@@ -93,12 +96,25 @@ export function useCustomers(searchQuery?: string) {
       setStart(nextStart);
       setHasMore(nextStart < total);
     } catch (err) {
-      setError(err as Error);
+      // Offline: fall back to the customers synced to this terminal
+      const cached = append ? [] : searchCachedCustomers(search || "");
+      if (cached.length) {
+        setCustomers(cached.map(toCustomer));
+        setTotalCount(cached.length);
+        setHasMore(false);
+      } else {
+        setError(err as Error);
+      }
     } finally {
       setIsLoading(false);
     }
   };
 
+  useEffect(() => {
+    // Keep the local index current in the background for offline lookups
+    syncCustomers().catch(err => console.error("Customer sync failed:", err));
+  }, []);
+
   useEffect(() => {
     // Reset paging on new search
     setStart(0);
@@ -200,7 +216,10 @@ export function useCustomerDetails(customerId: string | null) {
 
         setCustomer(transformedCustomer);
       } catch (err: unknown) {
-        if (err instanceof Error) {
+        const cached = getCachedCustomer(customerId);
+        if (cached) {
+          setCustomer(toCustomer(cached));
+        } else if (err instanceof Error) {
           setError(err.message);
         } else {
           setError("Unknown error");
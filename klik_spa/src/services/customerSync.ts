@@ -0,0 +1,139 @@
+// Local customer index kept up to date with get_customer_changes, so customer
+// lookups keep working while the terminal is offline.
+
+export interface SyncedCustomer {
+  name: string;
+  customer_name?: string;
+  customer_type?: string;
+  customer_group?: string;
+  territory?: string;
+  default_currency?: string;
+  contact?: {
+    first_name?: string;
+    last_name?: string;
+    email_id?: string;
+    phone?: string;
+    mobile_no?: string;
+  } | null;
+  address?: {
+    address_line1?: string;
+    city?: string;
+    state?: string;
+    country?: string;
+    pincode?: string;
+  } | null;
+}
+
+interface Watermark {
+  since: string;
+  after: string;
+  scope: string;
+}
+
+interface CustomerIndex {
+  watermark: Watermark | null;
+  customers: Record<string, SyncedCustomer>;
+}
+
+const CACHE_KEY = 'klik_customer_index';
+
+function loadIndex(): CustomerIndex {
+  try {
+    const cached = localStorage.getItem(CACHE_KEY);
+    if (cached) {
+      return JSON.parse(cached) as CustomerIndex;
+    }
+  } catch (error) {
+    console.error('Error reading customer index:', error);
+  }
+  return { watermark: null, customers: {} };
+}
+
+function saveIndex(index: CustomerIndex): void {
+  try {
+    localStorage.setItem(CACHE_KEY, JSON.stringify(index));
+  } catch (error) {
+    // Storage quota exceeded; the next sync starts over from an empty index
+    console.error('Error saving customer index:', error);
+    localStorage.removeItem(CACHE_KEY);
+  }
+}
+
+let syncInFlight: Promise<number> | null = null;
+
+// Several screens mount the customer hooks; they share one running sync
+export function syncCustomers(): Promise<number> {
+  if (!syncInFlight) {
+    syncInFlight = runSync().finally(() => {
+      syncInFlight = null;
+    });
+  }
+  return syncInFlight;
+}
+
+async function runSync(): Promise<number> {
+  const index = loadIndex();
+  let changed = 0;
+  let hasMore = true;
+
+  while (hasMore) {
+    const params = new URLSearchParams();
+    if (index.watermark) {
+      params.set('since', index.watermark.since);
+      params.set('after', index.watermark.after);
+      params.set('scope', index.watermark.scope);
+    }
+    const response = await fetch(`/api/method/klik_pos.api.customer_sync.get_customer_changes?${params}`, {
+      credentials: 'include'
+    });
+    const result = await response.json();
+    if (!response.ok || !result.message?.success) {
+      throw new Error(result.message?.error || 'Failed to sync customers');
+    }
+
+    if (result.message.reset) {
+      // The POS profile or the user's permissions changed; the server resends the whole scope
+      index.customers = {};
+    }
+    for (const customer of result.message.data as SyncedCustomer[]) {
+      index.customers[customer.name] = customer;
+    }
+    for (const tombstone of result.message.tombstones as { name: string }[]) {
+      delete index.customers[tombstone.name];
+    }
+    changed += result.message.data.length + result.message.tombstones.length;
+    index.watermark = result.message.watermark;
+    hasMore = result.message.has_more;
+    saveIndex(index);
+  }
+
+  return changed;
+}
+
+export function getCachedCustomer(name: string): SyncedCustomer | null {
+  return loadIndex().customers[name] || null;
+}
+
+export function searchCachedCustomers(query: string, limit = 50): SyncedCustomer[] {
+  const term = query.trim().toLowerCase();
+  const digits = term.replace(/\D/g, '');
+  const matches: SyncedCustomer[] = [];
+
+  for (const customer of Object.values(loadIndex().customers)) {
+    const phone = (customer.contact?.mobile_no || customer.contact?.phone || '').replace(/\D/g, '');
+    if (
+      customer.name.toLowerCase().includes(term) ||
+      (customer.customer_name || '').toLowerCase().includes(term) ||
+      (customer.contact?.email_id || '').toLowerCase().includes(term) ||
+      (digits.length >= 4 && phone.endsWith(digits.replace(/^0+/, '')))
+    ) {
+      matches.push(customer);
+      if (matches.length >= limit) break;
+    }
+  }
+  return matches;
+}
+
+export function clearCustomerIndex(): void {
+  localStorage.removeItem(CACHE_KEY);
+}
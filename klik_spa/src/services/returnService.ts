@@ -64,6 +64,8 @@ export async function getReturnedQty(customer: string, salesInvoice: string, ite
   }
 }
 
+const INVOICES_FOR_RETURN_PAGE_SIZE = 100;
+
 export async function getCustomerInvoicesForReturn(
   customer: string,
   startDate?: string,
@@ -71,23 +73,34 @@ export async function getCustomerInvoicesForReturn(
   shippingAddress?: string
 ): Promise<{success: boolean; data?: InvoiceForReturn[]; error?: string}> {
   try {
-    const params = new URLSearchParams({
-      customer,
-      ...(startDate && { start_date: startDate }),
-      ...(endDate && { end_date: endDate }),
-      ...(shippingAddress && { shipping_address: shippingAddress })
-    });
+    const invoices: InvoiceForReturn[] = [];
+    let start: number | null = 0;
 
-    const response = await fetch(`/api/method/klik_pos.api.sales_invoice.get_customer_invoices_for_return?${params}`);
-    const data = await response.json();
-
-    if (!response.ok || !data.message.success) {
-      throw new Error(data.message.error || 'Failed to fetch customer invoices');
+    // The endpoint returns one page at a time; keep fetching until it reports no more
+    while (start !== null) {
+      const params = new URLSearchParams({
+        customer,
+        start: String(start),
+        limit: String(INVOICES_FOR_RETURN_PAGE_SIZE),
+        ...(startDate && { start_date: startDate }),
+        ...(endDate && { end_date: endDate }),
+        ...(shippingAddress && { shipping_address: shippingAddress })
+      });
+
+      const response = await fetch(`/api/method/klik_pos.api.sales_invoice.get_customer_invoices_for_return?${params}`);
+      const data = await response.json();
+
+      if (!response.ok || !data.message.success) {
+        throw new Error(data.message.error || 'Failed to fetch customer invoices');
+      }
+
+      invoices.push(...data.message.data);
+      start = data.message.has_more ? data.message.next_start : null;
     }
 
     return {
       success: true,
-      data: data.message.data
+      data: invoices
     };
   } catch (error: any) {
     console.error('Error fetching customer invoices for return:', error);
@@ -200,14 +213,16 @@ export async function getValidSalesInvoices(
   itemCode: string,
   startDate: string,
   shippingAddress?: string,
-  searchText?: string
+  searchText?: string,
+  searchMode?: 'contains' | 'prefix'
 ) {
   try {
     const filters = {
       customer,
       item_code: itemCode,
       start_date: startDate,
-      ...(shippingAddress && { shipping_address: shippingAddress })
+      ...(shippingAddress && { shipping_address: shippingAddress }),
+      ...(searchMode && { search_mode: searchMode })
     };
 
     const params = new URLSearchParams({
@@ -115,6 +115,38 @@ export async function getInvoiceDetails(invoiceName: string) {
   }
 }
 
+export async function getReceiptEscPos(
+  invoiceName: string,
+  paper: '80mm' | '58mm' = '80mm',
+  withLogo = true
+): Promise<Uint8Array> {
+  const params = new URLSearchParams({
+    invoice_name: invoiceName,
+    paper,
+    with_logo: withLogo ? '1' : '0',
+  });
+  const response = await fetch(`/api/method/klik_pos.api.escpos.get_receipt_escpos?${params}`, {
+    method: 'GET',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    credentials: 'include'
+  });
+
+  const result = await response.json();
+  if (!response.ok || !result.message?.success) {
+    throw new Error(result.message?.error || 'Failed to render receipt');
+  }
+
+  // Raw printer bytes, ready to write to a USB/serial/network printer
+  const binary = atob(result.message.data);
+  const bytes = new Uint8Array(binary.length);
+  for (let i = 0; i < binary.length; i++) {
+    bytes[i] = binary.charCodeAt(i);
+  }
+  return bytes;
+}
+
 export async function deleteDraftInvoice(invoiceId: string) {
   const csrfToken = window.csrf_token;
 